@@ -0,0 +1,71 @@
+"""Compares transforming a CSV read into a single DataFrame against reading
+and transforming it in chunks with `Curator.transform_dfs`, by throughput and
+peak memory.
+
+Every case runs in a fresh process so its peak RSS is its own. Peak memory of
+the chunked case depends on the chunk size rather than on the file's.
+
+Usage:
+
+    python benchmarks/bench_df_chunks.py [rows] [chunk size]
+"""
+import csv
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+root = os.path.dirname(here)
+sys.path.insert(0, here)
+sys.path.insert(0, os.path.join(root, 'tests'))
+sys.path.insert(0, root)
+
+import pandas  # noqa: E402
+import sqlalchemy  # noqa: E402
+import synthetic  # noqa: E402
+from thecurator import Curator  # noqa: E402
+
+DESCRIPTION_PATHS = [os.path.join(root, 'tests', 'fixtures', 'descriptions', 'patient.yml')]
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_case(case, path, chunk_size):
+    curator = Curator(sqlalchemy.create_engine('sqlite://'), DESCRIPTION_PATHS)
+    start = time.perf_counter()
+    if case == 'whole':
+        df = pandas.read_csv(path, dtype=str, keep_default_na=False)
+        rows = len(curator.transform_df('patient', df))
+    else:
+        chunks = pandas.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_size)
+        rows = sum(len(df) for df in curator.transform_dfs('patient', chunks))
+    return rows, time.perf_counter() - start, peak_rss_bytes()
+
+
+def main(rows=2000000, chunk_size=100000):
+    rows = int(rows)
+    chunk_size = int(chunk_size)
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'patients.csv')
+        with open(path, 'w', newline='') as output:
+            writer = csv.DictWriter(output, ['mrn', 'name', 'age'])
+            writer.writeheader()
+            writer.writerows(synthetic.patients(rows, dirtiness=0.1))
+        print(f'file:    {os.path.getsize(path) / 2 ** 20:,.1f} MiB, {rows} rows')
+        for case in ('whole', 'chunks'):
+            with context.Pool(1) as pool:
+                count, seconds, peak = pool.apply(run_case, (case, path, chunk_size))
+            assert count == rows
+            print(f'{case + ":":<8} {seconds:.3f}s ({rows / seconds:,.0f} rows/s) '
+                  f'{peak / 2 ** 20:,.1f} MiB peak')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
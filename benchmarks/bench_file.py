@@ -0,0 +1,87 @@
+"""Compares streaming a file through `Curator.transform_file` against reading
+it into a list first, as the tests' `FixtureData` helper does, by throughput
+and peak memory.
+
+Every case runs in a fresh process so its peak RSS is its own. Files are
+generated once per run; pass enough rows for a multi-GB file (about 30 bytes
+per patient row) to see memory stay flat as files grow.
+
+Usage:
+
+    python benchmarks/bench_file.py [rows] [csv|jsonl]
+"""
+import csv
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+root = os.path.dirname(here)
+sys.path.insert(0, here)
+sys.path.insert(0, os.path.join(root, 'tests'))
+sys.path.insert(0, root)
+
+import sqlalchemy  # noqa: E402
+import synthetic  # noqa: E402
+from thecurator import Curator  # noqa: E402
+
+DESCRIPTION_PATHS = [os.path.join(root, 'tests', 'fixtures', 'descriptions', 'patient.yml')]
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def write_file(path, file_format, rows):
+    with open(path, 'w', newline='') as output:
+        if file_format == 'csv':
+            writer = csv.DictWriter(output, ['mrn', 'name', 'age'])
+            writer.writeheader()
+            writer.writerows(synthetic.patients(rows, dirtiness=0.1))
+        else:
+            for row in synthetic.patients(rows, dirtiness=0.1):
+                output.write(json.dumps(row) + '\n')
+
+
+def read_list(path, file_format):
+    """Reads every record into a list, as loads did before streaming"""
+    with open(path, newline='') as input_file:
+        if file_format == 'csv':
+            return list(csv.DictReader(input_file))
+        return [json.loads(line) for line in input_file]
+
+
+def run_case(case, path, file_format):
+    curator = Curator(sqlalchemy.create_engine('sqlite://'), DESCRIPTION_PATHS)
+    start = time.perf_counter()
+    if case == 'list':
+        rows = len(curator.transform_dicts('patient', read_list(path, file_format)))
+    else:
+        cooked_rows = curator.transform_file(
+            'patient', path, format=file_format, prefetch=case == 'prefetch')
+        rows = sum(1 for _ in cooked_rows)
+    return rows, time.perf_counter() - start, peak_rss_bytes()
+
+
+def main(rows=1000000, file_format='csv'):
+    rows = int(rows)
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f'patients.{file_format}')
+        write_file(path, file_format, rows)
+        print(f'file:     {os.path.getsize(path) / 2 ** 20:,.1f} MiB, {rows} rows')
+        for case in ('list', 'stream', 'prefetch'):
+            with context.Pool(1) as pool:
+                count, seconds, peak = pool.apply(run_case, (case, path, file_format))
+            assert count == rows
+            print(f'{case + ":":<9} {seconds:.3f}s ({rows / seconds:,.0f} rows/s) '
+                  f'{peak / 2 ** 20:,.1f} MiB peak')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
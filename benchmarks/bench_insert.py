@@ -0,0 +1,95 @@
+"""Compares inserting into SQLite with `SQLiteLoader` against inserting
+through SQLAlchemy's `executemany` of `table.insert()` as `insert_dicts` used
+to, in a single statement for every row.
+
+Usage:
+
+    python benchmarks/bench_insert.py [rows] [repeats]
+"""
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+root = os.path.dirname(here)
+sys.path.insert(0, here)
+sys.path.insert(0, os.path.join(root, 'tests'))
+sys.path.insert(0, root)
+
+import sqlalchemy  # noqa: E402
+from fixtures.db import Base  # noqa: E402
+from thecurator import Curator, Loader, SQLiteLoader  # noqa: E402
+
+DESCRIPTION_PATHS = [os.path.join(root, 'tests', 'fixtures', 'descriptions', 'lab.yml')]
+
+
+def legacy_insert(engine, table, cooked_rows):
+    """`Curator.insert_dicts` as it was, minus the dangling connection"""
+    with engine.begin() as connection:
+        connection.execute(table.insert(), cooked_rows)
+
+
+def timed(directory, name, insert):
+    engine = sqlalchemy.create_engine(f'sqlite:///{directory}/{name}.db')
+    Base.metadata.create_all(engine)
+    start = time.perf_counter()
+    insert(engine)
+    seconds = time.perf_counter() - start
+    engine.dispose()
+    return seconds
+
+
+def lab_rows(count, seed=0):
+    """Generates `count` transformed lab dicts, so only inserting is timed"""
+    rng = random.Random(seed)
+    epoch = datetime.datetime(2017, 1, 1)
+    rows = []
+    for _ in range(count):
+        order_time = epoch + datetime.timedelta(minutes=15 * rng.randrange(35040))
+        rows.append({
+            'patient_mrn': f'MRN{rng.randrange(10000):08d}',
+            'name': rng.choice(['blood_pressure', 'alertness', 'sugar']),
+            'value': round(rng.uniform(0, 200), 2),
+            'order_time': order_time,
+            'taken_time': order_time + datetime.timedelta(minutes=rng.randrange(1440)),
+        })
+    return rows
+
+
+def main(rows=100000, repeats=3):
+    cooked_rows = lab_rows(rows)
+
+    def load_with(loader):
+        def insert(engine):
+            curator = Curator(engine, DESCRIPTION_PATHS, loader=loader)
+            table = curator.get_sqlalchemy_table('lab')
+            with engine.begin() as connection:
+                for start in range(0, len(cooked_rows), 1000):
+                    loader.insert(connection, table, cooked_rows[start:start + 1000])
+        return insert
+
+    def legacy(engine):
+        table = sqlalchemy.Table('lab', sqlalchemy.MetaData(), autoload_with=engine)
+        legacy_insert(engine, table, cooked_rows)
+
+    timings = {'legacy': [], 'loader': [], 'sqlite_loader': []}
+    with tempfile.TemporaryDirectory() as directory:
+        for attempt in range(repeats):
+            timings['legacy'].append(timed(directory, f'legacy_{attempt}', legacy))
+            timings['loader'].append(
+                timed(directory, f'loader_{attempt}', load_with(Loader())))
+            timings['sqlite_loader'].append(
+                timed(directory, f'sqlite_{attempt}', load_with(SQLiteLoader())))
+
+    print(f'rows:          {rows}')
+    for name, seconds in timings.items():
+        best = min(seconds)
+        print(f'{name + ":":<14} {best:.3f}s ({rows / best:,.0f} rows/s)')
+    print(f"speedup:       {min(timings['legacy']) / min(timings['sqlite_loader']):.2f}x")
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,61 @@
+"""Times loading a `Registry` of many descriptions without a cache, with an
+empty (cold) description cache and with a populated (warm) one.
+
+Usage:
+
+    python benchmarks/bench_registry_load.py [descriptions] [repeats]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, here)
+sys.path.insert(0, os.path.dirname(here))
+
+from thecurator.private.table_description import Registry  # noqa: E402
+
+with open(os.path.join(here, 'descriptions', 'lab.yml')) as template_file:
+    TEMPLATE = template_file.read()
+
+
+def write_descriptions(directory, count):
+    """Writes `count` copies of the benchmark lab description under distinct
+    table names and returns their paths"""
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f'lab_{i}.yml')
+        with open(path, 'w') as description_file:
+            description_file.write(TEMPLATE.replace('name: lab\n', f'name: lab_{i}\n', 1))
+        paths.append(path)
+    return paths
+
+
+def main(count=500, repeats=3):
+    directory = tempfile.mkdtemp()
+    try:
+        paths = write_descriptions(directory, count)
+        cache_dir = os.path.join(directory, 'cache')
+
+        def cold():
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            Registry(paths, cache_dir)
+
+        uncached = min(timeit.repeat(lambda: Registry(paths), number=1, repeat=repeats))
+        cold_cache = min(timeit.repeat(cold, number=1, repeat=repeats))
+        warm_cache = min(timeit.repeat(
+            lambda: Registry(paths, cache_dir), number=1, repeat=repeats))
+    finally:
+        shutil.rmtree(directory)
+
+    print(f'descriptions: {count}')
+    print(f'no cache:     {uncached:.3f}s')
+    print(f'cold cache:   {cold_cache:.3f}s')
+    print(f'warm cache:   {warm_cache:.3f}s')
+    print(f'speedup:      {uncached / warm_cache:.2f}x')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,38 @@
+"""Compares a `@requires_row` transform applied row by row with
+`DataFrame.apply` against its `@vectorized` counterpart.
+
+Usage:
+
+    python benchmarks/bench_transform_df.py [rows] [repeats]
+"""
+import os
+import sys
+import timeit
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, here)
+sys.path.insert(0, os.path.dirname(here))
+
+import pandas  # noqa: E402
+import cheap_transformers  # noqa: E402
+from bench_transform_dicts import lab_rows  # noqa: E402
+
+
+def main(rows=100000, repeats=5):
+    df = pandas.DataFrame(lab_rows(rows))
+    row_by_row = df.apply(cheap_transformers.lab_name, axis=1)
+    assert row_by_row.tolist() == cheap_transformers.lab_name.vectorized(df).tolist()
+
+    applied = min(timeit.repeat(
+        lambda: df.apply(cheap_transformers.lab_name, axis=1), number=1, repeat=repeats))
+    vectorized = min(timeit.repeat(
+        lambda: cheap_transformers.lab_name.vectorized(df), number=1, repeat=repeats))
+
+    print(f'rows:       {rows}')
+    print(f'apply:      {applied:.3f}s ({rows / applied:,.0f} rows/s)')
+    print(f'vectorized: {vectorized:.3f}s ({rows / vectorized:,.0f} rows/s)')
+    print(f'speedup:    {applied / vectorized:.2f}x')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
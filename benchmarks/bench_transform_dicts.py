@@ -0,0 +1,90 @@
+"""Compares `Curator.transform_dicts` against the original uncompiled loop.
+
+Usage:
+
+    python benchmarks/bench_transform_dicts.py [rows] [repeats]
+"""
+import os
+import random
+import sys
+import timeit
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, here)
+sys.path.insert(0, os.path.dirname(here))
+
+import sqlalchemy  # noqa: E402
+from thecurator import Curator  # noqa: E402
+
+LAB_NAMES = ['Blood Pressure', ' Alertness', 'Sugar ', 'Heart  Rate', 'Oxygen Saturation']
+
+
+def legacy_transform_dicts(registry, table_name, raw_rows):
+    """`Curator.transform_dicts` as it was before tables were compiled"""
+    column_names = registry.get_table(table_name)['columns_by_name'].keys()
+    transforms_by_column = {}
+    for column_name in column_names:
+        transforms_by_column[column_name] = registry.get_transform(table_name, column_name)
+    cooked_rows = []
+
+    for raw_row in raw_rows:
+        cooked_row = {}
+        for column_name, raw_value in raw_row.items():
+            transform = transforms_by_column[column_name]
+            if not transform:
+                cooked_row[column_name] = raw_value
+            elif hasattr(transform, 'requires_row'):
+                continue
+            else:
+                cooked_row[column_name] = transform(raw_value)
+
+        for column_name in column_names:
+            transform = transforms_by_column[column_name]
+            if not transform:
+                continue
+            elif hasattr(transform, 'requires_row'):
+                cooked_row[column_name] = transform(raw_row)
+        cooked_rows.append(cooked_row)
+    return cooked_rows
+
+
+def lab_rows(count, seed=0):
+    """Generates `count` dirty lab dicts"""
+    rng = random.Random(seed)
+    return [
+        {
+            'patient_mrn': f' {rng.randrange(10000)} ',
+            'name': rng.choice(LAB_NAMES),
+            'value': str(rng.uniform(0, 200)),
+            'count': f'{rng.randrange(100000):,}',
+            'unit': 'mmHg',
+            'comment': ' ok ',
+        }
+        for _ in range(count)
+    ]
+
+
+def main(rows=100000, repeats=5):
+    curator = Curator(
+        sqlalchemy.create_engine('sqlite://'),
+        [os.path.join(here, 'descriptions', 'lab.yml')]
+    )
+    raw_rows = lab_rows(rows)
+    assert curator.transform_dicts('lab', raw_rows) == \
+        legacy_transform_dicts(curator.table_registry, 'lab', raw_rows)
+
+    legacy = min(timeit.repeat(
+        lambda: legacy_transform_dicts(curator.table_registry, 'lab', raw_rows),
+        number=1, repeat=repeats))
+    compiled = min(timeit.repeat(
+        lambda: curator.transform_dicts('lab', raw_rows),
+        number=1, repeat=repeats))
+
+    print(f'rows:     {rows}')
+    print(f'legacy:   {legacy:.3f}s ({rows / legacy:,.0f} rows/s)')
+    print(f'compiled: {compiled:.3f}s ({rows / compiled:,.0f} rows/s)')
+    print(f'speedup:  {legacy / compiled:.2f}x')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
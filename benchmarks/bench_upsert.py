@@ -0,0 +1,55 @@
+"""Compares reloading a mostly unchanged extract with `Curator.upsert_iter`
+against the first load of it.
+
+Usage:
+
+    python benchmarks/bench_upsert.py [rows] [changed_percent]
+"""
+import os
+import sys
+import tempfile
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+root = os.path.dirname(here)
+sys.path.insert(0, here)
+sys.path.insert(0, os.path.join(root, 'tests'))
+sys.path.insert(0, root)
+
+import sqlalchemy  # noqa: E402
+import synthetic  # noqa: E402
+from fixtures.db import Base  # noqa: E402
+from thecurator import Curator  # noqa: E402
+
+DESCRIPTION_PATHS = [os.path.join(root, 'tests', 'fixtures', 'descriptions', 'patient.yml')]
+
+
+def main(rows=100000, changed_percent=1):
+    raw_rows = list(synthetic.patients(rows))
+    changed_rows = [
+        dict(row, age=str(int(row['age']) + 1)) if number % 100 < changed_percent else row
+        for number, row in enumerate(raw_rows)
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        engine = sqlalchemy.create_engine(f'sqlite:///{directory}/bench.db')
+        Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.exec_driver_sql('CREATE UNIQUE INDEX patient_mrn ON patient (mrn)')
+        curator = Curator(engine, DESCRIPTION_PATHS)
+
+        start = time.perf_counter()
+        first = curator.upsert_iter('patient', raw_rows)
+        first_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        reload = curator.upsert_iter('patient', changed_rows)
+        reload_seconds = time.perf_counter() - start
+
+    print(f'rows:         {rows} ({changed_percent}% changed on reload)')
+    print(f'first load:   {first_seconds:.3f}s {first!r}')
+    print(f'reload:       {reload_seconds:.3f}s {reload!r}')
+    print(f'reload share: {reload_seconds / first_seconds:.0%} of the first load')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,25 @@
+"""Cheap transforms used by the benchmarks so the engine's overhead isn't
+hidden behind an expensive parser."""
+from thecurator import requires_row, vectorized
+
+
+def strip(raw_value):
+    return raw_value.strip()
+
+
+def integer(raw_value):
+    return int(raw_value.replace(',', ''))
+
+
+def decimal(raw_value):
+    return float(raw_value)
+
+
+def vectorized_lab_name(df):
+    return df['name'].str.strip().str.split().str.join('_').str.lower()
+
+
+@vectorized(vectorized_lab_name)
+@requires_row
+def lab_name(raw):
+    return '_'.join(raw['name'].strip().split()).lower()
@@ -0,0 +1,56 @@
+"""Compares two result files written by `benchmarks/suite.py`.
+
+Usage:
+
+    python benchmarks/compare.py baseline.json candidate.json [--threshold 0.1]
+
+Exits with status 1 when any case's throughput dropped by more than the
+threshold.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as results_file:
+        report = json.load(results_file)
+    return {
+        (result['benchmark'], result['table'], result['rows']): result
+        for result in report['results']
+    }
+
+
+def compare(baseline, candidate, threshold):
+    """Prints a line per case found in both files and returns the keys of the
+    cases that regressed"""
+    regressions = []
+    for key in sorted(baseline.keys() & candidate.keys(), key=str):
+        before, after = baseline[key], candidate[key]
+        change = before['seconds'] / after['seconds'] - 1
+        memory = after['peak_rss_bytes'] / before['peak_rss_bytes'] - 1
+        benchmark, table_name, rows = key
+        print(f"{benchmark:<16} {table_name or '':<8} {rows:>10} "
+              f"{before['seconds']:>9.3f}s -> {after['seconds']:>9.3f}s "
+              f"({change:+.1%} throughput, {memory:+.1%} peak RSS)")
+        if change < -threshold:
+            regressions.append(key)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='largest tolerated drop in throughput, as a fraction')
+    args = parser.parse_args(argv)
+    regressions = compare(load(args.baseline), load(args.candidate), args.threshold)
+    if regressions:
+        print(f'{len(regressions)} case(s) regressed by more than {args.threshold:.0%}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""Benchmark suite for the curation pipeline.
+
+Measures loading the `Registry` and running `transform_dicts`,
+`transform_df` and `insert_dicts` (into SQLite) over synthetic patients and
+labs. Each case runs in a fresh process so its peak RSS isn't inflated by
+earlier cases. Results are written as JSON; compare two runs with
+`benchmarks/compare.py`.
+
+Usage:
+
+    python benchmarks/suite.py --rows 10000 100000 --dirtiness 0.1 \\
+        --duplicates 0.5 --output results.json
+
+Sizes up to 10^7 rows are supported, but rows are generated up front as the
+APIs under test expect, so the largest sizes need several GB of memory.
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+here = os.path.dirname(os.path.abspath(__file__))
+root = os.path.dirname(here)
+sys.path.insert(0, os.path.join(root, 'tests'))
+sys.path.insert(0, root)
+
+import sqlalchemy  # noqa: E402
+import synthetic  # noqa: E402
+import thecurator  # noqa: E402
+from thecurator import Curator  # noqa: E402
+from thecurator.private.table_description import Registry  # noqa: E402
+
+DESCRIPTION_PATHS = [
+    os.path.join(root, 'tests', 'fixtures', 'descriptions', 'patient.yml'),
+    os.path.join(root, 'tests', 'fixtures', 'descriptions', 'lab.yml'),
+]
+BENCHMARKS = ['registry', 'transform_dicts', 'transform_df', 'insert_dicts']
+TABLES = ['patient', 'lab']
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def raw_rows(table_name, rows, options):
+    generate = synthetic.patients if table_name == 'patient' else synthetic.labs
+    return list(generate(
+        rows, dirtiness=options['dirtiness'], duplicate_rate=options['duplicates'],
+        seed=options['seed']))
+
+
+def prepare(benchmark, table_name, rows, options, database_path):
+    """Returns a function running the benchmarked operation once"""
+    if benchmark == 'registry':
+        return lambda: Registry(DESCRIPTION_PATHS)
+
+    data = raw_rows(table_name, rows, options)
+    engine = sqlalchemy.create_engine(f'sqlite:///{database_path}')
+    curator = Curator(engine, DESCRIPTION_PATHS)
+    if benchmark == 'transform_dicts':
+        return lambda: curator.transform_dicts(table_name, data)
+    if benchmark == 'transform_df':
+        import pandas
+        df = pandas.DataFrame(data)
+        return lambda: curator.transform_df(table_name, df)
+    if benchmark == 'insert_dicts':
+        from fixtures.db import Base
+        Base.metadata.create_all(engine)
+        return lambda: curator.insert_dicts(table_name, data)
+    raise ValueError(f'Unknown benchmark {benchmark}')
+
+
+def run_case(benchmark, table_name, rows, options):
+    """Runs a single case and returns its measurements"""
+    with tempfile.TemporaryDirectory() as directory:
+        timings = []
+        rss_before = peak_rss_bytes()
+        for attempt in range(options['repeat']):
+            # Operations may consume or mutate their input, so it's rebuilt
+            database_path = os.path.join(directory, f'bench_{attempt}.db')
+            operation = prepare(benchmark, table_name, rows, options, database_path)
+            start = time.perf_counter()
+            operation()
+            timings.append(time.perf_counter() - start)
+        seconds = min(timings)
+        result = {
+            'benchmark': benchmark,
+            'table': table_name,
+            'rows': rows,
+            'seconds': seconds,
+            'rows_per_second': rows / seconds if rows else None,
+            'peak_rss_bytes': peak_rss_bytes(),
+            'rss_before_bytes': rss_before,
+        }
+        if options['allocations']:
+            # Tracing slows everything down, so it gets its own run
+            database_path = os.path.join(directory, 'bench_traced.db')
+            operation = prepare(benchmark, table_name, rows, options, database_path)
+            tracemalloc.start()
+            operation()
+            _, result['traced_peak_bytes'] = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    return result
+
+
+def cases(options):
+    for benchmark in options['benchmarks']:
+        if benchmark == 'registry':
+            yield (benchmark, None, 0, options)
+            continue
+        for table_name in options['tables']:
+            for rows in options['rows']:
+                yield (benchmark, table_name, rows, options)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10 ** 4, 10 ** 5])
+    parser.add_argument('--benchmarks', nargs='+', choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument('--tables', nargs='+', choices=TABLES, default=TABLES)
+    parser.add_argument('--dirtiness', type=float, default=0.1)
+    parser.add_argument('--duplicates', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='times to run each case, keeping the fastest')
+    parser.add_argument('--allocations', action='store_true',
+                        help='also trace peak allocated bytes (slow)')
+    parser.add_argument('--output', help='file to write JSON results to')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = vars(parse_args(argv))
+    output = options.pop('output')
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for case in cases(options):
+        with context.Pool(1) as pool:
+            result = pool.apply(run_case, case)
+        results.append(result)
+        rate = f"{result['rows_per_second']:>12,.0f} rows/s" if result['rows'] else ''
+        print(f"{result['benchmark']:<16} {result['table'] or '':<8} {result['rows']:>10} "
+              f"{result['seconds']:>9.3f}s {rate} "
+              f"{result['peak_rss_bytes'] / 2 ** 20:>8.1f} MiB peak")
+
+    report = {
+        'metadata': {
+            'created_at': datetime.datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'thecurator': '.'.join(map(str, thecurator.__VERSION__)),
+            'options': options,
+        },
+        'results': results,
+    }
+    if output:
+        with open(output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Generators of synthetic raw rows matching the `patient` and `lab`
+descriptions in tests/fixtures/descriptions.
+
+Dirtiness is the share of values written in a messy but valid shape (stray
+whitespace, odd casing, numbers that aren't strings, ISO timestamps the lab's
+strptime format doesn't accept) so transforms take their slower paths without
+producing failures that can't be inserted. The duplicate rate is the share of
+rows repeating an earlier row, which exercises cached transforms.
+"""
+import datetime
+import random
+
+FIRST_NAMES = ['Ben', 'Emery', 'Josh', 'Ada', 'Grace', 'Alan', 'Edsger', 'Barbara']
+LAST_NAMES = ['Sullivan', 'Redmond', 'Winston', 'Lovelace', 'Hopper', 'Turing']
+LAB_NAMES = ['Blood Pressure', 'Alertness', 'Sugar', 'Heart Rate', 'Oxygen Saturation']
+ALERTNESS_LEVELS = ['low', 'medium', 'high']
+EPOCH = datetime.datetime(2017, 1, 1)
+# Orders are placed on a quarter hour, so order times repeat as in real feeds
+QUARTER_HOURS_PER_YEAR = 365 * 24 * 4
+
+
+def mrn(number):
+    return f'MRN{number:08d}'
+
+
+def patients(count, dirtiness=0.0, duplicate_rate=0.0, seed=0):
+    """Yields `count` raw patient dicts
+
+    Args:
+        count (int): Number of rows
+        dirtiness (float): Share of values in a messy but valid shape
+        duplicate_rate (float): Share of rows repeating an earlier row
+        seed (int): Seed for the random generator
+    """
+    rng = random.Random(seed)
+    previous = []
+    for number in range(count):
+        if previous and rng.random() < duplicate_rate:
+            yield dict(rng.choice(previous))
+            continue
+        name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+        age = str(rng.randrange(1, 100))
+        if rng.random() < dirtiness:
+            name = f'  {name} '
+        if rng.random() < dirtiness:
+            age = int(age)
+        row = {'mrn': mrn(number), 'name': name, 'age': age}
+        if len(previous) < 1000:
+            previous.append(row)
+        yield row
+
+
+def labs(count, patient_count=None, dirtiness=0.0, duplicate_rate=0.0, seed=0):
+    """Yields `count` raw lab dicts referencing patients generated by
+    `patients(patient_count)`
+
+    Args:
+        count (int): Number of rows
+        patient_count (int): Number of patients labs are spread over, defaults
+            to a tenth of the labs
+        dirtiness (float): Share of values in a messy but valid shape
+        duplicate_rate (float): Share of rows repeating an earlier row
+        seed (int): Seed for the random generator
+    """
+    rng = random.Random(seed)
+    patient_count = patient_count or max(count // 10, 1)
+    previous = []
+    for _ in range(count):
+        if previous and rng.random() < duplicate_rate:
+            yield dict(rng.choice(previous))
+            continue
+        name = rng.choice(LAB_NAMES)
+        if name == 'Alertness':
+            value = rng.choice(ALERTNESS_LEVELS)
+        else:
+            value = f'{rng.uniform(0, 200):.2f}'
+        order_time = EPOCH + datetime.timedelta(minutes=15 * rng.randrange(QUARTER_HOURS_PER_YEAR))
+        taken_time = order_time + datetime.timedelta(minutes=rng.randrange(24 * 60))
+        taken = taken_time.strftime('%m/%d/%y %I:%M%p')
+        if rng.random() < dirtiness:
+            name = f' {name.upper()}  '
+            value = value.upper()
+        if rng.random() < dirtiness:
+            taken = taken_time.strftime('%Y-%m-%d %H:%M')
+        row = {
+            'patient_mrn': mrn(rng.randrange(patient_count)),
+            'name': name,
+            'value': value,
+            'order_time': order_time.strftime('%m/%d/%y %I:%M%p'),
+            'taken_time': taken,
+        }
+        if len(previous) < 1000:
+            previous.append(row)
+        yield row
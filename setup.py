@@ -34,7 +34,12 @@ setup(
         'sqlalchemy'
     ],
     extras_require={
+        'async': [
+            'aiosqlite',
+            'greenlet'
+        ],
         'dev': [
+            'aiosqlite',
             'dateparser',
             'pandas',
             'pytest'
@@ -2,3 +2,15 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath('./tests'))
 sys.path.insert(0, os.path.abspath('./'))
+
+import pytest  # noqa: E402
+import sqlalchemy  # noqa: E402
+from fixtures.db import Base  # noqa: E402
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """SQLite file holding the tables of the fixture descriptions"""
+    engine = sqlalchemy.create_engine(f'sqlite:///{tmp_path}/test.db')
+    Base.metadata.create_all(engine)
+    return engine
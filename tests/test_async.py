@@ -0,0 +1,130 @@
+"""Tests for loading through SQLAlchemy's asyncio extension"""
+import asyncio
+import pytest
+import sqlalchemy
+from helpers import expand_path
+from fixtures.db import Base
+from thecurator import AsyncCurator
+from thecurator.private import asynchronous
+
+pytest.importorskip('aiosqlite')
+pytest.importorskip('greenlet')
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+
+description_paths = expand_path(__file__, 'fixtures/descriptions/*.yml')
+PATIENTS = [
+    {'mrn': f'MRN{number}', 'name': f' Patient {number} ', 'age': str(number)}
+    for number in range(1, 11)
+]
+
+
+async def make_curator(tmp_path):
+    engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path}/test.db')
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    return AsyncCurator(engine, description_paths)
+
+
+async def fetch_names(curator):
+    async with curator.engine.connect() as connection:
+        result = await connection.execute(sqlalchemy.text('SELECT name FROM patient ORDER BY id'))
+        return result.scalars().all()
+
+
+@pytest.mark.parametrize('commit', ['batch', 'load'])
+def test_ainsert_iter(tmp_path, commit):
+    async def load():
+        curator = await make_curator(tmp_path)
+        inserted = await curator.ainsert_iter('patient', iter(PATIENTS), batch_size=3,
+                                              commit=commit)
+        names = await fetch_names(curator)
+        await curator.engine.dispose()
+        return inserted, names
+
+    inserted, names = asyncio.run(load())
+    assert inserted == 10
+    assert names == [f'Patient {number}' for number in range(1, 11)]
+
+
+def test_ainsert_iter_reads_async_iterables(tmp_path):
+    async def raw_rows():
+        for row in PATIENTS:
+            await asyncio.sleep(0)
+            yield row
+
+    async def load():
+        curator = await make_curator(tmp_path)
+        inserted = await curator.ainsert_iter('patient', raw_rows(), batch_size=4)
+        await curator.engine.dispose()
+        return inserted
+
+    assert asyncio.run(load()) == 10
+
+
+def test_ainsert_dicts_is_all_or_nothing(tmp_path):
+    rows = [dict(row) for row in PATIENTS]
+    rows[7]['age'] = {'not': 'an age'}
+
+    async def load():
+        curator = await make_curator(tmp_path)
+        with pytest.raises(Exception):
+            await curator.ainsert_dicts('patient', rows, batch_size=2)
+        names = await fetch_names(curator)
+        await curator.engine.dispose()
+        return names
+
+    assert asyncio.run(load()) == []
+
+
+def test_unknown_commit_policy(tmp_path):
+    async def load():
+        curator = await make_curator(tmp_path)
+        try:
+            await curator.ainsert_iter('patient', PATIENTS, commit='sometimes')
+        finally:
+            await curator.engine.dispose()
+
+    with pytest.raises(ValueError):
+        asyncio.run(load())
+
+
+class RecordingPlan():
+    """Stands in for a `TransformPlan`, recording when batches are transformed"""
+    def __init__(self, events):
+        self.events = events
+
+    def transform_chunk(self, raw_rows):
+        self.events.append(('transformed', raw_rows[0]))
+        return raw_rows
+
+
+def test_transform_batches_applies_back_pressure():
+    events = []
+
+    async def consume(batch):
+        await asyncio.sleep(0.01)
+        events.append(('consumed', batch[0]))
+
+    asyncio.run(asynchronous.transform_batches(
+        RecordingPlan(events).transform_chunk, range(10), 1, 2, consume))
+    assert [event for event in events if event[0] == 'consumed'] == \
+        [('consumed', number) for number in range(10)]
+    # Besides the two queued, one batch is being consumed and one waits to
+    # be queued
+    outstanding = 0
+    for kind, _ in events:
+        outstanding += 1 if kind == 'transformed' else -1
+        assert outstanding <= 4
+
+
+def test_transform_batches_reraises_transform_errors():
+    class FailingPlan():
+        def transform_chunk(self, raw_rows):
+            raise KeyError('bad column')
+
+    async def consume(batch):
+        pass
+
+    with pytest.raises(KeyError):
+        asyncio.run(asynchronous.transform_batches(
+            FailingPlan().transform_chunk, range(3), 1, 1, consume))
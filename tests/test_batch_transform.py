@@ -0,0 +1,110 @@
+"""Tests for transforms looking values up in batches"""
+import pytest
+import sqlalchemy
+from thecurator import Curator, MetricsCollector, TransformFailure
+from thecurator.private import IS_PYPY
+from transformers import lookup
+
+if not IS_PYPY:
+    import pandas
+
+DESCRIPTION = """
+name: lab_result
+columns:
+  - name: code_id
+    type: integer
+    transform: transformers.lookup.lab_code_id
+  - name: value
+    type: string
+"""
+RAW_ROWS = [
+    {'code_id': 'BP', 'value': '120'},
+    {'code_id': 'HR', 'value': '80'},
+    {'code_id': 'BP', 'value': '118'},
+    {'code_id': 'O2', 'value': '98'},
+    {'code_id': 'HR', 'value': '82'},
+]
+CODE_IDS = [1, 2, 1, 3, 2]
+
+
+@pytest.fixture
+def curator(tmp_path):
+    path = tmp_path / 'lab_result.yml'
+    path.write_text(DESCRIPTION)
+    engine = sqlalchemy.create_engine('sqlite://')
+    metadata = sqlalchemy.MetaData()
+    sqlalchemy.Table(
+        'lab_result', metadata,
+        sqlalchemy.Column('id', sqlalchemy.Integer, primary_key=True),
+        sqlalchemy.Column('code_id', sqlalchemy.Integer),
+        sqlalchemy.Column('value', sqlalchemy.String),
+    )
+    metadata.create_all(engine)
+    lookup.queries.clear()
+    return Curator(engine, [str(path)])
+
+
+def test_transform_dicts_looks_up_once_per_chunk(curator):
+    cooked_rows = curator.transform_dicts('lab_result', RAW_ROWS, chunk_size=3)
+    assert [row['code_id'] for row in cooked_rows] == CODE_IDS
+    assert lookup.queries == [['BP', 'HR'], ['HR', 'O2']]
+
+
+def test_missing_results_are_failures(curator):
+    cooked_rows = curator.transform_dicts('lab_result', [{'code_id': 'XX', 'value': '1'}])
+    failure = cooked_rows[0]['code_id']
+    assert isinstance(failure, TransformFailure)
+    assert failure.value == 'XX'
+    assert failure.location == 'lab_result.code_id'
+
+
+def test_transform_row_looks_up_a_single_value(curator):
+    transform_row = curator.get_plan('lab_result').transform_row
+    assert transform_row({'code_id': 'O2', 'value': '98'})['code_id'] == 3
+    assert lookup.queries == [['O2']]
+
+
+def test_transform_columns(curator):
+    raw_columns = {
+        'code_id': [row['code_id'] for row in RAW_ROWS],
+        'value': [row['value'] for row in RAW_ROWS],
+    }
+    cooked = curator.transform_columns('lab_result', raw_columns)
+    assert list(cooked['code_id']) == CODE_IDS
+    assert len(lookup.queries) == 1
+
+
+@pytest.mark.skipif(IS_PYPY, reason='pandas is not supported on PyPy')
+def test_transform_df(curator):
+    df = curator.transform_df('lab_result', pandas.DataFrame(RAW_ROWS))
+    assert df['code_id'].tolist() == CODE_IDS
+    assert lookup.queries == [['BP', 'HR', 'O2']]
+
+
+def test_insert_iter_looks_up_once_per_batch(curator):
+    assert curator.insert_iter('lab_result', iter(RAW_ROWS), batch_size=2) == 5
+    assert len(lookup.queries) == 3
+    with curator.engine.connect() as connection:
+        code_ids = connection.execute(
+            sqlalchemy.text('select code_id from lab_result order by id')).scalars().all()
+    assert code_ids == CODE_IDS
+
+
+def test_metrics_count_values_looked_up(tmp_path):
+    path = tmp_path / 'lab_result.yml'
+    path.write_text(DESCRIPTION)
+    collector = MetricsCollector()
+    rows = RAW_ROWS + [{'code_id': 'XX', 'value': '1'}]
+    Curator(sqlalchemy.create_engine('sqlite://'), [str(path)], metrics=collector) \
+        .transform_dicts('lab_result', rows)
+    metrics = collector.as_dict()['lab_result']
+    assert metrics['rows'] == 6
+    assert metrics['columns']['code_id']['calls'] == 4
+    assert metrics['columns']['code_id']['failures'] == 1
+
+
+def test_batch_transforms_cant_be_cached(tmp_path):
+    path = tmp_path / 'lab_result.yml'
+    path.write_text(DESCRIPTION.replace('lab_code_id\n', 'lab_code_id\n    cache: true\n'))
+    with pytest.raises(ValueError, match='transforms batches and can\'t be cached'):
+        Curator(sqlalchemy.create_engine('sqlite://'), [str(path)])
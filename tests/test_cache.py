@@ -0,0 +1,111 @@
+"""Tests for the LRU cache wrapped around cacheable transforms"""
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from thecurator import cacheable
+from thecurator.private.cache import lru_cache, cache_size
+from thecurator.private.table_description import Registry
+
+
+def test_lru_cache_counts_hits_and_misses():
+    cached = lru_cache(str.upper, maxsize=2)
+    assert [cached(value) for value in ['a', 'b', 'a']] == ['A', 'B', 'A']
+    info = cached.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 2, 2)
+
+
+def test_lru_cache_evicts_least_recently_used():
+    calls = []
+
+    def transform(value):
+        calls.append(value)
+        return value
+
+    cached = lru_cache(transform, maxsize=2)
+    for value in ['a', 'b', 'a', 'c', 'a', 'b']:
+        cached(value)
+    assert calls == ['a', 'b', 'c', 'b']
+    assert cached.cache_info().currsize == 2
+
+
+def test_lru_cache_passes_through_unhashable_values():
+    cached = lru_cache(len, maxsize=2)
+    assert cached([1, 2]) == 2
+    assert cached([1, 2]) == 2
+    info = cached.cache_info()
+    assert (info.hits, info.misses, info.unhashable) == (0, 0, 2)
+
+
+def test_lru_cache_keys_by_type():
+    cached = lru_cache(repr, maxsize=4)
+    assert [cached(1), cached(1.0), cached(True)] == ['1', '1.0', 'True']
+
+
+def test_lru_cache_clear():
+    cached = lru_cache(str.upper)
+    cached('a')
+    cached.cache_clear()
+    assert cached.cache_info() == (0, 0, 0, 1024, 0)
+
+
+class Yielding(str):
+    """String that lets other threads run whenever it's hashed"""
+
+    def __hash__(self):
+        time.sleep(0)
+        return super().__hash__()
+
+
+def test_lru_cache_is_shared_safely_between_threads():
+    cached = lru_cache(str.upper, maxsize=2)
+    values = [Yielding(value % 5) for value in range(2000)]
+
+    def transform_all(offset):
+        return [cached(value) for value in values[offset:] + values[:offset]]
+
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(transform_all, range(4)))
+    assert all(sorted(result) == sorted(values) for result in results)
+    info = cached.cache_info()
+    assert info.hits + info.misses == 4 * len(values)
+    assert info.currsize == 2
+
+
+def test_lru_cache_requires_positive_size():
+    with pytest.raises(ValueError):
+        lru_cache(str.upper, maxsize=0)
+
+
+def test_cache_size_prefers_column_setting():
+    @cacheable(maxsize=10)
+    def transform(value):
+        return value
+
+    assert cache_size({}, transform) == 10
+    assert cache_size({'cache': 5}, transform) == 5
+    assert cache_size({'cache': True}, transform) == 10
+    assert cache_size({'cache': False}, transform) is None
+    assert cache_size({'cache': True}, len) == 1024
+    assert cache_size({}, len) is None
+
+
+def test_cacheable_without_arguments():
+    @cacheable
+    def transform(value):
+        return value
+
+    assert transform.cache_maxsize == 1024
+
+
+def test_row_transforms_cannot_be_cached(tmp_path):
+    path = tmp_path / 'lab.yml'
+    path.write_text(
+        'name: lab\n'
+        'columns:\n'
+        '  - name: name\n'
+        '    type: string\n'
+        '    transform: transformers.lab.name\n'
+        '    cache: true\n'
+    )
+    with pytest.raises(ValueError):
+        Registry([str(path)])
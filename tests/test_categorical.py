@@ -0,0 +1,77 @@
+"""Tests for interning the values of categorical columns"""
+import pytest
+import sqlalchemy
+from thecurator import Curator
+from thecurator.private import IS_PYPY
+from thecurator.private.transform_plan import interner
+
+OBSERVATION_DESCRIPTION = """
+name: observation
+columns:
+  - name: name
+    type: string
+    transform: transformers.common.strip
+    categorical: true
+  - name: unit
+    type: string
+    categorical: true
+  - name: note
+    type: string
+    transform: transformers.common.strip
+"""
+RAW_ROWS = [
+    {'name': ' Blood Pressure ', 'unit': 'mmHg', 'note': ' seated '},
+    {'name': 'Blood Pressure  ', 'unit': 'mmHg', 'note': ' seated  '},
+    {'name': ' Alertness', 'unit': None, 'note': 'awake'},
+]
+
+
+@pytest.fixture
+def curator(tmp_path):
+    path = tmp_path / 'observation.yml'
+    path.write_text(OBSERVATION_DESCRIPTION)
+    return Curator(sqlalchemy.create_engine('sqlite://'), [str(path)])
+
+
+def copies(values):
+    return len(set(map(id, values)))
+
+
+def test_transform_dicts_shares_equal_strings(curator):
+    cooked_rows = curator.transform_dicts('observation', [dict(row) for row in RAW_ROWS])
+    assert [row['name'] for row in cooked_rows] == \
+        ['Blood Pressure', 'Blood Pressure', 'Alertness']
+    assert cooked_rows[0]['name'] is cooked_rows[1]['name']
+    assert cooked_rows[2]['unit'] is None
+    assert cooked_rows[0]['note'] is not cooked_rows[1]['note']
+
+
+def test_strings_are_shared_across_calls(curator):
+    first = curator.transform_dicts('observation', RAW_ROWS[:1])[0]
+    second = next(curator.transform_iter('observation', RAW_ROWS[1:2]))
+    assert first['name'] is second['name']
+
+
+def test_transform_columns_shares_equal_strings(curator):
+    cooked = curator.transform_columns(
+        'observation', {key: [row[key] for row in RAW_ROWS] for key in RAW_ROWS[0]})
+    assert copies(cooked['name']) == 2
+
+
+def test_interner_caps_its_pool():
+    intern = interner(max_size=1)
+    first, second = 'ab'.upper(), 'cd'.upper()
+    assert intern(first) is first
+    assert intern(second) is second
+    assert intern('cd'.upper()) is not second
+    assert intern(1.0) == 1.0
+
+
+@pytest.mark.skipif(IS_PYPY, reason='pandas is not supported on PyPy')
+def test_transform_df_emits_categories(curator):
+    import pandas
+    df = curator.transform_df('observation', pandas.DataFrame(RAW_ROWS))
+    assert df['name'].dtype == 'category'
+    assert list(df['name'].cat.categories) == ['Alertness', 'Blood Pressure']
+    assert df['unit'].dtype == 'category'
+    assert df['note'].dtype != 'category'
@@ -0,0 +1,125 @@
+"""Tests for the built-in coercers used by columns with `coerce` set"""
+import datetime
+import decimal
+import pytest
+from thecurator import TransformFailure
+from thecurator.private import IS_PYPY
+from thecurator.private.coercion import coercer, coercion_failure, vectorized_coercer, \
+    with_fallback
+from thecurator.private.table_description import Registry
+
+if not IS_PYPY:
+    import pandas
+
+
+@pytest.mark.parametrize('column, raw_value, expected', [
+    ({'type': 'integer'}, '1,234', 1234),
+    ({'type': 'integer'}, 12, 12),
+    ({'type': 'integer'}, 12.0, 12),
+    ({'type': 'float'}, 5, 5.0),
+    ({'type': 'float'}, '1,234.5', 1234.5),
+    ({'type': 'double'}, '-0.5', -0.5),
+    ({'type': 'decimal'}, '10.1111234', decimal.Decimal('10.1111234')),
+    ({'type': 'decimal'}, 0.1, decimal.Decimal('0.1')),
+    ({'type': 'boolean'}, ' Yes ', True),
+    ({'type': 'boolean'}, 'f', False),
+    ({'type': 'datetime'}, '2017-09-03T10:30:00', datetime.datetime(2017, 9, 3, 10, 30)),
+    ({'type': 'datetime', 'format': '%m/%d/%y %I:%M%p'}, '09/05/17 1:30AM',
+     datetime.datetime(2017, 9, 5, 1, 30)),
+    ({'type': 'date'}, '2017-09-03', datetime.date(2017, 9, 3)),
+    ({'type': 'date', 'format': '%m/%d/%y'}, '09/03/17', datetime.date(2017, 9, 3)),
+])
+def test_coercer(column, raw_value, expected):
+    assert coercer(column)(raw_value) == expected
+
+
+def test_strings_have_no_coercer():
+    assert coercer({'type': 'string'}) is None
+
+
+@pytest.mark.parametrize('column, raw_value', [
+    ({'type': 'integer'}, '12.5'),
+    ({'type': 'integer'}, 12.5),
+    ({'type': 'decimal'}, 'twelve'),
+    ({'type': 'boolean'}, 'maybe'),
+    ({'type': 'boolean'}, 1),
+    ({'type': 'integer'}, True),
+    ({'type': 'integer'}, None),
+    ({'type': 'float'}, float('nan')),
+    ({'type': 'datetime', 'format': '%m/%d/%y'}, '2017-09-03'),
+])
+def test_with_fallback(column, raw_value):
+    coerced = with_fallback(coercer(column), lambda value: 'fallback')
+    assert coerced(raw_value) == 'fallback'
+
+
+def test_coercion_failure():
+    column = {'name': 'age', 'type': 'integer'}
+    coerced = with_fallback(coercer(column), coercion_failure('patient', column))
+    failure = coerced('old')
+    assert isinstance(failure, TransformFailure)
+    assert failure.message == "Failed to coerce value to integer (value: 'old') at patient.age"
+
+
+@pytest.mark.skipif(IS_PYPY, reason='pandas is unavailable')
+def test_vectorized_coercer():
+    column = {'type': 'integer'}
+    vectorized = vectorized_coercer(column, lambda value: 'fallback')
+    results = vectorized(pandas.Series(['1,234', '12.5', None, 'x']))
+    assert results.tolist() == [1234, 'fallback', 'fallback', 'fallback']
+
+
+@pytest.mark.skipif(IS_PYPY, reason='pandas is unavailable')
+@pytest.mark.parametrize('column, raw_values', [
+    ({'type': 'integer'}, [5, 5.0, '5', '5.0', '1,234', 5.5, True, None, 'x']),
+    ({'type': 'integer'}, [5, 6.0, float('nan')]),
+    ({'type': 'integer'}, [True, False]),
+    ({'type': 'float'}, [5, 5.5, '5.5', '1,234.5', False, None, 'nan', 'x']),
+    ({'type': 'double'}, [1.5, float('nan'), 2]),
+    ({'type': 'datetime', 'format': '%m/%d/%y'},
+     ['09/03/17', datetime.datetime(2017, 9, 3), None, '2017-09-03']),
+])
+def test_scalar_and_vectorized_coercers_agree(column, raw_values):
+    def fallback(raw_value):
+        return 'fallback'
+    scalar = with_fallback(coercer(column), fallback)
+    vectorized = vectorized_coercer(column, fallback)
+    expected = [scalar(raw_value) for raw_value in raw_values]
+    assert vectorized(pandas.Series(raw_values)).tolist() == expected
+
+
+@pytest.mark.skipif(IS_PYPY, reason='pandas is unavailable')
+@pytest.mark.parametrize('raw_values', [
+    [1.0, '2,000', 'x', None],
+    ['1', '2000', 'x', 'y'],
+    [1, 2000],
+])
+def test_vectorized_integers_stay_ints_alongside_fallbacks(raw_values):
+    def fallback(raw_value):
+        return 'fallback'
+    scalar = with_fallback(coercer({'type': 'integer'}), fallback)
+    vectorized = vectorized_coercer({'type': 'integer'}, fallback)
+    expected = [scalar(raw_value) for raw_value in raw_values]
+    results = vectorized(pandas.Series(raw_values)).tolist()
+    assert results == expected
+    assert [type(result) for result in results] == [type(value) for value in expected]
+    assert [type(value) for value in expected[:2]] == [int, int]
+
+
+def test_types_without_vectorized_coercer():
+    assert vectorized_coercer({'type': 'decimal'}, None) is None
+    assert vectorized_coercer({'type': 'datetime'}, None) is None
+
+
+def test_row_transforms_cannot_be_coerced(tmp_path):
+    path = tmp_path / 'lab.yml'
+    path.write_text(
+        'name: lab\n'
+        'columns:\n'
+        '  - name: value\n'
+        '    type: decimal\n'
+        '    transform: transformers.lab.value\n'
+        '    coerce: true\n'
+    )
+    with pytest.raises(ValueError):
+        Registry([str(path)])
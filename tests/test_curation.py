@@ -1,9 +1,15 @@
+import array
 import csv
 import json
+import pickle
+import pytest
+import sqlalchemy
 from thecurator.private import IS_PYPY, pypy_incompatible
 from helpers import relative_path, expand_path
-from thecurator import Curator
-from fixtures.db import engine
+import thecurator
+from thecurator import Curator, TransformFailure, transform_failure
+from transformers.common import positive_integer
+from fixtures.db import Base, engine
 from fixtures.data.labs_clean import data as labs_clean
 from fixtures.data.patients_missing_key_clean import data as patients_missing_first_clean
 
@@ -81,10 +87,24 @@ class TestFixtureData():
         }
 
 
+def count_rows(engine, table_name):
+    with engine.connect() as connection:
+        return connection.execute(
+            sqlalchemy.text(f'SELECT COUNT(*) FROM {table_name}')).scalar()
+
+
 description_paths = expand_path(__file__, 'fixtures/descriptions/*.yml')
 curator = Curator(engine, description_paths)
 
 
+@pytest.fixture
+def empty_curator():
+    """Curator connected to its own freshly created database"""
+    empty_engine = sqlalchemy.create_engine('sqlite://')
+    Base.metadata.create_all(empty_engine)
+    return Curator(empty_engine, description_paths)
+
+
 class TestCurator():
     def setup_method(self):
         self.labs_dirty = FixtureData('labs_dirty.csv')
@@ -108,5 +128,299 @@ class TestCurator():
         results = curator.transform_df('lab', df)
         assert pandas.DataFrame(labs_clean).to_dict() == results.to_dict()
 
+    def test_plan_collects_vectorized_transforms(self):
+        lab_plan = curator.table_registry.get_plan('lab')
+        patient_plan = curator.table_registry.get_plan('patient')
+        assert set(lab_plan.vectorized_transforms) == {'name', 'value', 'taken_time'}
+        assert set(patient_plan.vectorized_transforms) == {'name'}
+
+    @pypy_incompatible
+    def test_transform_df_vectorized_matches_dicts(self):
+        df = self.patients_dirty.df()
+        results = curator.transform_df('patient', df)
+        expected = curator.transform_dicts('patient', self.patients_dirty.dicts())
+        assert results.to_dict('records') == expected
+
+    def test_cache_info(self, empty_curator):
+        empty_curator.transform_dicts('lab', self.labs_dirty.dicts())
+        info = empty_curator.cache_info('lab')
+        assert set(info) == {'order_time', 'taken_time'}
+        assert (info['order_time'].hits, info['order_time'].misses) == (1, 5)
+        assert (info['taken_time'].hits, info['taken_time'].misses) == (0, 6)
+        assert info['order_time'].maxsize == 128
+
+    @pypy_incompatible
+    def test_transform_df_uses_cache(self, empty_curator):
+        empty_curator.transform_df('lab', self.labs_dirty.df())
+        assert empty_curator.cache_info('lab')['order_time'].hits == 1
+
+    def test_coercion_falls_back_to_transform(self):
+        raw_rows = self.labs_dirty.dicts()
+        raw_rows[0]['taken_time'] = '2017-09-03 11:30'
+        results = curator.transform_dicts('lab', raw_rows)
+        assert results == labs_clean
+
+    @pypy_incompatible
+    def test_vectorized_coercion_falls_back_to_transform(self):
+        raw_rows = self.labs_dirty.dicts()
+        raw_rows[0]['taken_time'] = '2017-09-03 11:30'
+        results = curator.transform_df('lab', pandas.DataFrame(raw_rows))
+        assert pandas.DataFrame(labs_clean).to_dict() == results.to_dict()
+
+    def test_transform_columns(self):
+        raw_columns = dict(zip(self.labs_dirty.headers, self.labs_dirty.columns()))
+        results = curator.transform_columns('lab', raw_columns)
+        assert results['patient_mrn'] is raw_columns['patient_mrn']
+        assert [dict(zip(results, row)) for row in zip(*results.values())] == labs_clean
+
+    def test_transform_columns_packs_numbers(self):
+        results = curator.transform_columns('patient', {'age': ['35', '18']})
+        assert results['age'] == array.array('q', [35, 18])
+
+    def test_transform_columns_requires_equal_lengths(self):
+        with pytest.raises(ValueError):
+            curator.transform_columns('lab', {'patient_mrn': ['A'], 'name': []})
+
+    @pypy_incompatible
+    def test_transform_columns_passes_arrays_through(self):
+        mrns = pandas.Series(['A', 'B']).to_numpy()
+        results = curator.transform_columns('patient', {'mrn': mrns})
+        assert results['mrn'] is mrns
+
+    def test_insert_columns(self, empty_curator):
+        raw_columns = dict(zip(self.labs_dirty.headers, self.labs_dirty.columns()))
+        assert empty_curator.insert_columns('lab', raw_columns, batch_size=4) == 6
+        assert count_rows(empty_curator.engine, 'lab') == 6
+
+    def test_transform_dicts_in_parallel(self):
+        raw_rows = self.labs_dirty.dicts() * 3
+        results = curator.transform_dicts('lab', raw_rows, workers=2, chunk_size=4)
+        assert results == curator.transform_dicts('lab', raw_rows)
+
+    @pypy_incompatible
+    def test_transform_df_in_parallel(self):
+        df = pandas.DataFrame(self.labs_dirty.dicts() * 3)
+        results = curator.transform_df('lab', df.copy(), workers=2, chunk_size=4)
+        assert results.to_dict() == curator.transform_df('lab', df).to_dict()
+
     def test_insert_dicts(self):
         curator.insert_dicts('lab', self.labs_dirty.dicts())
+
+    def test_transform_iter_is_lazy(self):
+        def raw_rows():
+            yield from self.labs_dirty.dicts()[:1]
+            raise AssertionError('Read past the first row')
+
+        results = curator.transform_iter('lab', raw_rows())
+        assert next(results) == labs_clean[0]
+
+    @pytest.mark.parametrize('commit', ['batch', 'load'])
+    def test_insert_iter(self, empty_curator, commit):
+        inserted = empty_curator.insert_iter(
+            'lab', iter(self.labs_dirty.dicts()), batch_size=4, commit=commit)
+        assert inserted == 6
+        assert count_rows(empty_curator.engine, 'lab') == 6
+
+    def test_insert_iter_batch_commit_keeps_earlier_batches(self, empty_curator):
+        rows = self.labs_dirty.dicts()
+        rows[4]['value'] = 'not a number'
+        with pytest.raises(ValueError):
+            empty_curator.insert_iter('lab', rows, batch_size=2, commit='batch')
+        assert count_rows(empty_curator.engine, 'lab') == 4
+
+    def test_insert_iter_load_commit_is_all_or_nothing(self, empty_curator):
+        rows = self.labs_dirty.dicts()
+        rows[4]['value'] = 'not a number'
+        with pytest.raises(ValueError):
+            empty_curator.insert_iter('lab', rows, batch_size=2, commit='load')
+        assert count_rows(empty_curator.engine, 'lab') == 0
+
+    def test_insert_iter_unknown_commit_policy(self):
+        with pytest.raises(ValueError):
+            curator.insert_iter('lab', [], commit='sometimes')
+
+    def test_tables_are_reflected_on_first_insert(self, empty_curator):
+        assert len(empty_curator.sqlalchemy_meta.tables) == 0
+        empty_curator.insert_iter('lab', self.labs_dirty.dicts())
+        assert list(empty_curator.sqlalchemy_meta.tables) == ['lab']
+
+    def test_only_described_tables_are_reflected(self, empty_curator):
+        with pytest.raises(LookupError):
+            empty_curator.get_sqlalchemy_table('sqlite_master')
+
+    def test_reflection_cache(self, tmp_path):
+        file_engine = sqlalchemy.create_engine(f'sqlite:///{tmp_path}/test.db')
+        Base.metadata.create_all(file_engine)
+        cache_path = str(tmp_path / 'reflection.pickle')
+        Curator(file_engine, description_paths, reflection_cache=cache_path) \
+            .get_sqlalchemy_table('lab')
+
+        cached_curator = Curator(file_engine, description_paths, reflection_cache=cache_path)
+        assert list(cached_curator.sqlalchemy_meta.tables) == ['lab']
+        assert cached_curator.insert_iter('lab', self.labs_dirty.dicts()) == 6
+
+    def test_reflection_cache_invalidated_by_schema_change(self, tmp_path):
+        file_engine = sqlalchemy.create_engine(f'sqlite:///{tmp_path}/test.db')
+        Base.metadata.create_all(file_engine)
+        cache_path = str(tmp_path / 'reflection.pickle')
+        Curator(file_engine, description_paths, reflection_cache=cache_path) \
+            .get_sqlalchemy_table('patient')
+        with file_engine.begin() as connection:
+            connection.execute(sqlalchemy.text('ALTER TABLE patient ADD COLUMN ward VARCHAR'))
+
+        cached_curator = Curator(file_engine, description_paths, reflection_cache=cache_path)
+        assert 'ward' in cached_curator.get_sqlalchemy_table('patient').columns
+
+    def test_reflection_cache_invalidated_by_new_index(self, tmp_path):
+        file_engine = sqlalchemy.create_engine(f'sqlite:///{tmp_path}/test.db')
+        Base.metadata.create_all(file_engine)
+        cache_path = str(tmp_path / 'reflection.pickle')
+        Curator(file_engine, description_paths, reflection_cache=cache_path) \
+            .get_sqlalchemy_table('patient')
+        with file_engine.begin() as connection:
+            connection.execute(sqlalchemy.text('CREATE INDEX ix_patient_mrn ON patient (mrn)'))
+
+        cached_curator = Curator(file_engine, description_paths, reflection_cache=cache_path)
+        indexes = cached_curator.get_sqlalchemy_table('patient').indexes
+        assert [index.name for index in indexes] == ['ix_patient_mrn']
+
+    @pytest.mark.parametrize('contents', [
+        b'',
+        b'garbage',
+        pickle.dumps(['not', 'a', 'cache']),
+        b'cthecurator.private.reflection\nRemovedClass\n.',  # AttributeError
+        b'cno_such_module\nThing\n.',  # ImportError
+    ])
+    def test_unreadable_reflection_cache_is_rebuilt(self, tmp_path, contents):
+        file_engine = sqlalchemy.create_engine(f'sqlite:///{tmp_path}/test.db')
+        Base.metadata.create_all(file_engine)
+        cache_path = tmp_path / 'reflection.pickle'
+        cache_path.write_bytes(contents)
+        cached_curator = Curator(file_engine, description_paths, reflection_cache=str(cache_path))
+        assert 'mrn' in cached_curator.get_sqlalchemy_table('patient').columns
+        assert cache_path.stat().st_size > len(contents)
+
+    def test_plan_is_compiled_once(self):
+        registry = curator.table_registry
+        assert registry.get_plan('lab') is registry.get_plan('lab')
+
+    def test_plan_sorts_row_transforms(self):
+        plan = curator.table_registry.get_plan('lab')
+        assert [name for name, _ in plan.row_transforms] == ['name', 'value']
+        assert set(plan.scalar_transforms) == {'patient_mrn', 'order_time', 'taken_time'}
+
+
+ORDER_DESCRIPTION = """
+name: line_item
+columns:
+  - name: label
+    type: string
+    transform: transformers.dependent.label
+  - name: total
+    type: float
+    transform: transformers.dependent.total
+  - name: quantity
+    type: integer
+    transform: transformers.dependent.quantity
+  - name: price
+    type: float
+    transform: transformers.dependent.price
+"""
+
+
+class TestDependencies():
+    @pytest.fixture
+    def dependent_curator(self, tmp_path):
+        path = tmp_path / 'line_item.yml'
+        path.write_text(ORDER_DESCRIPTION)
+        return Curator(sqlalchemy.create_engine('sqlite://'), [str(path)])
+
+    def raw_rows(self):
+        return [
+            {'label': None, 'total': None, 'quantity': '2', 'price': '1.5'},
+            {'label': None, 'total': None, 'quantity': '3', 'price': '0.25'},
+        ]
+
+    def expected_rows(self):
+        return [
+            {'label': "'2' for 3.00", 'total': 3.0, 'quantity': 2, 'price': 1.5},
+            {'label': "'3' for 0.75", 'total': 0.75, 'quantity': 3, 'price': 0.25},
+        ]
+
+    def test_plan_orders_row_transforms_by_dependency(self, dependent_curator):
+        plan = dependent_curator.get_plan('line_item')
+        assert [name for name, _ in plan.row_transforms] == ['quantity', 'total', 'label']
+
+    def test_transform_dicts(self, dependent_curator):
+        assert dependent_curator.transform_dicts('line_item', self.raw_rows()) == \
+            self.expected_rows()
+
+    def test_dependencies_are_transformed_once_per_row(self, dependent_curator):
+        from transformers import dependent
+        dependent.calls['quantity'] = 0
+        dependent_curator.transform_dicts('line_item', self.raw_rows())
+        assert dependent.calls['quantity'] == 2
+
+    def test_transform_columns(self, dependent_curator):
+        raw_columns = {key: [row[key] for row in self.raw_rows()] for key in self.raw_rows()[0]}
+        cooked = dependent_curator.transform_columns('line_item', raw_columns)
+        assert list(cooked['label']) == ["'2' for 3.00", "'3' for 0.75"]
+        assert list(cooked['total']) == [3.0, 0.75]
+
+    @pytest.mark.skipif(IS_PYPY, reason='pandas is not supported on PyPy')
+    def test_transform_df(self, dependent_curator):
+        df = pandas.DataFrame(self.raw_rows())
+        dependent_curator.transform_df('line_item', df)
+        assert df.to_dict('records') == self.expected_rows()
+
+    def test_cycles_are_rejected_on_load(self, tmp_path):
+        path = tmp_path / 'cycle.yml'
+        path.write_text(
+            'name: cycle\ncolumns:\n'
+            '  - name: first\n    type: string\n    transform: transformers.dependent.first\n'
+            '  - name: second\n    type: string\n    transform: transformers.dependent.second\n')
+        with pytest.raises(ValueError, match='first -> second -> first'):
+            Curator(engine, [str(path)])
+
+    def test_unknown_dependencies_are_rejected_on_load(self, tmp_path):
+        path = tmp_path / 'unknown.yml'
+        path.write_text(
+            'name: unknown\ncolumns:\n'
+            '  - name: total\n    type: float\n    transform: transformers.dependent.total\n')
+        with pytest.raises(ValueError, match='depends on column quantity'):
+            Curator(engine, [str(path)])
+
+
+class TestTransformFailure():
+    def test_failure_records_caller(self):
+        failure = positive_integer('-1')
+        assert not failure
+        assert failure.reason == 'String looks negative'
+        assert failure.value == '-1'
+        assert failure.location.endswith('transformers/common.py:17')
+        assert failure.message == \
+            f"String looks negative (value: '-1') at {failure.location}"
+
+    def test_location_is_formatted_lazily(self):
+        failure = transform_failure('Failed', 1)
+        assert isinstance(failure._location, tuple)
+        filename, line_number = failure._location
+        assert failure.location == f'{filename}:{line_number}'
+
+    def test_provided_location(self):
+        failure = transform_failure('Failed', 1, 'somewhere')
+        assert failure.message == 'Failed (value: 1) at somewhere'
+
+    def test_location_capture_can_be_disabled(self, monkeypatch):
+        monkeypatch.setattr(thecurator, 'capture_failure_locations', False)
+        failure = transform_failure('Failed', 1)
+        assert failure.location is None
+        assert failure.message == 'Failed (value: 1)'
+
+    def test_failures_are_slotted(self):
+        assert not hasattr(transform_failure('Failed', 1), '__dict__')
+
+    def test_failures_pickle(self):
+        failure = pickle.loads(pickle.dumps(transform_failure('Failed', 1)))
+        assert isinstance(failure, TransformFailure)
+        assert failure.message.startswith('Failed (value: 1) at ')
@@ -0,0 +1,92 @@
+"""Tests for the on-disk cache of parsed table descriptions"""
+import os
+import pickle
+import pytest
+from helpers import expand_path
+from thecurator.private.description_cache import DescriptionCache
+from thecurator.private.table_description import Registry, parse
+
+
+class CountingParser():
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, contents):
+        self.calls += 1
+        return parse(contents)
+
+
+def write_description(path, column_type='string'):
+    path.write_text(f'name: note\ncolumns:\n  - name: text\n    type: {column_type}\n')
+
+
+def test_unchanged_files_are_not_parsed(tmp_path):
+    path = tmp_path / 'note.yml'
+    write_description(path)
+    parser = CountingParser()
+    first = DescriptionCache(str(tmp_path / 'cache'), 'schema').load(str(path), parser)
+    second = DescriptionCache(str(tmp_path / 'cache'), 'schema').load(str(path), parser)
+    assert parser.calls == 1
+    assert first == second
+
+
+def test_touched_files_with_same_contents_are_not_parsed(tmp_path):
+    path = tmp_path / 'note.yml'
+    write_description(path)
+    parser = CountingParser()
+    cache = DescriptionCache(str(tmp_path / 'cache'), 'schema')
+    cache.load(str(path), parser)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    cache.load(str(path), parser)
+    assert parser.calls == 1
+
+
+def test_changed_files_are_parsed(tmp_path):
+    path = tmp_path / 'note.yml'
+    write_description(path)
+    parser = CountingParser()
+    cache = DescriptionCache(str(tmp_path / 'cache'), 'schema')
+    cache.load(str(path), parser)
+    write_description(path, 'integer')
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    description = cache.load(str(path), parser)
+    assert parser.calls == 2
+    assert description['columns'][0]['type'] == 'integer'
+
+
+def test_schema_changes_invalidate_entries(tmp_path):
+    path = tmp_path / 'note.yml'
+    write_description(path)
+    parser = CountingParser()
+    DescriptionCache(str(tmp_path / 'cache'), 'schema').load(str(path), parser)
+    DescriptionCache(str(tmp_path / 'cache'), 'new schema').load(str(path), parser)
+    assert parser.calls == 2
+
+
+def test_registry_with_cache_matches_registry_without(tmp_path):
+    paths = expand_path(__file__, 'fixtures/descriptions/*.yml')
+    uncached = Registry(paths)
+    Registry(paths, str(tmp_path))
+    cached = Registry(paths, str(tmp_path))
+    assert cached.tables_by_name == uncached.tables_by_name
+
+
+@pytest.mark.parametrize('contents', [
+    b'',
+    b'not a pickle',
+    pickle.dumps(['not', 'a', 'dict']),
+    pickle.dumps({'schema_digest': 'schema'}),
+    pickle.dumps({'schema_digest': 'schema'})[:-3],
+])
+def test_unreadable_entries_are_misses(tmp_path, contents):
+    path = tmp_path / 'note.yml'
+    write_description(path)
+    parser = CountingParser()
+    cache = DescriptionCache(str(tmp_path / 'cache'), 'schema')
+    with open(cache._entry_path(str(path)), 'wb') as entry_file:
+        entry_file.write(contents)
+    assert cache.load(str(path), parser)['name'] == 'note'
+    assert cache.load(str(path), parser)['name'] == 'note'
+    assert parser.calls == 1
@@ -0,0 +1,97 @@
+"""Tests for streaming CSV and JSON Lines files"""
+import json
+import pytest
+import sqlalchemy
+from helpers import expand_path, relative_path
+from fixtures.db import Base
+from fixtures.data.labs_clean import data as labs_clean
+from thecurator import Curator
+from thecurator.private import readers
+
+description_paths = expand_path(__file__, 'fixtures/descriptions/*.yml')
+labs_path = relative_path(__file__, 'fixtures/data/labs_dirty.csv')
+
+
+@pytest.fixture
+def curator():
+    engine = sqlalchemy.create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    return Curator(engine, description_paths)
+
+
+def write_jsonl(path, records):
+    path.write_text(''.join(json.dumps(record) + '\n' for record in records))
+    return str(path)
+
+
+@pytest.mark.parametrize('prefetch', [False, True])
+def test_transform_csv(curator, prefetch):
+    cooked_rows = curator.transform_file('lab', labs_path, prefetch=prefetch, chunk_size=4)
+    assert list(cooked_rows) == labs_clean
+
+
+def test_transform_file_is_lazy(curator):
+    cooked_rows = curator.transform_file('lab', labs_path)
+    assert next(cooked_rows) == labs_clean[0]
+
+
+def test_transform_jsonl(curator, tmp_path):
+    path = write_jsonl(tmp_path / 'patients.jsonl', [
+        {'MRN': 'A', 'Name': ' Ben Sullivan ', 'Age': '35', 'Ward': 'East'},
+        {},
+        {'MRN': 'B', 'Name': 'Emery Redmond', 'Age': '18'},
+    ])
+    assert list(curator.transform_file('patient', path)) == [
+        {'mrn': 'A', 'name': 'Ben Sullivan', 'age': 35},
+        {},
+        {'mrn': 'B', 'name': 'Emery Redmond', 'age': 18},
+    ]
+
+
+def test_headers_are_mapped_to_columns(curator, tmp_path):
+    path = tmp_path / 'patients.txt'
+    path.write_text('Record Number;Full Name;AGE;Ignored\nA;Ben Sullivan;35;x\nB;Emery\n')
+    header_map = {'Record Number': 'mrn', 'Full Name': 'name'}
+    raw_rows = curator.read_file('patient', str(path), format='csv', header_map=header_map,
+                                 delimiter=';')
+    assert list(raw_rows) == [
+        {'mrn': 'A', 'name': 'Ben Sullivan', 'age': '35'},
+        {'mrn': 'B', 'name': 'Emery', 'age': None},
+    ]
+
+
+def test_insert_file(curator):
+    report = curator.insert_file('lab', labs_path, batch_size=4, prefetch=True)
+    assert (report, report.batches) == (6, 2)
+
+
+def test_unknown_formats(curator, tmp_path):
+    with pytest.raises(ValueError, match="Can't infer"):
+        curator.transform_file('lab', str(tmp_path / 'labs.xml'))
+    with pytest.raises(ValueError, match='Unknown file format'):
+        curator.transform_file('lab', labs_path, format='xml')
+
+
+def test_prefetch_reraises_errors():
+    def records():
+        yield {'a': 1}
+        raise OSError('Disk went away')
+
+    prefetched = readers.prefetch(records(), 1)
+    assert next(prefetched) == {'a': 1}
+    with pytest.raises(OSError):
+        list(prefetched)
+
+
+def test_prefetch_stops_when_closed():
+    read = []
+
+    def records():
+        for number in range(1000):
+            read.append(number)
+            yield number
+
+    prefetched = readers.prefetch(records(), 10, max_chunks=1)
+    assert next(prefetched) == 0
+    prefetched.close()
+    assert len(read) < 1000
@@ -0,0 +1,89 @@
+"""Tests for transforming and inserting DataFrames a chunk at a time"""
+import pytest
+import sqlalchemy
+from helpers import expand_path, relative_path
+from fixtures.data.labs_clean import data as labs_clean
+from thecurator import Curator
+from thecurator.private import IS_PYPY
+from thecurator.private.frames import downcast
+
+if not IS_PYPY:
+    import pandas
+
+pytestmark = pytest.mark.skipif(IS_PYPY, reason='pandas is not supported on PyPy')
+
+description_paths = expand_path(__file__, 'fixtures/descriptions/*.yml')
+labs_path = relative_path(__file__, 'fixtures/data/labs_dirty.csv')
+patients_path = relative_path(__file__, 'fixtures/data/patients_dirty_with_failures.csv')
+
+
+def read_chunks(path, chunksize=2):
+    return pandas.read_csv(path, chunksize=chunksize, dtype=str, keep_default_na=False)
+
+
+def test_transform_dfs_matches_transform_df(engine):
+    curator = Curator(engine, description_paths)
+    cooked = pandas.concat(curator.transform_dfs('lab', read_chunks(labs_path), downcast=False))
+    assert cooked.reset_index(drop=True).to_dict() == pandas.DataFrame(labs_clean).to_dict()
+
+
+def test_transform_dfs_downcasts_columns(engine):
+    curator = Curator(engine, description_paths)
+    chunks = list(curator.transform_dfs('lab', read_chunks(labs_path, 3)))
+    assert str(chunks[0]['taken_time'].dtype).startswith('datetime64')
+    assert chunks[0]['value'].dtype == 'float64'  # decimals aren't narrowed
+    patients = next(curator.transform_dfs('patient', read_chunks(patients_path, 100)))
+    assert patients['age'].dtype == object  # failures are kept as they are
+
+
+@pytest.mark.parametrize('values, column_type, dtype', [
+    ([1, 2], 'integer', 'int32'),
+    ([1, None], 'integer', 'Int32'),
+    ([1, 2 ** 40], 'integer', 'int64'),
+    ([1.5, 2], 'integer', 'float64'),
+    ([1.5, 2], 'float', 'float32'),
+    ([1.5, 2], 'double', 'float64'),
+    ([True, None], 'boolean', 'boolean'),
+    (['a', 'b'], 'string', None),
+    (['a', 'b'], 'integer', None),
+])
+def test_downcast(values, column_type, dtype):
+    series = pandas.Series(values)
+    assert str(downcast(series, column_type).dtype) == (dtype or str(series.dtype))
+
+
+def test_insert_dfs(engine):
+    curator = Curator(engine, description_paths)
+    report = curator.insert_dfs('lab', read_chunks(labs_path), batch_size=4)
+    assert (report, report.batches) == (6, 2)
+    with engine.connect() as connection:
+        taken_times = connection.execute(
+            sqlalchemy.text('SELECT taken_time FROM lab ORDER BY id')).scalars().all()
+    assert taken_times[0] == '2017-09-03 11:30:00.000000'
+
+
+def test_insert_dfs_quarantines_failures(engine):
+    curator = Curator(engine, description_paths, on_failure='quarantine')
+    report = curator.insert_dfs('patient', read_chunks(patients_path))
+    quarantined = curator.quarantine.row_counts['patient']
+    assert quarantined > 0
+    assert report + quarantined == len(pandas.read_csv(patients_path))
+    assert all(isinstance(row.raw_row['age'], str) for row in curator.quarantine.rows)
+
+
+def test_dtypes_cover_columns_stored_as_is(tmp_path):
+    path = tmp_path / 'vital.yml'
+    path.write_text("""
+name: vital
+columns:
+  - name: kind
+    type: string
+    categorical: true
+  - name: reading
+    type: float
+  - name: count
+    type: integer
+    transform: transformers.common.positive_integer
+""")
+    curator = Curator(sqlalchemy.create_engine('sqlite://'), [str(path)])
+    assert curator.dtypes('vital') == {'kind': 'category', 'reading': 'float32'}
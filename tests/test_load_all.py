@@ -0,0 +1,92 @@
+"""Tests for loading several tables in dependency order"""
+import threading
+import pytest
+import sqlalchemy
+from helpers import expand_path, relative_path
+from thecurator import Curator, LoadReport
+from thecurator.private import scheduler
+
+description_paths = expand_path(__file__, 'fixtures/descriptions/*.yml')
+labs_path = relative_path(__file__, 'fixtures/data/labs_dirty.csv')
+PATIENTS = [
+    {'mrn': 'A', 'name': 'Ben Sullivan', 'age': '35'},
+    {'mrn': 'B', 'name': 'Emery Redmond', 'age': '18'},
+    {'mrn': 'C', 'name': 'Josh Winston', 'age': '52'},
+]
+
+
+def count(engine, table_name):
+    with engine.connect() as connection:
+        return connection.execute(sqlalchemy.text(f'SELECT count(*) FROM {table_name}')).scalar()
+
+
+def test_load_all_loads_parents_first(engine):
+    curator = Curator(engine, description_paths, check_references=True)
+    reports = curator.load_all({'lab': labs_path, 'patient': iter(PATIENTS)})
+    assert list(reports) == ['patient', 'lab']
+    assert isinstance(reports['lab'], LoadReport)
+    assert (reports['patient'], reports['lab']) == (3, 6)
+    assert (count(engine, 'patient'), count(engine, 'lab')) == (3, 6)
+
+
+def test_load_all_loads_lists_of_sources(engine, tmp_path):
+    curator = Curator(engine, description_paths)
+    reports = curator.load_all(
+        {'patient': [PATIENTS[:1], PATIENTS[1:]], 'lab': [labs_path, labs_path]},
+        max_per_table=2)
+    assert (reports['patient'], reports['lab']) == (3, 12)
+    assert reports['lab'].batches == 2
+
+
+def test_load_all_rejects_unknown_tables(engine):
+    with pytest.raises(LookupError):
+        Curator(engine, description_paths).load_all({'nurse': []})
+
+
+def test_independent_tables_run_at_once():
+    barrier = threading.Barrier(2, timeout=5)
+    results = scheduler.run({'a': [barrier.wait], 'b': [barrier.wait]}, {}, workers=2)
+    assert sorted(results['a'][0] + results['b'][0]) == [0, 1]
+
+
+def test_dependents_wait_for_every_task_of_their_parents():
+    events = []
+
+    def task(name):
+        return lambda: events.append(name)
+    scheduler.run(
+        {'child': [task('child')], 'parent': [task('parent 1'), task('parent 2')]},
+        {'child': ['parent', 'elsewhere']}, workers=4, max_per_table=2)
+    assert events[-1] == 'child'
+
+
+def test_tasks_per_table_are_limited():
+    lock = threading.Lock()
+    running = []
+    most = []
+
+    def task():
+        with lock:
+            running.append(1)
+            most.append(len(running))
+        threading.Event().wait(0.01)
+        with lock:
+            running.pop()
+    scheduler.run({'a': [task] * 6}, {}, workers=4, max_per_table=2)
+    assert max(most) == 2
+
+
+def test_failures_stop_dependents():
+    started = []
+
+    def fail():
+        raise RuntimeError('Load failed')
+    with pytest.raises(RuntimeError, match='Load failed'):
+        scheduler.run({'parent': [fail], 'child': [lambda: started.append('child')]},
+                      {'child': ['parent']}, workers=2)
+    assert started == []
+
+
+def test_cycles_are_rejected():
+    with pytest.raises(ValueError, match='Dependency cycle'):
+        scheduler.run({'a': [], 'b': []}, {'a': ['b'], 'b': ['a']}, workers=2)
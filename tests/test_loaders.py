@@ -0,0 +1,144 @@
+"""Tests for the loaders inserting transformed rows"""
+import pytest
+import sqlalchemy
+from sqlalchemy.dialects.postgresql import psycopg2
+from helpers import expand_path
+from fixtures.db import Base
+from thecurator import Curator, LoadReport, Loader, SQLiteLoader
+from thecurator import PostgresCopyLoader
+from thecurator.private.failure import TransformFailure
+from thecurator.private.loaders import copy_text, copyable, loader_for
+
+description_paths = expand_path(__file__, 'fixtures/descriptions/*.yml')
+LABS = [
+    {'patient_mrn': 'MRN1', 'name': 'Blood Pressure', 'value': '120.5',
+     'order_time': '2017-03-01 10:15', 'taken_time': '03/01/17 10:30AM'},
+    {'patient_mrn': 'MRN2', 'name': ' Alertness ', 'value': 'high',
+     'order_time': '2017-03-02 08:00', 'taken_time': '03/02/17 08:45AM'},
+]
+
+
+@pytest.fixture
+def file_engine(tmp_path):
+    engine = sqlalchemy.create_engine(f'sqlite:///{tmp_path}/test.db')
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def fetch_labs(engine):
+    with engine.connect() as connection:
+        return connection.execute(sqlalchemy.text(
+            'SELECT patient_mrn, name, value, order_time, taken_time FROM lab ORDER BY id'
+        )).all()
+
+
+class CountingLoader(Loader):
+    def __init__(self):
+        self.batches = []
+
+    def insert(self, connection, table, batch):
+        self.batches.append(len(batch))
+        super().insert(connection, table, batch)
+
+
+def test_sqlite_engines_use_the_sqlite_loader(file_engine):
+    assert isinstance(Curator(file_engine, description_paths).loader, SQLiteLoader)
+
+
+def test_unknown_dialects_use_the_default_loader():
+    class Dialect():
+        name = 'mystery'
+    assert type(loader_for(Dialect())) is Loader
+
+
+def test_insert_dicts_commits_and_reports(file_engine):
+    report = Curator(file_engine, description_paths).insert_dicts('lab', LABS)
+    assert isinstance(report, LoadReport)
+    assert report == 2
+    assert report.batches == 1
+    assert report.rows_per_second > 0
+    assert len(fetch_labs(file_engine)) == 2
+
+
+def test_insert_dicts_returns_connections_to_the_pool(file_engine):
+    curator = Curator(file_engine, description_paths)
+    curator.insert_dicts('lab', LABS)
+    curator.insert_dicts('lab', LABS)
+    assert file_engine.pool.checkedout() == 0
+
+
+def test_insert_dicts_raises_the_original_error(tmp_path):
+    path = tmp_path / 'note.yml'
+    path.write_text('name: note\ncolumns:\n  - name: text\n    type: string\n')
+    engine = sqlalchemy.create_engine(f'sqlite:///{tmp_path}/notes.db')
+    metadata = sqlalchemy.MetaData()
+    sqlalchemy.Table('note', metadata, sqlalchemy.Column('text', sqlalchemy.String, unique=True))
+    metadata.create_all(engine)
+    curator = Curator(engine, [str(path)])
+    with pytest.raises(sqlalchemy.exc.IntegrityError):
+        curator.insert_dicts('note', [{'text': 'a'}, {'text': 'b'}, {'text': 'a'}], batch_size=2)
+    with engine.connect() as connection:
+        assert connection.execute(sqlalchemy.text('SELECT COUNT(*) FROM note')).scalar() == 0
+
+
+def test_insert_dicts_batch_size(file_engine):
+    loader = CountingLoader()
+    Curator(file_engine, description_paths, loader=loader).insert_dicts('lab', LABS * 3,
+                                                                        batch_size=4)
+    assert loader.batches == [4, 2]
+
+
+def test_sqlite_loader_stores_what_the_default_loader_does(tmp_path):
+    stored = []
+    for loader in (Loader(), SQLiteLoader()):
+        engine = sqlalchemy.create_engine(f'sqlite:///{tmp_path}/{type(loader).__name__}.db')
+        Base.metadata.create_all(engine)
+        Curator(engine, description_paths, loader=loader).insert_iter('lab', LABS)
+        stored.append(fetch_labs(engine))
+    assert stored[0] == stored[1]
+    assert stored[0][1][2] == 2
+
+
+def test_sqlite_loader_single_column(file_engine):
+    table = sqlalchemy.Table('lab', sqlalchemy.MetaData(), autoload_with=file_engine)
+    with file_engine.begin() as connection:
+        SQLiteLoader().insert(connection, table, [{'name': 'a'}, {'name': 'b'}])
+    assert [row[1] for row in fetch_labs(file_engine)] == ['a', 'b']
+
+
+def test_load_report():
+    report = LoadReport(100, 0.5, 2)
+    assert report + 1 == 101
+    assert report.rows == 100
+    assert report.rows_per_second == 200
+    assert repr(report) == '<LoadReport 100 rows in 0.500s (200 rows/s)>'
+
+
+def test_copy_text_escapes():
+    assert copy_text(None) == '\\N'
+    assert copy_text('a\tb\nc\\d') == 'a\\tb\\nc\\\\d'
+    assert copy_text(1.5) == '1.5'
+
+
+def test_copyable_batches_hold_only_scalars():
+    assert copyable([{'a': 'x', 'b': 1, 'c': None}, {'a': 'y', 'b': 2.5, 'c': True}])
+    assert not copyable([{'a': 'x'}, {'a': [1, 2]}])
+    assert not copyable([{'a': b'x'}])
+    assert not copyable([{'a': TransformFailure('bad', 'x', None)}])
+
+
+def test_copy_loader_falls_back_for_values_copy_cannot_format(monkeypatch):
+    inserted = []
+
+    def record(self, connection, table, batch):
+        inserted.append(batch)
+
+    monkeypatch.setattr(Loader, 'insert', record)
+
+    class Connection():
+        dialect = psycopg2.dialect()
+
+    table = sqlalchemy.Table('t', sqlalchemy.MetaData(), sqlalchemy.Column('a', sqlalchemy.String))
+    batch = [{'a': 'x'}, {'a': TransformFailure('bad', 'y', None)}]
+    PostgresCopyLoader().insert(Connection(), table, batch)
+    assert inserted == [batch]
@@ -0,0 +1,106 @@
+"""Tests for collecting transform metrics"""
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from helpers import expand_path
+from fixtures.db import engine
+from thecurator import Curator, MetricsCollector
+from thecurator.private import IS_PYPY
+from transformers.common import strip
+
+if not IS_PYPY:
+    import pandas
+
+description_paths = expand_path(__file__, 'fixtures/descriptions/*.yml')
+PATIENTS = [
+    {'mrn': 'A', 'name': ' Ben Sullivan ', 'age': '35'},
+    {'mrn': 'B', 'name': 'Emery Redmond', 'age': '-18'},
+    {'mrn': 'C', 'name': 'Josh Winston', 'age': 'old'},
+]
+
+
+def test_counts_calls_and_failures():
+    collector = MetricsCollector()
+    Curator(engine, description_paths, metrics=collector).transform_dicts('patient', PATIENTS)
+    metrics = collector.as_dict()['patient']
+    assert metrics['rows'] == 3
+    assert metrics['seconds'] > 0
+    assert metrics['rows_per_second'] > 0
+    assert metrics['columns']['age']['calls'] == 3
+    assert metrics['columns']['age']['failures'] == 2
+    assert metrics['columns']['name'] == {
+        'calls': 3, 'failures': 0, 'seconds': metrics['columns']['name']['seconds']
+    }
+    assert 'mrn' not in metrics['columns']
+
+
+def test_sampled_collection_counts_every_call():
+    collector = MetricsCollector(sample_rate=0.5)
+    Curator(engine, description_paths, metrics=collector) \
+        .transform_dicts('patient', PATIENTS * 4)
+    table = collector.tables['patient']
+    assert table.rows == 12
+    assert table.sampled_rows == 6
+    assert table.columns['age'].calls == 12
+    assert table.columns['age'].sampled_calls == 6
+    assert table.columns['age'].failures == 8
+
+
+def test_counts_are_not_lost_across_threads():
+    collector = MetricsCollector()
+    curator = Curator(engine, description_paths, metrics=collector)
+    switch_interval = sys.getswitchinterval()
+    # Switch threads often, so they interleave within counter updates
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(4) as executor:
+            list(executor.map(
+                lambda _: curator.transform_dicts('patient', PATIENTS * 2000), range(4)))
+    finally:
+        sys.setswitchinterval(switch_interval)
+    table = collector.tables['patient']
+    assert table.rows == 4 * 6000
+    assert table.columns['age'].calls == 4 * 6000
+    assert table.columns['age'].failures == 4 * 4000
+
+
+@pytest.mark.skipif(IS_PYPY, reason='pandas is unavailable')
+def test_transform_df_records_rows():
+    collector = MetricsCollector()
+    Curator(engine, description_paths, metrics=collector) \
+        .transform_df('patient', pandas.DataFrame(PATIENTS))
+    metrics = collector.as_dict()['patient']
+    assert metrics['rows'] == 3
+    assert metrics['columns']['name']['calls'] == 3
+    assert metrics['columns']['age']['failures'] == 2
+
+
+def test_prometheus_snapshot():
+    collector = MetricsCollector()
+    Curator(engine, description_paths, metrics=collector).transform_dicts('patient', PATIENTS)
+    snapshot = collector.to_prometheus()
+    assert '# TYPE thecurator_rows_total counter' in snapshot
+    assert 'thecurator_rows_total{table="patient"} 3' in snapshot
+    assert 'thecurator_transform_failures_total{table="patient",column="age"} 2' in snapshot
+
+
+def test_reset():
+    collector = MetricsCollector()
+    curator = Curator(engine, description_paths, metrics=collector)
+    curator.transform_dicts('patient', PATIENTS)
+    collector.reset()
+    assert collector.tables['patient'].rows == 0
+    assert collector.tables['patient'].columns['age'].calls == 0
+    curator.transform_dicts('patient', PATIENTS[:1])
+    assert collector.tables['patient'].rows == 1
+    assert collector.tables['patient'].columns['age'].calls == 1
+
+
+def test_transforms_are_not_wrapped_without_collector():
+    plan = Curator(engine, description_paths).get_plan('patient')
+    assert plan.scalar_transforms['name'] is strip
+
+
+def test_sample_rate_must_be_a_share():
+    with pytest.raises(ValueError):
+        MetricsCollector(sample_rate=0)
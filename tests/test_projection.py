@@ -0,0 +1,109 @@
+"""Tests for projecting transforms and loads to the columns a caller needs"""
+import pytest
+import sqlalchemy
+from helpers import expand_path, relative_path
+from thecurator import Curator, MetricsCollector
+from thecurator.private import IS_PYPY
+
+description_paths = expand_path(__file__, 'fixtures/descriptions/*.yml')
+labs_path = relative_path(__file__, 'fixtures/data/labs_dirty.csv')
+LABS = [
+    {'patient_mrn': 'A', 'name': 'Blood Pressure', 'value': '120',
+     'order_time': '2017-09-03 10:30', 'taken_time': '09/03/17 11:30AM'},
+    {'patient_mrn': 'B', 'name': 'Alertness', 'value': 'High',
+     'order_time': '2017-09-03 10:30', 'taken_time': '09/03/17 12:30PM'},
+]
+PATIENTS = [
+    {'mrn': 'A', 'name': ' Ben Sullivan ', 'age': '35'},
+    {'mrn': 'B', 'name': 'Emery Redmond', 'age': '18'},
+]
+
+
+def transformed_columns(metrics, table_name):
+    return set(metrics.tables[table_name].columns)
+
+
+def test_transform_dicts_computes_only_projected_columns(engine):
+    metrics = MetricsCollector()
+    curator = Curator(engine, description_paths, metrics=metrics)
+    cooked_rows = curator.transform_dicts('lab', LABS, columns=['name', 'patient_mrn'])
+    assert cooked_rows == [
+        {'patient_mrn': 'A', 'name': 'blood_pressure'},
+        {'patient_mrn': 'B', 'name': 'alertness'},
+    ]
+    assert transformed_columns(metrics, 'lab') == {'name'}
+
+
+def test_dependencies_are_computed_but_not_returned(engine):
+    metrics = MetricsCollector()
+    curator = Curator(engine, description_paths, metrics=metrics)
+    cooked_rows = curator.transform_dicts('lab', LABS, columns=['value'])
+    assert cooked_rows == [{'value': 120.0}, {'value': 2}]
+    assert transformed_columns(metrics, 'lab') == {'name', 'value'}
+
+
+def test_unknown_columns_are_rejected(engine):
+    with pytest.raises(LookupError):
+        Curator(engine, description_paths).transform_dicts('lab', LABS, columns=['nope'])
+
+
+def test_transform_columns_projects(engine):
+    curator = Curator(engine, description_paths)
+    raw_columns = {key: [row[key] for row in LABS] for key in LABS[0]}
+    cooked = curator.transform_columns('lab', raw_columns, columns=['value'])
+    assert list(cooked) == ['value']
+    assert list(cooked['value']) == [120.0, 2]
+
+
+def test_transform_file_projects(engine):
+    curator = Curator(engine, description_paths)
+    cooked_rows = list(curator.transform_file('lab', labs_path, columns=['taken_time']))
+    assert len(cooked_rows) == 6
+    assert all(list(row) == ['taken_time'] for row in cooked_rows)
+
+
+def test_insert_iter_projects(engine):
+    curator = Curator(engine, description_paths)
+    report = curator.insert_iter('lab', LABS, columns=['patient_mrn', 'value'])
+    assert report == 2
+    with engine.connect() as connection:
+        rows = connection.execute(
+            sqlalchemy.text('SELECT patient_mrn, name, value FROM lab ORDER BY id')).all()
+    assert rows == [('A', None, 120.0), ('B', None, 2.0)]
+
+
+def test_projected_upserts_update_only_their_columns(engine):
+    curator = Curator(engine, description_paths)
+    curator.upsert_dicts('patient', PATIENTS)
+    changed = [dict(PATIENTS[0], name='Benjamin Sullivan', age='36')]
+    report = curator.upsert_dicts('patient', changed, columns=['age'])
+    assert (report.updated, report.unchanged) == (1, 0)
+    with engine.connect() as connection:
+        row = connection.execute(
+            sqlalchemy.text("SELECT name, age FROM patient WHERE mrn = 'A'")).one()
+    assert tuple(row) == ('Ben Sullivan', 36)
+    # The rest of the row was never written, so a full upsert still writes it
+    report = curator.upsert_dicts('patient', changed)
+    assert (report.updated, report.unchanged) == (1, 0)
+
+
+@pytest.mark.skipif(IS_PYPY, reason='pandas is not supported on PyPy')
+def test_transform_df_projects(engine):
+    import pandas
+    curator = Curator(engine, description_paths)
+    df = pandas.DataFrame(LABS)
+    cooked = curator.transform_df('lab', df, columns=['value'])
+    assert list(cooked.columns) == ['value']
+    assert list(cooked['value']) == [120.0, 2]
+    patients = curator.transform_df('patient', pandas.DataFrame(PATIENTS), columns=['name'])
+    assert patients.to_dict('records') == [{'name': 'Ben Sullivan'}, {'name': 'Emery Redmond'}]
+
+
+@pytest.mark.skipif(IS_PYPY, reason='pandas is not supported on PyPy')
+def test_projected_transform_df_leaves_the_frame_alone(engine):
+    import pandas
+    curator = Curator(engine, description_paths)
+    df = pandas.DataFrame(LABS)
+    curator.transform_df('lab', df, columns=['value'])
+    curator.transform_df('lab', df, columns=['name'])
+    assert df.to_dict('records') == LABS
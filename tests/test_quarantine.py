@@ -0,0 +1,184 @@
+"""Tests for raising and quarantining rows whose transform failed"""
+import asyncio
+import json
+import threading
+import pytest
+import sqlalchemy
+from helpers import expand_path
+from fixtures.db import Base
+from thecurator import AsyncCurator, Curator, FileQuarantine, ListQuarantine, Quarantine, \
+    TableQuarantine, TransformError, TransformFailure
+
+description_paths = expand_path(__file__, 'fixtures/descriptions/*.yml')
+PATIENTS = [
+    {'mrn': 'A', 'name': 'Ben Sullivan', 'age': '35'},
+    {'mrn': 'B', 'name': 'Emery Redmond', 'age': '-18'},
+    {'mrn': 'C', 'name': 'Josh Winston', 'age': '52'},
+    {'mrn': 'D', 'name': 'Ada Lovelace', 'age': 'old'},
+]
+
+
+def fetch_mrns(engine):
+    with engine.connect() as connection:
+        return connection.execute(
+            sqlalchemy.text('SELECT mrn FROM patient ORDER BY mrn')).scalars().all()
+
+
+def test_failures_are_kept_by_default(engine):
+    cooked_rows = Curator(engine, description_paths).transform_dicts('patient', PATIENTS)
+    assert isinstance(cooked_rows[1]['age'], TransformFailure)
+
+
+def test_unknown_policies_are_rejected(engine):
+    with pytest.raises(ValueError):
+        Curator(engine, description_paths, on_failure='ignore')
+
+
+def test_raise_stops_at_the_first_failed_row(engine):
+    curator = Curator(engine, description_paths, on_failure='raise')
+    with pytest.raises(TransformError) as error:
+        curator.transform_dicts('patient', PATIENTS)
+    assert error.value.raw_row == PATIENTS[1]
+    assert list(error.value.failures) == ['age']
+    assert 'Row of patient failed to transform: age: ' in str(error.value)
+
+
+def test_quarantined_rows_are_left_out_of_inserts(engine):
+    curator = Curator(engine, description_paths, on_failure='quarantine')
+    assert curator.insert_iter('patient', PATIENTS, batch_size=2) == 2
+    assert fetch_mrns(engine) == ['A', 'C']
+    assert isinstance(curator.quarantine, ListQuarantine)
+    assert [row.raw_row['mrn'] for row in curator.quarantine.rows] == ['B', 'D']
+    assert curator.quarantine.rows[0].table_name == 'patient'
+    assert list(curator.quarantine.rows[0].failures) == ['age']
+
+
+def test_failures_are_counted_with_bounded_examples(engine):
+    quarantine = Quarantine(max_examples=1)
+    curator = Curator(engine, description_paths, on_failure='quarantine', quarantine=quarantine)
+    assert len(curator.transform_dicts('patient', PATIENTS * 50)) == 100
+    summary = quarantine.as_dict()['patient']
+    assert summary['rows'] == 100
+    assert summary['failures'] == {'age': 100}
+    assert len(summary['examples']['age']) == 1
+
+
+def test_upserts_quarantine_rows_without_recording_them(engine):
+    curator = Curator(engine, description_paths, on_failure='quarantine')
+    report = curator.upsert_iter('patient', PATIENTS)
+    assert (report.inserted, report.skipped) == (2, 0)
+    report = curator.upsert_iter('patient', PATIENTS)
+    assert report.unchanged == 2
+    assert curator.quarantine.row_counts['patient'] == 4
+
+
+def test_file_quarantine(engine, tmp_path):
+    path = tmp_path / 'quarantine.jsonl'
+    quarantine = FileQuarantine(str(path))
+    curator = Curator(engine, description_paths, on_failure='quarantine', quarantine=quarantine)
+    curator.insert_dicts('patient', PATIENTS)
+    quarantine.close()
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record['row']['mrn'] for record in records] == ['B', 'D']
+    assert records[0]['table'] == 'patient'
+    assert records[0]['failures']['age'].startswith('String looks negative')
+
+
+def test_table_quarantine(engine):
+    quarantine = TableQuarantine(engine, batch_size=1)
+    curator = Curator(engine, description_paths, on_failure='quarantine', quarantine=quarantine)
+    curator.insert_iter('patient', PATIENTS)
+    with engine.connect() as connection:
+        rows = connection.execute(sqlalchemy.select(quarantine.table)).all()
+    assert [json.loads(row.raw_row)['mrn'] for row in rows] == ['B', 'D']
+    assert list(json.loads(rows[0].failures)) == ['age']
+
+
+def fetch_quarantined_mrns(engine, quarantine):
+    with engine.connect() as connection:
+        rows = connection.execute(sqlalchemy.select(quarantine.table)).all()
+    return sorted(json.loads(row.raw_row)['mrn'] for row in rows)
+
+
+def test_table_quarantine_waits_for_loads_committing_once(engine):
+    quarantine = TableQuarantine(engine, batch_size=1)
+    curator = Curator(engine, description_paths, on_failure='quarantine', quarantine=quarantine)
+    assert curator.insert_iter('patient', PATIENTS, batch_size=1, commit='load') == 2
+    assert fetch_mrns(engine) == ['A', 'C']
+    assert fetch_quarantined_mrns(engine, quarantine) == ['B', 'D']
+
+
+def test_table_quarantine_keeps_rows_added_from_threads(engine):
+    quarantine = TableQuarantine(engine, batch_size=7)
+    failures = {'age': TransformFailure('bad', 'old', None)}
+
+    def add(thread):
+        for number in range(50):
+            quarantine.add('patient', {'mrn': f'{thread}-{number}'}, failures)
+
+    threads = [threading.Thread(target=add, args=(thread,)) for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    quarantine.flush()
+    assert quarantine.row_counts == {'patient': 400}
+    assert len(fetch_quarantined_mrns(engine, quarantine)) == 400
+
+
+def test_async_inserts_quarantine_rows(tmp_path):
+    pytest.importorskip('aiosqlite')
+    from sqlalchemy.ext.asyncio import create_async_engine
+    Base.metadata.create_all(sqlalchemy.create_engine(f'sqlite:///{tmp_path}/test.db'))
+
+    async def load():
+        engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path}/test.db')
+        curator = AsyncCurator(engine, description_paths, on_failure='quarantine')
+        try:
+            return curator, await curator.ainsert_iter('patient', PATIENTS, batch_size=1)
+        finally:
+            await engine.dispose()
+
+    curator, report = asyncio.run(load())
+    assert report == 2
+    assert curator.quarantine.row_counts == {'patient': 2}
+
+
+def test_async_loads_committing_once_defer_table_quarantines(engine, tmp_path):
+    pytest.importorskip('aiosqlite')
+    from sqlalchemy.ext.asyncio import create_async_engine
+    quarantine = TableQuarantine(engine, batch_size=1)
+
+    async def load():
+        async_engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path}/test.db')
+        curator = AsyncCurator(
+            async_engine, description_paths, on_failure='quarantine', quarantine=quarantine)
+        try:
+            return await curator.ainsert_iter('patient', PATIENTS, batch_size=1, commit='load')
+        finally:
+            await async_engine.dispose()
+
+    assert asyncio.run(load()) == 2
+    assert fetch_quarantined_mrns(engine, quarantine) == ['B', 'D']
+
+
+@pytest.mark.parametrize('on_failure', ['raise', 'quarantine'])
+def test_insert_columns_screens_rows(engine, on_failure):
+    curator = Curator(engine, description_paths, on_failure=on_failure)
+    raw_columns = {key: [row[key] for row in PATIENTS] for key in PATIENTS[0]}
+    if on_failure == 'raise':
+        with pytest.raises(TransformError):
+            curator.insert_columns('patient', raw_columns, batch_size=2, commit='load')
+        assert fetch_mrns(engine) == []
+    else:
+        assert curator.insert_columns('patient', raw_columns, batch_size=2) == 2
+        assert fetch_mrns(engine) == ['A', 'C']
+        assert [row.raw_row['mrn'] for row in curator.quarantine.rows] == ['B', 'D']
+
+
+def test_list_quarantine_keeps_at_most_max_rows(engine):
+    quarantine = ListQuarantine(max_rows=3)
+    curator = Curator(engine, description_paths, on_failure='quarantine', quarantine=quarantine)
+    curator.transform_dicts('patient', PATIENTS * 5)
+    assert len(quarantine.rows) == 3
+    assert quarantine.row_counts['patient'] == 10
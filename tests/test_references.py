@@ -0,0 +1,114 @@
+"""Tests for checking `references` against in-memory indexes of parent keys"""
+import pandas as pd
+import pytest
+import sqlalchemy
+from helpers import expand_path
+from thecurator import BloomFilter, Curator, TransformFailure
+
+description_paths = expand_path(__file__, 'fixtures/descriptions/*.yml')
+PATIENTS = [
+    {'mrn': 'A', 'name': 'Ben Sullivan', 'age': '35'},
+    {'mrn': 'B', 'name': 'Emery Redmond', 'age': '18'},
+]
+
+
+def lab(patient_mrn):
+    return {'patient_mrn': patient_mrn, 'name': 'Blood Pressure', 'value': '120',
+            'order_time': '09/03/17 10:30AM', 'taken_time': '09/03/17 11:30AM'}
+
+
+@pytest.fixture
+def statements(engine):
+    executed = []
+    sqlalchemy.event.listen(
+        engine, 'before_cursor_execute', lambda *args: executed.append(args[2]))
+    return executed
+
+
+def test_references_are_not_checked_by_default(engine):
+    cooked_row = Curator(engine, description_paths).transform_dicts('lab', [lab('Z')])[0]
+    assert cooked_row['patient_mrn'] == 'Z'
+
+
+def test_missing_references_become_failures(engine):
+    Curator(engine, description_paths).insert_dicts('patient', PATIENTS)
+    curator = Curator(engine, description_paths, check_references=True)
+    cooked_rows = curator.transform_dicts('lab', [lab('A'), lab('Z'), lab(None)])
+    assert cooked_rows[0]['patient_mrn'] == 'A'
+    failure = cooked_rows[1]['patient_mrn']
+    assert isinstance(failure, TransformFailure)
+    assert failure.value == 'Z'
+    assert failure.location == 'lab.patient_mrn'
+    assert cooked_rows[2]['patient_mrn'] is None
+
+
+def test_keys_are_read_once(engine, statements):
+    Curator(engine, description_paths).insert_dicts('patient', PATIENTS)
+    curator = Curator(engine, description_paths, check_references=True)
+    del statements[:]
+    curator.transform_dicts('lab', [lab('A'), lab('B'), lab('Z')] * 100)
+    assert len([s for s in statements if 'FROM patient' in s]) == 1
+
+
+def test_keys_grow_as_the_parent_is_loaded(engine, statements):
+    curator = Curator(engine, description_paths, check_references=True)
+    assert isinstance(curator.transform_dicts('lab', [lab('A')])[0]['patient_mrn'],
+                      TransformFailure)
+    curator.insert_dicts('patient', PATIENTS[:1])
+    curator.upsert_dicts('patient', PATIENTS[1:])
+    del statements[:]
+    cooked_rows = curator.transform_dicts('lab', [lab('A'), lab('B')])
+    assert [row['patient_mrn'] for row in cooked_rows] == ['A', 'B']
+    assert not [s for s in statements if 'FROM patient' in s]
+
+
+def test_refresh_reads_keys_again(engine):
+    curator = Curator(engine, description_paths, check_references=True)
+    curator.transform_dicts('lab', [lab('A')])
+    Curator(engine, description_paths).insert_dicts('patient', PATIENTS)
+    curator.refresh_references()
+    assert curator.transform_dicts('lab', [lab('A')])[0]['patient_mrn'] == 'A'
+
+
+def test_rolled_back_loads_are_forgotten(engine):
+    curator = Curator(engine, description_paths, check_references=True)
+    curator.transform_dicts('lab', [lab('A')])
+
+    def rows():
+        yield from PATIENTS
+        raise RuntimeError('Extract failed')
+    with pytest.raises(RuntimeError):
+        curator.insert_iter('patient', rows(), batch_size=1, commit='load')
+    assert isinstance(curator.transform_dicts('lab', [lab('A')])[0]['patient_mrn'],
+                      TransformFailure)
+
+
+def test_columns_and_frames_are_checked(engine):
+    Curator(engine, description_paths).insert_dicts('patient', PATIENTS)
+    curator = Curator(engine, description_paths, check_references=True)
+    raw_rows = [lab('A'), lab('Z')]
+    cooked = curator.transform_columns(
+        'lab', {name: [row[name] for row in raw_rows] for name in raw_rows[0]})
+    assert cooked['patient_mrn'][0] == 'A'
+    assert isinstance(cooked['patient_mrn'][1], TransformFailure)
+    df = curator.transform_df('lab', pd.DataFrame(raw_rows))
+    assert df['patient_mrn'][0] == 'A'
+    assert isinstance(df['patient_mrn'][1], TransformFailure)
+
+
+def test_large_parents_use_a_bloom_filter(engine):
+    Curator(engine, description_paths).insert_dicts('patient', PATIENTS)
+    curator = Curator(
+        engine, description_paths, check_references=True, reference_bloom_threshold=1)
+    cooked_rows = curator.transform_dicts('lab', [lab('A'), lab('Z')])
+    assert isinstance(curator.references.keys[('patient', 'mrn')], BloomFilter)
+    assert cooked_rows[0]['patient_mrn'] == 'A'
+    assert isinstance(cooked_rows[1]['patient_mrn'], TransformFailure)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000)
+    bloom.update(range(1000))
+    assert all(value in bloom for value in range(1000))
+    false_positives = sum(value in bloom for value in range(1000, 11000))
+    assert false_positives < 300
@@ -0,0 +1,200 @@
+"""Tests for replacing tables through a staging table swapped in atomically"""
+import pytest
+import sqlalchemy
+from sqlalchemy.dialects import postgresql
+from helpers import expand_path, relative_path
+from thecurator import (
+    Curator, SQLiteLoader, SQLiteTableSwapper, TableSwapper, TransformError, swapper_for)
+from thecurator.private.staging import STAGING_SUFFIX
+
+description_paths = expand_path(__file__, 'fixtures/descriptions/*.yml')
+patients_path = relative_path(__file__, 'fixtures/data/patients_dirty.csv')
+OLD_PATIENTS = [
+    {'mrn': 'A', 'name': 'Ben Sullivan', 'age': '35'},
+    {'mrn': 'B', 'name': 'Emery Redmond', 'age': '18'},
+]
+NEW_PATIENTS = [
+    {'mrn': 'C', 'name': ' Josh Winston ', 'age': '52'},
+    {'mrn': 'D', 'name': 'Ada Lovelace', 'age': '36'},
+    {'mrn': 'E', 'name': 'Grace Hopper', 'age': '85'},
+]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = sqlalchemy.create_engine(f'sqlite:///{tmp_path}/test.db')
+    metadata = sqlalchemy.MetaData()
+    sqlalchemy.Table(
+        'patient', metadata,
+        sqlalchemy.Column('id', sqlalchemy.Integer, primary_key=True),
+        sqlalchemy.Column('mrn', sqlalchemy.String, index=True, unique=True),
+        sqlalchemy.Column('name', sqlalchemy.String, index=True),
+        sqlalchemy.Column('age', sqlalchemy.Integer),
+    )
+    sqlalchemy.Table(
+        'lab', metadata,
+        sqlalchemy.Column('id', sqlalchemy.Integer, primary_key=True),
+        sqlalchemy.Column('patient_mrn', sqlalchemy.String, sqlalchemy.ForeignKey('patient.mrn')),
+        sqlalchemy.Column('name', sqlalchemy.String),
+        sqlalchemy.Column('value', sqlalchemy.Numeric),
+        sqlalchemy.Column('order_time', sqlalchemy.DateTime),
+        sqlalchemy.Column('taken_time', sqlalchemy.DateTime),
+    )
+    metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def curator(engine):
+    curator = Curator(engine, description_paths)
+    curator.insert_dicts('patient', OLD_PATIENTS)
+    return curator
+
+
+def fetch_patients(engine):
+    with engine.connect() as connection:
+        return connection.execute(
+            sqlalchemy.text('SELECT mrn, name, age FROM patient ORDER BY mrn')).all()
+
+
+def table_names(engine):
+    return set(sqlalchemy.inspect(engine).get_table_names())
+
+
+def indexes(engine):
+    return sorted(
+        (index['name'], index['column_names'], bool(index['unique']))
+        for index in sqlalchemy.inspect(engine).get_indexes('patient')
+    )
+
+
+def test_replace_table_swaps_in_the_new_rows(engine, curator):
+    before = indexes(engine)
+    report = curator.replace_table('patient', NEW_PATIENTS, batch_size=2)
+    assert (report, report.batches) == (3, 2)
+    assert fetch_patients(engine) == [
+        ('C', 'Josh Winston', 52), ('D', 'Ada Lovelace', 36), ('E', 'Grace Hopper', 85)]
+    assert indexes(engine) == before
+    assert table_names(engine) == {'patient', 'lab'}
+
+
+def test_tables_can_be_replaced_repeatedly(engine, curator):
+    curator.replace_table('patient', NEW_PATIENTS)
+    curator.replace_table('patient', patients_path)
+    assert [row.mrn for row in fetch_patients(engine)] == ['A', 'B', 'C']
+    curator.insert_dicts('patient', [{'mrn': 'F', 'name': 'Alan Turing', 'age': '41'}])
+    assert len(fetch_patients(engine)) == 4
+
+
+def test_readers_see_the_old_rows_until_the_swap(engine, curator):
+    seen = []
+
+    class ObservingLoader(SQLiteLoader):
+        def insert(self, connection, table, batch):
+            super().insert(connection, table, batch)
+            seen.append(fetch_patients(engine))
+
+    curator.loader = ObservingLoader()
+    curator.replace_table('patient', NEW_PATIENTS, batch_size=1)
+    old_rows = [('A', 'Ben Sullivan', 35), ('B', 'Emery Redmond', 18)]
+    assert seen == [old_rows] * 3
+
+
+def test_failed_loads_leave_the_table_alone(engine):
+    curator = Curator(engine, description_paths, on_failure='raise')
+    curator.insert_dicts('patient', OLD_PATIENTS)
+    rows = NEW_PATIENTS + [{'mrn': 'F', 'name': 'Alan Turing', 'age': 'unknown'}]
+    with pytest.raises(TransformError):
+        curator.replace_table('patient', rows, batch_size=2)
+    assert [row.mrn for row in fetch_patients(engine)] == ['A', 'B']
+    assert table_names(engine) == {'patient', 'lab'}
+
+
+def test_failed_swaps_are_rolled_back(engine, curator):
+    before = indexes(engine)
+    with pytest.raises(sqlalchemy.exc.IntegrityError):
+        curator.replace_table('patient', NEW_PATIENTS + NEW_PATIENTS[:1])
+    assert [row.mrn for row in fetch_patients(engine)] == ['A', 'B']
+    assert indexes(engine) == before
+    assert table_names(engine) == {'patient', 'lab'}
+
+
+def test_leftover_staging_tables_are_replaced(engine, curator):
+    with engine.begin() as connection:
+        connection.exec_driver_sql(f'CREATE TABLE patient{STAGING_SUFFIX} (junk TEXT)')
+    curator.replace_table('patient', NEW_PATIENTS)
+    assert len(fetch_patients(engine)) == 3
+
+
+def test_replaced_rows_are_upserted_again(engine, curator):
+    curator.upsert_dicts('patient', NEW_PATIENTS)
+    curator.replace_table('patient', [])
+    report = curator.upsert_dicts('patient', NEW_PATIENTS)
+    assert (report.inserted, report.unchanged) == (3, 0)
+
+
+def test_tables_with_foreign_keys_are_replaced(engine, curator):
+    labs = [{'patient_mrn': 'A', 'name': 'Heart Rate', 'value': '80',
+             'order_time': '2017-09-03 10:30', 'taken_time': '09/03/17 11:30AM'}]
+    assert curator.replace_table('lab', labs) == 1
+    assert curator.replace_table('lab', labs * 2) == 2
+    foreign_keys = sqlalchemy.inspect(engine).get_foreign_keys('lab')
+    assert [(key['referred_table'], key['referred_columns']) for key in foreign_keys] == \
+        [('patient', ['mrn'])]
+    assert table_names(engine) == {'patient', 'lab'}
+
+
+class RecordingConnection():
+    """Records the statements a swapper runs, compiled for PostgreSQL"""
+    dialect = postgresql.dialect()
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement):
+        self.statements.append(str(statement.compile(dialect=self.dialect)).strip())
+
+    def exec_driver_sql(self, statement):
+        self.statements.append(statement)
+
+
+def test_default_swapper_renames_staged_indexes_and_constraints():
+    metadata = sqlalchemy.MetaData()
+    sqlalchemy.Table(
+        'patient', metadata,
+        sqlalchemy.Column('mrn', sqlalchemy.String, unique=True),
+    )
+    table = sqlalchemy.Table(
+        'lab', metadata,
+        sqlalchemy.Column('id', sqlalchemy.Integer),
+        sqlalchemy.Column('patient_mrn', sqlalchemy.String),
+        sqlalchemy.PrimaryKeyConstraint('id', name='lab_pkey'),
+        sqlalchemy.ForeignKeyConstraint(['patient_mrn'], ['patient.mrn'], name='lab_patient_fkey'),
+        sqlalchemy.Index('ix_lab_patient_mrn', 'patient_mrn'),
+    )
+    swapper = TableSwapper()
+    staging = swapper.staging_table(table)
+    assert staging.name == 'lab' + STAGING_SUFFIX
+    assert not staging.indexes
+    assert sorted(constraint.name for constraint in staging.constraints) == \
+        ['lab_patient_fkey' + STAGING_SUFFIX, 'lab_pkey' + STAGING_SUFFIX]
+    connection = RecordingConnection()
+    swapper.swap(connection, table, staging)
+    assert connection.statements[:3] == [
+        'DROP TABLE lab',
+        f'ALTER TABLE lab{STAGING_SUFFIX} RENAME TO lab',
+        f'ALTER INDEX ix_lab_patient_mrn{STAGING_SUFFIX} RENAME TO ix_lab_patient_mrn',
+    ]
+    assert sorted(connection.statements[3:]) == [
+        f'ALTER TABLE lab RENAME CONSTRAINT lab_patient_fkey{STAGING_SUFFIX} TO lab_patient_fkey',
+        f'ALTER TABLE lab RENAME CONSTRAINT lab_pkey{STAGING_SUFFIX} TO lab_pkey',
+    ]
+
+
+def test_swapper_for_dialect(engine):
+    assert type(swapper_for(engine.dialect)) is SQLiteTableSwapper
+
+    class Dialect():
+        name = 'unknown'
+
+    assert type(swapper_for(Dialect())) is TableSwapper
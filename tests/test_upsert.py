@@ -0,0 +1,187 @@
+"""Tests for idempotent upserts and resumable loads"""
+import os
+import pytest
+import sqlalchemy
+from helpers import expand_path
+from thecurator import Curator, MetricsCollector, UpsertReport
+
+description_paths = expand_path(__file__, 'fixtures/descriptions/*.yml')
+PATIENTS = [
+    {'mrn': 'A', 'name': ' Ben Sullivan ', 'age': '35'},
+    {'mrn': 'B', 'name': 'Emery Redmond', 'age': '18'},
+    {'mrn': 'C', 'name': 'Josh Winston', 'age': '52'},
+    {'mrn': 'D', 'name': 'Ada Lovelace', 'age': '36'},
+    {'mrn': 'E', 'name': 'Grace Hopper', 'age': '85'},
+]
+
+
+def fetch_patients(engine):
+    with engine.connect() as connection:
+        return connection.execute(
+            sqlalchemy.text('SELECT mrn, name, age FROM patient ORDER BY mrn')).all()
+
+
+def test_upsert_inserts_new_rows(engine):
+    report = Curator(engine, description_paths).upsert_dicts('patient', PATIENTS)
+    assert isinstance(report, UpsertReport)
+    assert (report, report.inserted, report.updated, report.unchanged) == (5, 5, 0, 0)
+    assert fetch_patients(engine)[0] == ('A', 'Ben Sullivan', 35)
+
+
+def test_unchanged_rows_are_not_transformed_or_written(engine):
+    Curator(engine, description_paths).upsert_iter('patient', PATIENTS)
+    collector = MetricsCollector()
+    report = Curator(engine, description_paths, metrics=collector) \
+        .upsert_iter('patient', PATIENTS, batch_size=2)
+    assert (report, report.unchanged) == (0, 5)
+    metrics = collector.as_dict()['patient']
+    assert metrics['rows'] == 0
+    assert metrics['columns']['name']['calls'] == 0
+    assert len(fetch_patients(engine)) == 5
+
+
+def test_changed_rows_are_updated(engine):
+    curator = Curator(engine, description_paths)
+    curator.upsert_iter('patient', PATIENTS)
+    new_patient = {'mrn': 'F', 'name': 'Alan Turing', 'age': '41'}
+    changed = [dict(PATIENTS[1], age='19')] + PATIENTS[2:] + [new_patient]
+    report = curator.upsert_iter('patient', changed)
+    assert (report.inserted, report.updated, report.unchanged) == (1, 1, 3)
+    patients = fetch_patients(engine)
+    assert len(patients) == 6
+    assert patients[1] == ('B', 'Emery Redmond', 19)
+
+
+def test_skip_leaves_existing_rows_alone(engine):
+    curator = Curator(engine, description_paths)
+    curator.insert_iter('patient', PATIENTS[:1])
+    curator.upsert_iter('patient', PATIENTS[1:2])
+    report = curator.upsert_iter(
+        'patient', [dict(PATIENTS[0], age='99'), dict(PATIENTS[1], age='99')], on_conflict='skip')
+    assert (report, report.skipped) == (0, 2)
+    assert [patient.age for patient in fetch_patients(engine)] == [35, 18]
+
+
+def test_skipped_rows_are_updated_later(engine):
+    curator = Curator(engine, description_paths)
+    curator.insert_dicts('patient', [{'mrn': 'A', 'name': 'old', 'age': '30'}])
+    changed = [{'mrn': 'A', 'name': 'new', 'age': '40'}]
+    report = curator.upsert_dicts('patient', changed, on_conflict='skip')
+    assert report.skipped == 1
+    report = curator.upsert_dicts('patient', changed)
+    assert (report.updated, report.unchanged) == (1, 0)
+    assert fetch_patients(engine) == [('A', 'new', 40)]
+
+
+def test_rows_loaded_without_upserting_are_matched(engine):
+    curator = Curator(engine, description_paths)
+    curator.insert_iter('patient', PATIENTS)
+    report = curator.upsert_iter('patient', PATIENTS)
+    assert (report.inserted, report.updated) == (0, 5)
+    assert len(fetch_patients(engine)) == 5
+
+
+def test_last_row_with_a_key_wins(engine):
+    rows = [PATIENTS[0], dict(PATIENTS[0], age='36')]
+    report = Curator(engine, description_paths).upsert_iter('patient', rows)
+    assert report.inserted == 1
+    assert fetch_patients(engine) == [('A', 'Ben Sullivan', 36)]
+
+
+def test_interrupted_loads_resume_from_the_checkpoint(engine, tmp_path):
+    checkpoint = str(tmp_path / 'patient.checkpoint')
+    curator = Curator(engine, description_paths)
+
+    def crashing_rows():
+        yield from PATIENTS[:4]
+        raise RuntimeError('Extract went away')
+
+    with pytest.raises(RuntimeError):
+        curator.upsert_iter('patient', crashing_rows(), batch_size=2, checkpoint=checkpoint)
+    assert len(fetch_patients(engine)) == 4
+    assert os.path.exists(checkpoint)
+
+    report = curator.upsert_iter('patient', PATIENTS, batch_size=2, checkpoint=checkpoint)
+    assert (report.resumed_from, report.inserted, report.batches) == (4, 1, 1)
+    assert len(fetch_patients(engine)) == 5
+    assert not os.path.exists(checkpoint)
+
+
+def test_checkpoints_for_other_batch_sizes_are_ignored(engine, tmp_path):
+    checkpoint = tmp_path / 'patient.checkpoint'
+    checkpoint.write_text('{"table": "patient", "batch_size": 2, "batches": 2}')
+    report = Curator(engine, description_paths).upsert_iter(
+        'patient', PATIENTS, batch_size=3, checkpoint=str(checkpoint))
+    assert (report.resumed_from, report.inserted) == (0, 5)
+
+
+def test_composite_keys(tmp_path):
+    path = tmp_path / 'reading.yml'
+    path.write_text(
+        'name: reading\nkey: [station, day]\ncolumns:\n'
+        '  - name: station\n    type: string\n'
+        '  - name: day\n    type: string\n'
+        '  - name: value\n    type: integer\n    transform: transformers.common.positive_integer\n')
+    engine = sqlalchemy.create_engine(f'sqlite:///{tmp_path}/readings.db')
+    metadata = sqlalchemy.MetaData()
+    sqlalchemy.Table(
+        'reading', metadata,
+        *[sqlalchemy.Column(name, sqlalchemy.String) for name in ('station', 'day')],
+        sqlalchemy.Column('value', sqlalchemy.Integer))
+    metadata.create_all(engine)
+    curator = Curator(engine, [str(path)])
+    curator.upsert_iter('reading', [
+        {'station': 'a', 'day': '1', 'value': '1'},
+        {'station': 'a', 'day': '2', 'value': '2'},
+    ])
+    report = curator.upsert_iter('reading', [
+        {'station': 'a', 'day': '2', 'value': '3'},
+        {'station': 'b', 'day': '2', 'value': '4'},
+    ])
+    assert (report.inserted, report.updated) == (1, 1)
+    with engine.connect() as connection:
+        assert connection.execute(sqlalchemy.text(
+            'SELECT station, day, value FROM reading ORDER BY station, day')).all() == \
+            [('a', '1', 1), ('a', '2', 3), ('b', '2', 4)]
+
+
+def test_tables_without_keys_cant_be_upserted(engine):
+    with pytest.raises(ValueError, match='no key'):
+        Curator(engine, description_paths).upsert_iter('lab', [])
+
+
+def test_unknown_conflict_policy(engine):
+    with pytest.raises(ValueError):
+        Curator(engine, description_paths).upsert_iter('patient', [], on_conflict='merge')
+
+
+def test_keys_must_be_described_columns(tmp_path):
+    path = tmp_path / 'note.yml'
+    path.write_text('name: note\nkey: id\ncolumns:\n  - name: text\n    type: string\n')
+    with pytest.raises(ValueError, match="Key column id isn't a column of note"):
+        Curator(sqlalchemy.create_engine('sqlite://'), [str(path)])
+
+
+def test_rows_are_matched_on_transformed_keys(tmp_path):
+    path = tmp_path / 'station.yml'
+    path.write_text(
+        'name: station\nkey: code\ncolumns:\n'
+        '  - name: code\n    type: string\n    transform: transformers.common.strip\n'
+        '  - name: name\n    type: string\n')
+    engine = sqlalchemy.create_engine(f'sqlite:///{tmp_path}/stations.db')
+    metadata = sqlalchemy.MetaData()
+    sqlalchemy.Table(
+        'station', metadata,
+        *[sqlalchemy.Column(name, sqlalchemy.String) for name in ('code', 'name')])
+    metadata.create_all(engine)
+    curator = Curator(engine, [str(path)])
+    report = curator.upsert_iter('station', [
+        {'code': ' A ', 'name': 'first'},
+        {'code': 'A', 'name': 'second'},
+    ])
+    assert report.inserted == 1
+    report = curator.upsert_iter('station', [{'code': 'A ', 'name': 'third'}])
+    assert report.updated == 1
+    with engine.connect() as connection:
+        assert connection.execute(sqlalchemy.text(
+            'SELECT code, name FROM station')).all() == [('A', 'third')]
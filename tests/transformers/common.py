@@ -1,4 +1,4 @@
-from thecurator import transform_failure
+from thecurator import cacheable, transform_failure
 import dateparser
 import re
 
@@ -22,9 +22,14 @@ def positive_integer(raw_value):
     return transform_failure("Unsure how to handle value type", raw_value)
 
 
+@cacheable(maxsize=128)
 def datetime(raw_value):
     return dateparser.parse(raw_value)
 
 
 def strip(raw_value):
     return raw_value.strip()
+
+
+def vectorized_strip(series):
+    return series.str.strip()
@@ -0,0 +1,34 @@
+from thecurator import requires_row
+
+calls = {'quantity': 0}
+
+
+@requires_row
+def quantity(row):
+    calls['quantity'] += 1
+    return int(row['quantity'])
+
+
+def price(raw_value):
+    return float(raw_value)
+
+
+@requires_row(depends_on=['quantity', 'price'])
+def total(row):
+    return row['quantity'] * row['price']
+
+
+@requires_row(depends_on=['total'])
+def label(row):
+    # Doesn't declare `quantity`, so it reads the raw value
+    return f"{row['quantity']!r} for {row['total']:.2f}"
+
+
+@requires_row(depends_on=['second'])
+def first(row):
+    return row['first']
+
+
+@requires_row(depends_on=['first'])
+def second(row):
+    return row['second']
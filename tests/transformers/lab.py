@@ -1,19 +1,33 @@
-from thecurator import requires_row
+from thecurator import requires_row, vectorized
 
+ALERTNESS_LEVELS = {'low': 0, 'medium': 1, 'high': 2}
 
+
+def vectorized_name(df):
+    return df['name'].str.strip().str.split().str.join('_').str.lower()
+
+
+def vectorized_value(df):
+    values = df['value'].str.lower()
+    is_alertness = df['name'] == 'alertness'
+    return values.where(~is_alertness).astype(float) \
+        .where(~is_alertness, values.map(ALERTNESS_LEVELS))
+
+
+@vectorized(vectorized_name)
 @requires_row
 def name(raw):
     raw_name = raw['name']
     return '_'.join(raw_name.strip().split()).lower()
 
 
-@requires_row
-def value(raw):
-    cleaned_name = name(raw)
-    value = raw['value'].lower()
+@vectorized(vectorized_value)
+@requires_row(depends_on=['name'])
+def value(row):
+    value = row['value'].lower()
 
-    if cleaned_name == 'alertness':
-        cleaned_value = {'low': 0, 'medium': 1, 'high': 2}[value]
+    if row['name'] == 'alertness':
+        cleaned_value = ALERTNESS_LEVELS[value]
         return cleaned_value
     else:
         return float(value)
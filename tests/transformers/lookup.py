@@ -0,0 +1,28 @@
+import sqlalchemy
+from thecurator import batch_transform
+
+engine = sqlalchemy.create_engine('sqlite://')
+metadata = sqlalchemy.MetaData()
+lab_code = sqlalchemy.Table(
+    'lab_code', metadata,
+    sqlalchemy.Column('id', sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column('code', sqlalchemy.String, unique=True),
+)
+metadata.create_all(engine)
+with engine.begin() as connection:
+    connection.execute(lab_code.insert(), [
+        {'id': 1, 'code': 'BP'},
+        {'id': 2, 'code': 'HR'},
+        {'id': 3, 'code': 'O2'},
+    ])
+
+"""Codes passed to each query, most recent last"""
+queries = []
+
+
+@batch_transform
+def lab_code_id(codes):
+    queries.append(sorted(codes))
+    select = sqlalchemy.select(lab_code.c.code, lab_code.c.id).where(lab_code.c.code.in_(codes))
+    with engine.connect() as connection:
+        return dict(connection.execute(select).all())
@@ -1,9 +1,9 @@
 from thecurator import requires_row
 
 
-@requires_row
+@requires_row(depends_on=['age'])
 def name(row):
-    if age(row) > 50:
+    if row['age'] > 50:
         return 'old'
     else:
         return 'young'
@@ -1,28 +1,160 @@
+import contextlib
 import inspect
+import itertools
+from time import perf_counter
+import os
 import sqlalchemy
-from .private import pypy_incompatible
+from .private import (
+    asynchronous, batched, frames, parallel, pypy_incompatible, readers, scheduler, upsert)
+from .private.columns import iter_column_batches
+from .private.cache import DEFAULT_CACHE_SIZE
+from .private.failure import TransformError, TransformFailure  # noqa: F401
+from .private.loaders import (  # noqa: F401
+    LOADERS, LoadReport, Loader, PostgresCopyLoader, SQLiteLoader, loader_for)
+from .private.metrics import MetricsCollector  # noqa: F401
+from .private.quarantine import (  # noqa: F401
+    FileQuarantine, ListQuarantine, Quarantine, QuarantinedRow, TableQuarantine, screen)
+from .private.reflection import TableReflector
+from .private.references import BloomFilter, ReferenceIndex  # noqa: F401
+from .private.staging import (  # noqa: F401
+    SWAPPERS, SQLiteTableSwapper, TableSwapper, swapper_for)
+from .private.upsert import RowHashStore, UpsertReport  # noqa: F401
 from .private.table_description import Registry
 
 """Version number of this package"""
 __VERSION__ = (0, 2, 1)
 
+"""Number of rows sent to the database per statement by `Curator.insert_iter`"""
+DEFAULT_BATCH_SIZE = 1000
 
-def requires_row(func):
+"""Number of rows handed to each worker process at a time when transforming
+in parallel"""
+DEFAULT_CHUNK_SIZE = 10000
+
+"""Whether `transform_failure` records the location of its caller"""
+capture_failure_locations = True
+
+"""Most transformed batches `AsyncCurator` holds while waiting on inserts"""
+DEFAULT_MAX_PENDING = 2
+
+"""Number of loads `Curator.load_all` runs at once"""
+DEFAULT_LOAD_WORKERS = 4
+
+"""Commit policies accepted by `Curator.insert_iter`"""
+COMMIT_PER_BATCH = 'batch'
+COMMIT_PER_LOAD = 'load'
+
+"""What curators do with rows whose transform returned failures"""
+FAILURE_KEEP = 'keep'
+FAILURE_RAISE = 'raise'
+FAILURE_QUARANTINE = 'quarantine'
+
+"""What `Curator.upsert_iter` does with rows whose key was loaded before"""
+ON_CONFLICT_UPDATE = 'update'
+ON_CONFLICT_SKIP = 'skip'
+
+
+def requires_row(func=None, depends_on=None):
     """Decorator used to mark transforms that require an entire row as input.
 
+    May be applied as `@requires_row` or `@requires_row(depends_on=[...])`.
+    The row passed to the transform holds raw values, except for the columns
+    named in `depends_on`, which hold the values their own transforms
+    returned. Those columns are transformed first and exactly once per row,
+    so a transform never needs to call another to get a cleaned value.
+    Dependency cycles are rejected when the description is loaded.
+
+    Attributes:
+        func (function): The function
+        depends_on (:obj:`list` of :obj:`str`, optional): Columns whose
+            transformed values the transform reads
+
+    Returns:
+        function: The function marked as requiring the row
+    """
+    def decorator(func):
+        func.requires_row = True
+        func.depends_on = tuple(depends_on or ())
+        return func
+    if func is None:
+        return decorator
+    return decorator(func)
+
+
+def cacheable(maxsize=DEFAULT_CACHE_SIZE):
+    """Decorator used to mark pure transforms whose results may be cached.
+
+    Results are kept in a bounded LRU cache per table column, so a value that
+    repeats is only transformed once while it stays in the cache. Only mark
+    transforms of a single value that always return the same result for the
+    same input. A column's `cache` key in the table description overrides
+    this.
+
+    May be applied as `@cacheable` or `@cacheable(maxsize=...)`.
+
+    Attributes:
+        maxsize (int): Most results kept per column
+
+    Returns:
+        function: Decorator that marks the transform as cacheable
+    """
+    if callable(maxsize):
+        return cacheable()(maxsize)
+
+    def decorator(func):
+        func.cache_maxsize = maxsize
+        return func
+    return decorator
+
+
+def batch_transform(func):
+    """Decorator used to mark transforms that transform many values at once.
+
+    Instead of a single value, the transform receives a list of the distinct
+    values of its column in a chunk of rows and returns a mapping of each
+    value to its transformed value, so a transform looking codes up in a
+    reference table makes one query per chunk rather than one per row. Values
+    missing from the mapping are transformed to a `TransformFailure`. Values
+    must be hashable.
+
     Attributes:
         func (function): The function
 
     Returns:
-        function: The function with an
+        function: The function marked as a batch transform
     """
-    func.requires_row = True
+    func.batch_transform = True
     return func
 
 
-def transform_failure(self, message, raw_value, location=None):
+def vectorized(vectorized_fn):
+    """Decorator used to register a vectorized counterpart for a transform.
+
+    `Curator.transform_df` calls the counterpart once per column instead of
+    calling the transform once per value. It receives the column as a
+    pandas.Series, or the entire pandas.DataFrame when the transform requires
+    the row, and must return a pandas.Series.
+
+    Attributes:
+        vectorized_fn (function): The vectorized counterpart
+
+    Returns:
+        function: Decorator that marks the transform with its counterpart
+    """
+    def decorator(func):
+        func.vectorized = vectorized_fn
+        return func
+    return decorator
+
+
+def transform_failure(message, raw_value, location=None):
     """Creates a TransformFailure used to detail when things go wrong.
 
+    Unless a location is provided, only the caller's file name and line number
+    are recorded. They're formatted the first time the failure's `location` or
+    `message` is read. Set `thecurator.capture_failure_locations` to `False`
+    to skip recording them altogether.
+
     Attributes:
         message (string): The message you want to display
         raw_value (any): The value to be transformed
@@ -31,136 +163,841 @@ def transform_failure(self, message, raw_value, location=None):
     Returns:
         TransformFailure
     """
-    caller = inspect.getframeinfo(inspect.stack()[1][0])
-    if not location:
-        location = "%s:%d" % (caller.filename, caller.lineno)
+    if not location and capture_failure_locations:
+        caller = inspect.currentframe().f_back
+        location = (caller.f_code.co_filename, caller.f_lineno)
     return TransformFailure(message, raw_value, location)
 
 
 class Curator():
-    def __init__(self, sqlalchemy_engine, description_paths):
+    def __init__(self, sqlalchemy_engine, description_paths, reflection_cache=None,
+                 description_cache=None, metrics=None, loader=None, check_references=False,
+                 reference_bloom_threshold=None, on_failure=FAILURE_KEEP, quarantine=None,
+                 swapper=None):
         """
+        Args:
+            sqlalchemy_engine (sqlalchemy.engine.Engine): Database to load into
+            description_paths (:obj:`list` of :obj:`str`): Table descriptions
+            reflection_cache (str, optional): File to persist reflected table
+                definitions to, so later runs can skip reflecting them
+            description_cache (str, optional): Directory to cache parsed and
+                validated descriptions in, so unchanged descriptions skip
+                parsing and validation in later runs and worker processes
+            metrics (MetricsCollector, optional): Collector recording call
+                counts, time spent and failures per table and column
+            loader (Loader, optional): Inserts batches of transformed rows.
+                Defaults to the loader registered in `LOADERS` for the
+                engine's dialect, such as `SQLiteLoader` for SQLite.
+            check_references (bool): Whether the transformed values of
+                columns declaring `references: table.column` are checked
+                against that column. Its distinct values are read with a
+                single query the first time they're needed and kept in memory,
+                growing as this curator loads the parent table, so each row
+                is checked without a round trip. Values that aren't found are
+                replaced with a `TransformFailure`.
+            reference_bloom_threshold (int, optional): Parent columns with
+                more distinct values than this are held in a `BloomFilter`
+                instead of a set, using a fraction of the memory but letting
+                about 1% of missing values through unnoticed.
+            on_failure (str): What to do with rows whose transform returned
+                failures. `'keep'` leaves the failures in the transformed rows,
+                `'raise'` raises a `TransformError` for the first such row and
+                `'quarantine'` hands them to `quarantine` and leaves them out,
+                so the clean rows are still inserted in bulk. Rows are
+                screened as they're transformed by the methods taking rows
+                and by every insert; `transform_columns` and `transform_df`
+                keep their failures.
+            quarantine (Quarantine, optional): Where rows are quarantined,
+                such as a `ListQuarantine`, `FileQuarantine` or
+                `TableQuarantine`. Defaults to a `ListQuarantine` keeping its
+                first `max_rows` (10,000) rows and counting the rest.
+            swapper (TableSwapper, optional): Stages and swaps in the tables
+                `replace_table` refreshes. Defaults to the swapper registered
+                in `SWAPPERS` for the engine's dialect, such as
+                `SQLiteTableSwapper` for SQLite.
+
+        Note:
+            Tables are reflected individually the first time they're inserted
+            into rather than reflecting the entire database up front.
         """
         if len(description_paths) == 0:
             raise ValueError("Description paths argument provided was empty")
+        if on_failure not in (FAILURE_KEEP, FAILURE_RAISE, FAILURE_QUARANTINE):
+            raise ValueError(f'Unknown failure policy {on_failure}')
 
         self.engine = sqlalchemy_engine
-        self.sqlalchemy_meta = sqlalchemy.MetaData()
-        self.sqlalchemy_meta.reflect(bind=sqlalchemy_engine)
-        self.table_registry = Registry(description_paths)
+        self.description_paths = list(description_paths)
+        self.description_cache = description_cache
+        self.metrics = metrics
+        self.loader = loader or loader_for(sqlalchemy_engine.dialect)
+        self.swapper = swapper or swapper_for(sqlalchemy_engine.dialect)
+        self.on_failure = on_failure
+        self.quarantine = None
+        if on_failure == FAILURE_QUARANTINE:
+            self.quarantine = quarantine if quarantine is not None else ListQuarantine()
+        self.table_reflector = TableReflector(sqlalchemy_engine, reflection_cache)
+        self.table_registry = Registry(description_paths, description_cache)
+        self.references = None
+        if check_references:
+            self.references = ReferenceIndex(
+                self.table_reflector, sqlalchemy_engine, reference_bloom_threshold)
+
+    def get_plan(self, table_name, columns=None):
+        """Returns the compiled `TransformPlan` this curator uses for a table,
+        projected to `columns` when given"""
+        return self.table_registry.get_plan(
+            table_name, metrics=self.metrics, references=self.references,
+            columns=None if columns is None else tuple(columns))
+
+    def refresh_references(self):
+        """Forgets the referenced values read so far, so they're read again
+        the next time they're needed. Call it when parent tables were changed
+        other than through this curator."""
+        if self.references is not None:
+            self.references.discard()
+
+    def _read_references(self, connection, table_name):
+        """Reads the values referenced by a table that haven't been read yet
+        through the connection about to load it"""
+        if self.references is not None:
+            self.references.read(
+                connection, self.get_plan(table_name).referenced_columns.values())
+            # End the transaction reading began, so the load can begin its own
+            if connection.in_transaction():
+                connection.rollback()
+
+    def _screen(self, table_name, pairs):
+        """Yields the `(raw_row, cooked_row)` pairs without failures,
+        raising or quarantining the rest according to the failure policy"""
+        return screen(table_name, pairs, self.quarantine)
+
+    def _deferring_quarantine(self):
+        """Returns a context holding quarantined rows back until it exits,
+        for loads holding a single transaction open"""
+        if self.quarantine is None:
+            return contextlib.nullcontext()
+        return self.quarantine.deferred()
+
+    def _chunk_transformer(self, table_name, columns=None):
+        """Returns the function transforming a chunk of rows and screening
+        out the rows with failures according to the failure policy"""
+        plan = self.get_plan(table_name, columns)
+        if self.on_failure == FAILURE_KEEP:
+            return plan.transform_chunk
+
+        def transform_chunk(raw_rows):
+            pairs = zip(raw_rows, plan.transform_chunk(raw_rows))
+            return [cooked_row for _, cooked_row in self._screen(table_name, pairs)]
+        return transform_chunk
+
+    def _record_references(self, table_name, rows):
+        """Adds rows loaded into a table to the values referencing it is
+        checked against"""
+        if self.references is not None:
+            self.references.record(table_name, rows)
+
+    def registry_args(self):
+        """Returns the arguments needed to rebuild the table registry, used by
+        worker processes"""
+        return (self.description_paths, self.description_cache)
+
+    @property
+    def sqlalchemy_meta(self):
+        """sqlalchemy.MetaData: Metadata holding the tables reflected so far"""
+        return self.table_reflector.metadata
+
+    def get_sqlalchemy_table(self, table_name):
+        """Returns the reflected `sqlalchemy.Table` for a table, reflecting it
+        the first time it's requested.
 
-    def insert_dicts(self, table_name, raw_rows):
+        Args:
+            table_name (str): Name of the table
+
+        Raises:
+            LookupError: When the table isn't described
+            sqlalchemy.exc.NoSuchTableError: When the table doesn't exist
+        """
+        self.table_registry.get_table(table_name)
+        return self.table_reflector.get_table(table_name)
+
+    def insert_dicts(self, table_name, raw_rows, batch_size=DEFAULT_BATCH_SIZE, columns=None):
         """Transform and insert the provided dicts into the database.
 
-        Insertion occurs in a database transaction, so if any failure occurs
-        an exception will be raised and nothing will be writtent to the
+        Insertion occurs in a single database transaction, so if any failure
+        occurs the exception is raised and nothing is written to the
         database.
 
         Args:
-            table_name (str): Message to incorporate into the final message
-            raw_rows (dict): Value the failure occurred for
+            table_name (str): Name of the table to insert into
+            raw_rows (:obj:`list` of :obj:`dict`): Rows to transform and insert
+            batch_size (int): Number of rows sent per insert statement
+            columns (:obj:`list` of :obj:`str`, optional): Columns to
+                project to, see `transform_dicts`
+
+        Returns:
+            LoadReport: Number of rows inserted and how long it took
+        """
+        cooked_rows = self.transform_dicts(table_name, raw_rows, columns=columns)
+        return self._insert_batches(
+            table_name, batched(cooked_rows, batch_size), COMMIT_PER_LOAD)
+
+    def insert_iter(self, table_name, raw_rows, batch_size=DEFAULT_BATCH_SIZE,
+                    commit=COMMIT_PER_BATCH, columns=None):
+        """Transform and insert rows from any iterable in fixed-size batches.
+
+        Rows are pulled from the iterable lazily, so at most one batch is held
+        in memory at a time regardless of how many rows are loaded.
+
+        Args:
+            table_name (str): Name of the table to insert into
+            raw_rows (iterable of :obj:`dict`): Rows to transform and insert
+            batch_size (int): Number of rows sent per insert statement
+            commit (str): `'batch'` to commit after every batch so a failure
+                only rolls back the batch it occurred in, or `'load'` to
+                insert everything in a single transaction
+            columns (:obj:`list` of :obj:`str`, optional): Columns to
+                project to, see `transform_dicts`
+
+        Returns:
+            LoadReport: Number of rows inserted and how long it took
+
+        Raises:
+            ValueError: When the commit policy is unknown
+        """
+        cooked_rows = self.transform_iter(table_name, raw_rows, batch_size, columns)
+        batches = batched(cooked_rows, batch_size)
+        return self._insert_batches(table_name, batches, commit)
+
+    def insert_columns(self, table_name, raw_columns, batch_size=DEFAULT_BATCH_SIZE,
+                       commit=COMMIT_PER_BATCH, columns=None):
+        """Transform and insert column-oriented data in fixed-size batches.
+
+        Rows with failures are raised or quarantined according to the
+        curator's failure policy.
+
+        Args:
+            table_name (str): Name of the table to insert into
+            raw_columns (dict): Equally long sequences keyed by column name
+            batch_size (int): Number of rows sent per insert statement
+            commit (str): Commit policy, see `insert_iter`
+            columns (:obj:`list` of :obj:`str`, optional): Columns to
+                project to, see `transform_dicts`
+
+        Returns:
+            LoadReport: Number of rows inserted and how long it took
+
+        Raises:
+            ValueError: When the commit policy is unknown or the columns
+            aren't the same length
+        """
+        cooked_columns = self.transform_columns(table_name, raw_columns, columns)
+        batches = iter_column_batches(cooked_columns, batch_size)
+        if self.on_failure != FAILURE_KEEP:
+            pairs = zip(
+                itertools.chain.from_iterable(iter_column_batches(raw_columns, batch_size)),
+                itertools.chain.from_iterable(batches))
+            cooked_rows = (cooked_row for _, cooked_row in self._screen(table_name, pairs))
+            batches = batched(cooked_rows, batch_size)
+        return self._insert_batches(table_name, batches, commit)
+
+    def upsert_dicts(self, table_name, raw_rows, on_conflict=ON_CONFLICT_UPDATE,
+                     batch_size=DEFAULT_BATCH_SIZE, checkpoint=None, columns=None):
+        """Transform and upsert the provided dicts, see `upsert_iter`"""
+        return self.upsert_iter(
+            table_name, raw_rows, on_conflict, batch_size, checkpoint, columns)
+
+    def upsert_iter(self, table_name, raw_rows, on_conflict=ON_CONFLICT_UPDATE,
+                    batch_size=DEFAULT_BATCH_SIZE, checkpoint=None, columns=None):
+        """Transform and upsert rows from any iterable, so loads over
+        overlapping extracts can be rerun.
+
+        Rows are matched on the transformed values of the columns named by
+        the description's `key`, which are transformed up front for every
+        row. Rows with a new key are inserted and rows with a key already in the
+        table are updated or left alone depending on `on_conflict`. A digest
+        of every raw row upserted is kept in a side table
+        (`thecurator_row_hashes`), so rows upserted before with the same
+        contents are skipped without being transformed or written. Every
+        batch is committed on its own.
+
+        Args:
+            table_name (str): Name of the table to upsert into
+            raw_rows (iterable of :obj:`dict`): Rows to transform and upsert
+            on_conflict (str): `'update'` to update rows whose key exists or
+                `'skip'` to leave them alone
+            batch_size (int): Number of rows written per batch
+            checkpoint (str, optional): File recording the batches committed
+                so far. When a load with the same table and batch size is
+                interrupted, rerunning it over the same rows resumes after the
+                last committed batch. The file is removed once the load
+                completes.
+            columns (:obj:`list` of :obj:`str`, optional): Columns to
+                project to, see `transform_dicts`. The key columns are always
+                included, so existing rows have only these columns updated.
+
+        Returns:
+            UpsertReport: Number of rows written, along with the numbers
+            inserted, updated, unchanged and skipped
+
+        Raises:
+            ValueError: When `on_conflict` is unknown or the table has no key
+        """
+        if on_conflict not in (ON_CONFLICT_UPDATE, ON_CONFLICT_SKIP):
+            raise ValueError(f'Unknown conflict policy {on_conflict}')
+        description = self.table_registry.get_table(table_name)
+        if not description.get('key'):
+            raise ValueError(f'Table {table_name} has no key to upsert on')
+        if columns is not None:
+            key = list(description['key'])
+            columns = key + [column_name for column_name in columns if column_name not in key]
+        with self.engine.connect() as connection:
+            self._read_references(connection, table_name)
+        return upsert.upsert_iter(
+            self.engine, self.loader, self.get_plan(table_name, columns),
+            self.get_sqlalchemy_table(table_name), description, raw_rows,
+            on_conflict == ON_CONFLICT_UPDATE, batch_size, checkpoint,
+            on_commit=lambda cooked_rows: self._record_references(table_name, cooked_rows),
+            screen=None if self.on_failure == FAILURE_KEEP else self._screen,
+            # Without metrics, so key columns aren't counted twice
+            transform_keys=self.table_registry.get_plan(
+                table_name, columns=tuple(description['key'])).transform_chunk)
+
+    def insert_file(self, table_name, path, format=None, header_map=None,
+                    batch_size=DEFAULT_BATCH_SIZE, commit=COMMIT_PER_BATCH, prefetch=False,
+                    encoding='utf-8', columns=None, **csv_options):
+        """Stream, transform and insert the records of a CSV or JSON Lines file.
+
+        Args:
+            table_name (str): Name of the table to insert into
+            path (str): File to read
+            format (str, optional): See `transform_file`
+            header_map (dict, optional): See `transform_file`
+            batch_size (int): Number of rows sent per insert statement
+            commit (str): Commit policy, see `insert_iter`
+            prefetch (bool): See `transform_file`
+            encoding (str): Encoding of the file
+            columns (:obj:`list` of :obj:`str`, optional): See `transform_file`
+            **csv_options: Passed on to `csv.reader`
 
-        Raises: Exception when the insert fails
+        Returns:
+            LoadReport: Number of rows inserted and how long it took
         """
-        cleaned_rows = self.transform_dicts(table_name, raw_rows)
-        table = self.sqlalchemy_meta.tables[table_name]
-        connection = self.engine.connect()
-        transaction = connection.begin()
-        try:
-            connection.execute(table.insert(), cleaned_rows)
-        except Exception:
-            transaction.rollback()
-            raise Exception('Insert failed')
+        raw_rows = self.read_file(
+            table_name, path, format, header_map, batch_size, prefetch, encoding, columns,
+            **csv_options)
+        return self.insert_iter(table_name, raw_rows, batch_size, commit, columns)
+
+    def load_all(self, sources, workers=DEFAULT_LOAD_WORKERS, max_per_table=1,
+                 batch_size=DEFAULT_BATCH_SIZE, commit=COMMIT_PER_BATCH):
+        """Transform and insert the rows of several tables, each after the
+        tables it references.
+
+        The order comes from the `references` declared in the descriptions.
+        Tables that don't depend on each other are loaded at the same time on
+        a thread pool, each load on its own pooled connection, so a full
+        refresh takes about as long as its longest chain of dependent tables
+        rather than the sum of them all. References to tables that aren't
+        being loaded are ignored.
 
-    def transform_dicts(self, table_name, raw_rows):
+        Args:
+            sources (dict): What to load keyed by table name. A source is an
+                iterable of raw rows or the path of a CSV or JSON Lines file,
+                see `insert_file`. A list of paths or iterables of rows loads
+                each of them separately.
+            workers (int): Most loads running at once. Make sure the engine's
+                connection pool holds at least this many connections.
+            max_per_table (int): Most loads of a single table's sources
+                running at once
+            batch_size (int): Number of rows sent per insert statement
+            commit (str): Commit policy of every load, see `insert_iter`
+
+        Returns:
+            dict: `LoadReport` for every table keyed by table name, with the
+            rows and batches of all of its sources and the time from when
+            the first started until the last finished
+
+        Raises:
+            LookupError: When a table isn't described
+            ValueError: When the tables reference each other in a cycle
+        """
+        def load(table_name, source):
+            if isinstance(source, (str, os.PathLike)):
+                return lambda: self.insert_file(
+                    table_name, os.fspath(source), batch_size=batch_size, commit=commit)
+            return lambda: self.insert_iter(table_name, source, batch_size, commit)
+
+        tasks_by_table = {}
+        for table_name, source in sources.items():
+            self.table_registry.get_table(table_name)
+            parts = source if scheduler.is_source_list(source) else [source]
+            tasks_by_table[table_name] = [load(table_name, part) for part in parts]
+        dependencies = {
+            table_name: self.table_registry.get_parents(table_name) for table_name in sources
+        }
+        results = scheduler.run(tasks_by_table, dependencies, workers, max_per_table)
+        return {
+            table_name: LoadReport(sum(reports), seconds, sum(r.batches for r in reports))
+            for table_name, (reports, seconds) in results.items()
+        }
+
+    def replace_table(self, table_name, source, batch_size=DEFAULT_BATCH_SIZE):
+        """Transform rows and replace every row of a table with them.
+
+        Rows are loaded into a staging table created from the table's
+        reflected definition without its indexes, a batch per transaction, so
+        neither index maintenance nor locks on the table slow the load down.
+        Its indexes are then built and it's swapped in for the table in a
+        single transaction, so readers see the old rows until the new ones
+        are all in place. When anything fails, the staging table is dropped
+        and the table is left as it was. Triggers and views on the table
+        aren't carried over.
+
+        Args:
+            table_name (str): Name of the table to replace the rows of
+            source: Iterable of raw rows or the path of a CSV or JSON Lines
+                file, see `insert_file`
+            batch_size (int): Number of rows sent per insert statement
+
+        Returns:
+            LoadReport: Number of rows loaded and how long it took
+        """
+        start = perf_counter()
+        if isinstance(source, (str, os.PathLike)):
+            source = self.read_file(table_name, os.fspath(source), chunk_size=batch_size)
+        cooked_rows = self.transform_iter(table_name, source, batch_size)
+        table = self.get_sqlalchemy_table(table_name)
+        staging = self.swapper.staging_table(table)
+        hash_store = None
+        if sqlalchemy.inspect(self.engine).has_table(upsert.HASH_TABLE_NAME):
+            hash_store = upsert.RowHashStore(self.engine)
+        row_count = 0
+        batch_count = 0
+        with self.engine.connect() as connection:
+            self._read_references(connection, table_name)
+            with connection.begin():
+                self.swapper.create(connection, staging)
+            try:
+                for batch in batched(cooked_rows, batch_size):
+                    with connection.begin():
+                        self.loader.insert(connection, staging, batch)
+                    row_count += len(batch)
+                    batch_count += 1
+                with connection.begin():
+                    self.swapper.build_indexes(connection, table, staging)
+                with connection.begin():
+                    if hash_store is not None:
+                        # Digests of replaced rows no longer say what's stored
+                        hash_store.forget(connection, table_name)
+                    self.swapper.swap(connection, table, staging)
+            except BaseException:
+                with connection.begin():
+                    self.swapper.drop(connection, staging)
+                raise
+        if self.references is not None:
+            self.references.discard(table_name)
+        return LoadReport(row_count, perf_counter() - start, batch_count)
+
+    def read_file(self, table_name, path, format=None, header_map=None,
+                  chunk_size=DEFAULT_CHUNK_SIZE, prefetch=False, encoding='utf-8',
+                  columns=None, **csv_options):
+        """Lazily reads the records of a CSV or JSON Lines file as raw rows
+        keyed by the table's columns, see `transform_file`"""
+        column_names = self.table_registry.get_table(table_name)['columns_by_name']
+        plan = self.get_plan(table_name, columns) if columns is not None else None
+        if plan is not None and not plan.row_transforms:
+            # Nothing reads the fields no projected column needs, so skip them
+            column_names = plan.column_names
+            header_map = {
+                field_name: column_name for field_name, column_name in (header_map or {}).items()
+                if column_name in column_names
+            }
+        raw_rows = readers.read_file(
+            path, column_names, format, header_map, encoding, **csv_options)
+        if prefetch:
+            raw_rows = readers.prefetch(raw_rows, chunk_size)
+        return raw_rows
+
+    def transform_file(self, table_name, path, format=None, header_map=None,
+                       chunk_size=DEFAULT_CHUNK_SIZE, prefetch=False, encoding='utf-8',
+                       columns=None, **csv_options):
+        """Lazily reads and transforms the records of a CSV or JSON Lines file.
+
+        Records are streamed through a buffered reader, so memory use doesn't
+        grow with the size of the file. Field names are mapped to the
+        table's columns by `header_map` or else by matching the column names
+        case and whitespace insensitively (`'Patient MRN'` matches
+        `patient_mrn`); fields matching no column are dropped.
+
+        Args:
+            table_name (str): Name of the table describing the records
+            path (str): File to read
+            format (str, optional): `'csv'` for CSV with a header row or
+                `'jsonl'` for one JSON object per line. Inferred from the
+                extension (.csv, .jsonl or .ndjson) by default.
+            header_map (dict, optional): Column names keyed by field name
+            chunk_size (int): Records read ahead at a time when prefetching,
+                and rows each batch transform is called for at a time
+            prefetch (bool): Whether to parse the file on a background thread,
+                at most two chunks ahead of transforming
+            encoding (str): Encoding of the file
+            columns (:obj:`list` of :obj:`str`, optional): Columns to
+                project to, see `transform_dicts`. Fields only other columns
+                need aren't kept past reading, unless a needed row transform
+                might read them.
+            **csv_options: Passed on to `csv.reader`, such as `delimiter`
+
+        Yields:
+            dict: Transformed rows in the order they appear in the file
+
+        Raises:
+            ValueError: When the format is unknown or can't be inferred
+        """
+        raw_rows = self.read_file(
+            table_name, path, format, header_map, chunk_size, prefetch, encoding, columns,
+            **csv_options)
+        return self.transform_iter(table_name, raw_rows, chunk_size, columns)
+
+    def _insert_batches(self, table_name, batches, commit):
+        """Inserts batches of transformed dicts with the loader, committing
+        according to the commit policy, on a single pooled connection"""
+        if commit not in (COMMIT_PER_BATCH, COMMIT_PER_LOAD):
+            raise ValueError(f'Unknown commit policy {commit}')
+        start = perf_counter()
+        table = self.get_sqlalchemy_table(table_name)
+        insert = self.loader.insert
+        row_count = 0
+        batch_count = 0
+        with self.engine.connect() as connection:
+            self._read_references(connection, table_name)
+            if commit == COMMIT_PER_LOAD:
+                try:
+                    with self._deferring_quarantine(), connection.begin():
+                        for batch in batches:
+                            insert(connection, table, batch)
+                            self._record_references(table_name, batch)
+                            row_count += len(batch)
+                            batch_count += 1
+                except BaseException:
+                    if self.references is not None:
+                        self.references.discard(table_name)
+                    raise
+            else:
+                for batch in batches:
+                    with connection.begin():
+                        insert(connection, table, batch)
+                    self._record_references(table_name, batch)
+                    row_count += len(batch)
+                    batch_count += 1
+        return LoadReport(row_count, perf_counter() - start, batch_count)
+
+    def transform_dicts(self, table_name, raw_rows, workers=None,
+                        chunk_size=DEFAULT_CHUNK_SIZE, columns=None):
         """Transforms dicts according to the table description.
 
         Args:
             table_name (str): Message to incorporate into the final message
             raw_rows (:obj:`list` of :obj:`dict`): Rows to transform
+            workers (int, optional): Number of processes to transform with.
+                Each process loads the descriptions itself and is handed
+                `chunk_size` rows at a time. Defaults to transforming serially.
+            chunk_size (int): Rows sent to a worker process at a time, and
+                rows each batch transform is called for at a time
+            columns (:obj:`list` of :obj:`str`, optional): Columns to
+                project to. Only these, and the columns their row transforms
+                depend on, are transformed; the transforms of every other
+                column are skipped and transformed rows hold only these.
+                Defaults to every described column.
 
         Returns:
             :obj:`list` of :obj:`dict`: Transformed dicts
+
+        Raises:
+            LookupError: When a projected column isn't described
         """
-        column_names = self.table_registry.get_table(table_name)['columns_by_name'].keys()
-        transforms_by_column = {}
-        for column_name in column_names:
-            transforms_by_column[column_name] = \
-                self.table_registry.get_transform(table_name, column_name)
-        cooked_rows = []
-
-        for raw_row in raw_rows:
-            cooked_row = {}
-            for column_name, raw_value in raw_row.items():
-                transform = transforms_by_column[column_name]
-                if not transform:
-                    cooked_row[column_name] = raw_value
-                elif hasattr(transform, 'requires_row'):
-                    continue
-                else:
-                    cooked_row[column_name] = transform(raw_value)
+        if workers and workers > 1:
+            raw_rows = list(raw_rows)
+            plan = self.get_plan(table_name, columns)
+            cooked_rows = plan.finish_rows(parallel.transform_dicts(
+                self.registry_args(), table_name, raw_rows, workers, chunk_size, plan.columns))
+            if self.on_failure == FAILURE_KEEP:
+                return cooked_rows
+            return [
+                cooked_row
+                for _, cooked_row in self._screen(table_name, zip(raw_rows, cooked_rows))
+            ]
+        return list(self.transform_iter(table_name, raw_rows, chunk_size, columns))
+
+    def transform_columns(self, table_name, raw_columns, columns=None):
+        """Transforms column-oriented data according to the table description.
+
+        Avoids building a dict per row: scalar transforms are mapped over each
+        column and row transforms receive a lightweight view of the row.
+        Columns without a transform are returned as provided, so NumPy arrays
+        pass through untouched, and transformed integer and float columns are
+        packed into an `array.array` when every value fits.
+
+        Args:
+            table_name (str): Name of the table describing the columns
+            raw_columns (dict): Equally long sequences keyed by column name
+            columns (:obj:`list` of :obj:`str`, optional): Columns to
+                project to, see `transform_dicts`
+
+        Returns:
+            dict: Transformed sequences keyed by column name
+
+        Raises:
+            ValueError: When the columns aren't the same length
+        """
+        return self.get_plan(table_name, columns).transform_columns(raw_columns)
 
-            for column_name in column_names:
-                transform = transforms_by_column[column_name]
-                if not transform:
-                    continue
-                elif hasattr(transform, 'requires_row'):
-                    cooked_row[column_name] = transform(raw_row)
-            cooked_rows.append(cooked_row)
-        return cooked_rows
+    def transform_iter(self, table_name, raw_rows, chunk_size=DEFAULT_CHUNK_SIZE, columns=None):
+        """Lazily transforms rows from any iterable according to the table
+        description.
+
+        Args:
+            table_name (str): Name of the table describing the rows
+            raw_rows (iterable of :obj:`dict`): Rows to transform
+            chunk_size (int): Rows each batch transform is called for at a
+                time. Tables without batch transforms are transformed a row
+                at a time regardless.
+            columns (:obj:`list` of :obj:`str`, optional): Columns to
+                project to, see `transform_dicts`
+
+        Yields:
+            dict: Transformed rows in the order they were provided
+        """
+        plan = self.get_plan(table_name, columns)
+        if self.on_failure == FAILURE_KEEP:
+            if not plan.batch_transforms:
+                yield from map(plan.transform_row, raw_rows)
+                return
+            for chunk in batched(raw_rows, chunk_size):
+                yield from plan.transform_chunk(chunk)
+            return
+        if not plan.batch_transforms:
+            pairs = ((raw_row, plan.transform_row(raw_row)) for raw_row in raw_rows)
+        else:
+            pairs = (
+                pair for chunk in batched(raw_rows, chunk_size)
+                for pair in zip(chunk, plan.transform_chunk(chunk))
+            )
+        for _, cooked_row in self._screen(table_name, pairs):
+            yield cooked_row
+
+    def cache_info(self, table_name):
+        """Returns hit and miss counts for the cached transforms of a table.
+
+        Args:
+            table_name (str): Name of the table
+
+        Returns:
+            dict: `CacheInfo` named tuples with `hits`, `misses`, `unhashable`,
+            `maxsize` and `currsize` keyed by column name
+        """
+        return self.get_plan(table_name).cache_info()
 
     @pypy_incompatible
-    def transform_df(self, table_name, df):
+    def transform_df(self, table_name, df, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                     columns=None):
         """Transforms a pandas.DataFrame in place according to the description.
 
         Args:
             table_name (str): Message to incorporate into the final message
             df (pandas.DataFrame): Value the failure occurred for
+            workers (int, optional): Number of processes to transform with,
+                see `transform_dicts`. Defaults to transforming serially.
+            chunk_size (int): Rows sent to a worker process at a time
+            columns (:obj:`list` of :obj:`str`, optional): Columns to
+                project to, see `transform_dicts`. A new DataFrame holding only
+                these is returned instead of transforming `df` in place.
 
         Returns:
             pandas.DataFrame: In-place transformed DataFrame
         """
-        for column_name in df.columns:
-            transform = self.table_registry.get_transform(table_name, column_name)
-            if not transform:
-                continue
-            elif hasattr(transform, 'requires_row'):
-                df[column_name] = df.apply(transform, axis=1)
-            else:
-                df[column_name] = df[column_name].map(transform)
-        return df
+        plan = self.get_plan(table_name, columns)
+        if workers and workers > 1:
+            return plan.finish_df(parallel.transform_df(
+                self.registry_args(), table_name, df, workers, chunk_size, plan.columns))
+        return plan.transform_df(df)
 
+    @pypy_incompatible
+    def transform_dfs(self, table_name, dfs, downcast=True, columns=None):
+        """Lazily transforms DataFrames from any iterable, such as the chunks
+        `pandas.read_csv(path, chunksize=...)` reads, so extracts larger than
+        memory are transformed a chunk at a time.
 
-class TransformFailure():
-    """Returned by a transformer whenever something goes wrong during a
-    transformation.
+        Args:
+            table_name (str): Name of the table describing the frames
+            dfs (iterable of pandas.DataFrame): Frames to transform in place
+            downcast (bool): Whether to convert transformed columns to the
+                most compact dtype their declared type allows, such as
+                `int32`, `float32` or `datetime64`. Columns holding failures
+                keep their dtype.
+            columns (:obj:`list` of :obj:`str`, optional): Columns to
+                project to, see `transform_df`
+
+        Yields:
+            pandas.DataFrame: Each frame once it's transformed
+        """
+        plan = self.get_plan(table_name, columns)
+        for df in dfs:
+            df = plan.transform_df(df)
+            if downcast:
+                frames.downcast_df(df, plan.column_types)
+            yield df
 
-    Args:
-        message (str): Message to incorporate into the final message
-        value (any): Value the failure occurred for
-        location (str): Where in the code the failure occurred
+    @pypy_incompatible
+    def insert_dfs(self, table_name, dfs, batch_size=DEFAULT_BATCH_SIZE,
+                   commit=COMMIT_PER_BATCH, columns=None):
+        """Transform and insert DataFrames from any iterable a chunk at a
+        time, so peak memory depends on the size of a chunk rather than of
+        the extract.
 
-    Note:
-        This implementation of this class is considered internal and is not
-        considered stable for public use. While we guarantee you'll be returned
-        failures when something goes wrong, we don't won't what the failure
-        will contain or how it's instantiated.
+        Rows with failures are raised or quarantined according to the
+        curator's failure policy.
 
-    Attributes:
-        message (str): Message detailing what occur
+        Args:
+            table_name (str): Name of the table to insert into
+            dfs (iterable of pandas.DataFrame): Frames to transform in place
+                and insert, such as `pandas.read_csv(path, chunksize=...)`
+            batch_size (int): Number of rows sent per insert statement
+            commit (str): Commit policy, see `insert_iter`
+            columns (:obj:`list` of :obj:`str`, optional): Columns to
+                project to, see `transform_dicts`
+
+        Returns:
+            LoadReport: Number of rows inserted and how long it took
+        """
+        plan = self.get_plan(table_name, columns)
+
+        def cooked_rows():
+            for df in dfs:
+                raw_rows = None if self.on_failure == FAILURE_KEEP else frames.to_records(df)
+                rows = frames.to_records(plan.transform_df(df))
+                if raw_rows is None:
+                    yield from rows
+                else:
+                    for _, cooked_row in self._screen(table_name, zip(raw_rows, rows)):
+                        yield cooked_row
+        return self._insert_batches(table_name, batched(cooked_rows(), batch_size), commit)
+
+    def dtypes(self, table_name):
+        """Returns compact dtypes for the columns of a table that are stored
+        without a transform, keyed by column name, to read them with up
+        front, as in `pandas.read_csv(path, dtype=curator.dtypes('lab'))`.
+        Categorical columns are read as `category`."""
+        return frames.read_dtypes(self.table_registry.get_table(table_name))
+
+
+class AsyncCurator(Curator):
+    """Curator loading through a SQLAlchemy `AsyncEngine`.
+
+    Transforming works as it does for `Curator`. Loading uses the awaitable
+    `ainsert_*` methods instead of the `insert_*` ones, which need a
+    synchronous engine. While a batch is being inserted the next one is
+    transformed on a worker thread, so transforming overlaps with waiting on
+    the database and the event loop is never blocked by transforms.
+
+    With `check_references`, referenced values are read by the `ainsert_*`
+    methods before they transform anything, since they can't be read lazily
+    through an `AsyncEngine`.
+
+    Args:
+        sqlalchemy_engine (sqlalchemy.ext.asyncio.AsyncEngine): Database to
+            load into
+        description_paths (:obj:`list` of :obj:`str`): Table descriptions
+        **kwargs: Passed on to `Curator`
     """
 
-    def __init__(self, message, value, location):
-        self.message = f"{message} (value: {repr(value)}) at {location}"
-        self.value = value
-        self.location = location
+    async def aget_sqlalchemy_table(self, table_name):
+        """Returns the reflected `sqlalchemy.Table` for a table, reflecting it
+        the first time it's requested.
+
+        Raises:
+            LookupError: When the table isn't described
+            sqlalchemy.exc.NoSuchTableError: When the table doesn't exist
+        """
+        self.table_registry.get_table(table_name)
+        async with self.engine.connect() as connection:
+            return await connection.run_sync(
+                lambda sync_connection: self.table_reflector.get_table(table_name, sync_connection))
+
+    async def ainsert_dicts(self, table_name, raw_rows, batch_size=DEFAULT_BATCH_SIZE,
+                            columns=None):
+        """Transform and insert the provided dicts in a single transaction.
+
+        Args:
+            table_name (str): Name of the table to insert into
+            raw_rows (:obj:`list` of :obj:`dict`): Rows to transform and insert
+            batch_size (int): Number of rows sent per insert statement
+            columns (:obj:`list` of :obj:`str`, optional): Columns to
+                project to, see `transform_dicts`
+
+        Returns:
+            LoadReport: Number of rows inserted and how long it took
+        """
+        return await self.ainsert_iter(
+            table_name, raw_rows, batch_size, COMMIT_PER_LOAD, columns=columns)
 
-    def __bool__(self):
-        """Makes failures falsey"""
-        return False
+    async def ainsert_iter(self, table_name, raw_rows, batch_size=DEFAULT_BATCH_SIZE,
+                           commit=COMMIT_PER_BATCH, max_pending=DEFAULT_MAX_PENDING,
+                           columns=None):
+        """Transform and insert rows from any iterable or async iterable in
+        fixed-size batches.
+
+        Args:
+            table_name (str): Name of the table to insert into
+            raw_rows (iterable or async iterable of :obj:`dict`): Rows to
+                transform and insert
+            batch_size (int): Number of rows sent per insert statement
+            commit (str): Commit policy, see `Curator.insert_iter`
+            max_pending (int): Most transformed batches held waiting to be
+                inserted. Once that many are, no more rows are read until
+                the database catches up.
+            columns (:obj:`list` of :obj:`str`, optional): Columns to
+                project to, see `transform_dicts`
 
-    def __str__(self):
-        return f'<thecurator.TransformFailure "{self.message}">'
+        Returns:
+            LoadReport: Number of rows inserted and how long it took
 
-    def __repr__(self):
-        return self.__str__()
+        Raises:
+            ValueError: When the commit policy is unknown
+        """
+        if commit not in (COMMIT_PER_BATCH, COMMIT_PER_LOAD):
+            raise ValueError(f'Unknown commit policy {commit}')
+        start = perf_counter()
+        transform_chunk = self._chunk_transformer(table_name, columns)
+        table = await self.aget_sqlalchemy_table(table_name)
+        row_count = 0
+        batch_count = 0
+
+        async with self.engine.connect() as connection:
+            async def insert(batch):
+                nonlocal row_count, batch_count
+                if not batch:
+                    # Every row of the batch was quarantined
+                    return
+                if commit == COMMIT_PER_BATCH:
+                    async with connection.begin():
+                        await connection.run_sync(self.loader.insert, table, batch)
+                else:
+                    await connection.run_sync(self.loader.insert, table, batch)
+                self._record_references(table_name, batch)
+                row_count += len(batch)
+                batch_count += 1
+
+            await connection.run_sync(self._read_references, table_name)
+            if commit == COMMIT_PER_LOAD:
+                try:
+                    with self._deferring_quarantine():
+                        async with connection.begin():
+                            await asynchronous.transform_batches(
+                                transform_chunk, raw_rows, batch_size, max_pending, insert)
+                except BaseException:
+                    if self.references is not None:
+                        self.references.discard(table_name)
+                    raise
+            else:
+                await asynchronous.transform_batches(
+                    transform_chunk, raw_rows, batch_size, max_pending, insert)
+        return LoadReport(row_count, perf_counter() - start, batch_count)
@@ -1,3 +1,4 @@
+import itertools
 import platform
 
 # Are we running PyPy?
@@ -8,3 +9,16 @@ IS_PYPY = platform.python_implementation() == 'PyPy'
 def pypy_incompatible(func):
     if not IS_PYPY:
         return func
+
+
+def batched(iterable, size):
+    """Yields lists of at most `size` items from the iterable without reading
+    more than one batch ahead."""
+    if size < 1:
+        raise ValueError("Batch size must be at least 1")
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,91 @@
+"""
+In case it isn't already clear by the namespace, this is a private API. Use it
+at your own risk.
+
+Helpers for loading through SQLAlchemy's asyncio extension. Rows are
+transformed on a worker thread, a batch at a time, while the event loop waits
+on the database, so transforming the next batch overlaps with inserting the
+previous one without blocking the loop.
+"""
+import asyncio
+from . import batched
+
+"""Queued by the producer once every batch has been transformed"""
+_DONE = object()
+
+
+async def transform_batches(transform_chunk, raw_rows, batch_size, max_pending, consume):
+    """Transforms rows in batches and awaits `consume` with each transformed
+    batch in order.
+
+    Batches are transformed one at a time, so transforms never run
+    concurrently with each other. At most `max_pending` transformed batches
+    wait for `consume`; once that many do, no more rows are read until one
+    is consumed.
+
+    Args:
+        transform_chunk (function): Transforms a list of rows, such as
+            `TransformPlan.transform_chunk`
+        raw_rows (iterable or async iterable of :obj:`dict`): Rows to transform
+        batch_size (int): Rows per batch
+        max_pending (int): Most transformed batches held waiting for `consume`
+        consume (coroutine function): Called with each transformed batch
+    """
+    if batch_size < 1:
+        raise ValueError("Batch size must be at least 1")
+    if max_pending < 1:
+        raise ValueError("Max pending must be at least 1")
+    queue = asyncio.Queue(max_pending)
+    producer = asyncio.ensure_future(_produce(transform_chunk, raw_rows, batch_size, queue))
+    try:
+        while True:
+            batch = await queue.get()
+            if batch is _DONE:
+                return
+            if isinstance(batch, BaseException):
+                raise batch
+            await consume(batch)
+    finally:
+        producer.cancel()
+
+
+async def _produce(transform_chunk, raw_rows, batch_size, queue):
+    """Fills the queue with transformed batches followed by `_DONE`, or by
+    the exception that stopped it"""
+    # run_in_executor rather than asyncio.to_thread, which needs Python 3.9
+    loop = asyncio.get_running_loop()
+    try:
+        if hasattr(raw_rows, '__aiter__'):
+            async for chunk in _abatched(raw_rows, batch_size):
+                await queue.put(await loop.run_in_executor(None, transform_chunk, chunk))
+        else:
+            # Rows are read on the worker thread too, in case the iterable
+            # does I/O of its own
+            chunks = batched(raw_rows, batch_size)
+            while True:
+                cooked_chunk = await loop.run_in_executor(
+                    None, _transform_next, transform_chunk, chunks)
+                if cooked_chunk is None:
+                    break
+                await queue.put(cooked_chunk)
+    except Exception as error:
+        await queue.put(error)
+        return
+    await queue.put(_DONE)
+
+
+def _transform_next(transform_chunk, chunks):
+    chunk = next(chunks, None)
+    return None if chunk is None else transform_chunk(chunk)
+
+
+async def _abatched(raw_rows, size):
+    """Yields lists of at most `size` rows from an async iterable"""
+    batch = []
+    async for raw_row in raw_rows:
+        batch.append(raw_row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
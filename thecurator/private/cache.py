@@ -0,0 +1,90 @@
+"""
+In case it isn't already clear by the namespace, this is a private API. Use it
+at your own risk.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+"""Number of results cached per column when no size is given"""
+DEFAULT_CACHE_SIZE = 1024
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'unhashable', 'maxsize', 'currsize'])
+
+
+def lru_cache(transform, maxsize=DEFAULT_CACHE_SIZE):
+    """Wraps a transform of a single value with a bounded LRU cache.
+
+    Unlike `functools.lru_cache`, values that can't be hashed are passed
+    straight through to the transform instead of raising, and values that
+    compare equal but differ in type (`1`, `1.0` and `True`) are cached
+    separately. The cache is safe to share between threads; the transform
+    runs outside its lock, so a value missed by two threads at once may be
+    transformed twice.
+
+    Args:
+        transform (function): Pure function of a single value
+        maxsize (int): Most results kept before the least recently used one is
+            evicted
+
+    Returns:
+        function: The cached transform with a `cache_info()` function attached
+    """
+    if maxsize < 1:
+        raise ValueError("Cache size must be at least 1")
+    entries = OrderedDict()
+    # Hits, misses and unhashable values
+    counts = [0, 0, 0]
+    lock = threading.Lock()
+
+    def cached(value):
+        key = (value.__class__, value)
+        try:
+            with lock:
+                result = entries[key]
+                entries.move_to_end(key)
+                counts[0] += 1
+            return result
+        except KeyError:
+            pass
+        except TypeError:
+            with lock:
+                counts[2] += 1
+            return transform(value)
+        result = transform(value)
+        with lock:
+            counts[1] += 1
+            entries[key] = result
+            if len(entries) > maxsize:
+                entries.popitem(last=False)
+        return result
+
+    def cache_info():
+        with lock:
+            return CacheInfo(counts[0], counts[1], counts[2], maxsize, len(entries))
+
+    def cache_clear():
+        with lock:
+            entries.clear()
+            counts[:] = [0, 0, 0]
+
+    cached.cache_info = cache_info
+    cached.cache_clear = cache_clear
+    cached.__wrapped__ = transform
+    return cached
+
+
+def cache_size(column, transform):
+    """Returns the cache size configured for a column or `None` when its
+    transform shouldn't be cached.
+
+    The column's `cache` key takes precedence over `@cacheable`. It may be
+    `true` for the default size, `false` to disable caching or a size.
+    """
+    setting = column.get('cache')
+    if setting is None:
+        return getattr(transform, 'cache_maxsize', None)
+    if setting is False:
+        return None
+    if setting is True:
+        return getattr(transform, 'cache_maxsize', None) or DEFAULT_CACHE_SIZE
+    return setting
@@ -0,0 +1,173 @@
+"""
+In case it isn't already clear by the namespace, this is a private API. Use it
+at your own risk.
+
+Built-in coercers for the column types declared in table descriptions. A
+coercer converts a raw value of a common shape quickly and raises one of
+`COERCION_ERRORS` for anything else, in which case the column's own transform
+is used instead.
+
+Scalar and vectorized coercers agree on what they convert: numbers and
+numeric strings for numeric types, but never booleans, and never missing
+values (`None` or NaN), which are left to the column's transform.
+"""
+import datetime
+import decimal
+from .failure import TransformFailure
+
+"""Exceptions signalling that a coercer can't handle a value"""
+COERCION_ERRORS = (ValueError, TypeError, AttributeError, ArithmeticError)
+
+TRUE_STRINGS = frozenset(['true', 't', 'yes', 'y', '1'])
+FALSE_STRINGS = frozenset(['false', 'f', 'no', 'n', '0'])
+
+
+def coerce_integer(raw_value):
+    if raw_value.__class__ is int:
+        return raw_value
+    if raw_value.__class__ is float:
+        if not raw_value.is_integer():
+            raise ValueError(f'Not an integer {raw_value!r}')
+        return int(raw_value)
+    raw_value = raw_value.replace(',', '')
+    try:
+        return int(raw_value)
+    except ValueError:
+        # Integral numbers written as floats, such as '5.0', as pandas reads them
+        return coerce_integer(float(raw_value))
+
+
+def coerce_float(raw_value):
+    if raw_value.__class__ is float:
+        if raw_value != raw_value:
+            raise ValueError('Missing value')
+        return raw_value
+    if raw_value.__class__ is int:
+        return float(raw_value)
+    value = float(raw_value.replace(',', ''))
+    if value != value:
+        raise ValueError('Missing value')
+    return value
+
+
+def coerce_decimal(raw_value):
+    if raw_value.__class__ is decimal.Decimal:
+        return raw_value
+    if raw_value.__class__ is float:
+        return decimal.Decimal(repr(raw_value))
+    if raw_value.__class__ is int:
+        return decimal.Decimal(raw_value)
+    return decimal.Decimal(raw_value.replace(',', ''))
+
+
+def coerce_boolean(raw_value):
+    if raw_value.__class__ is bool:
+        return raw_value
+    lowered = raw_value.strip().lower()
+    if lowered in TRUE_STRINGS:
+        return True
+    if lowered in FALSE_STRINGS:
+        return False
+    raise ValueError(f'Unrecognized boolean {raw_value!r}')
+
+
+def datetime_coercer(date_format=None):
+    if date_format:
+        strptime = datetime.datetime.strptime
+
+        def coerce_datetime(raw_value):
+            if isinstance(raw_value, datetime.datetime):
+                return raw_value
+            return strptime(raw_value, date_format)
+        return coerce_datetime
+    return datetime.datetime.fromisoformat
+
+
+def date_coercer(date_format=None):
+    if date_format:
+        strptime = datetime.datetime.strptime
+        return lambda raw_value: strptime(raw_value, date_format).date()
+    return datetime.date.fromisoformat
+
+
+def coercer(column):
+    """Returns the coercer for a column's declared type or `None` for types
+    that aren't coerced (strings)"""
+    column_type = column['type']
+    if column_type == 'integer':
+        return coerce_integer
+    if column_type in ('float', 'double'):
+        return coerce_float
+    if column_type == 'decimal':
+        return coerce_decimal
+    if column_type == 'boolean':
+        return coerce_boolean
+    if column_type == 'datetime':
+        return datetime_coercer(column.get('format'))
+    if column_type == 'date':
+        return date_coercer(column.get('format'))
+    return None
+
+
+def coercion_failure(table_name, column):
+    """Returns a function creating failures for values that couldn't be
+    coerced in a column without a transform to fall back on"""
+    reason = f"Failed to coerce value to {column['type']}"
+    location = f"{table_name}.{column['name']}"
+    return lambda raw_value: TransformFailure(reason, raw_value, location)
+
+
+def with_fallback(coerce, fallback):
+    """Combines a coercer with the transform used when it fails"""
+    def coerced(raw_value):
+        try:
+            return coerce(raw_value)
+        except COERCION_ERRORS:
+            return fallback(raw_value)
+    return coerced
+
+
+def vectorized_coercer(column, fallback):
+    """Returns a vectorized coercer for the column's type, or `None` when the
+    type has no vectorized form. Values the vectorized coercer can't convert
+    are passed to `fallback` one at a time, as are missing values, just as
+    the scalar coercer leaves them to the column's transform.
+    """
+    column_type = column['type']
+    date_format = column.get('format')
+    if column_type == 'datetime' and date_format:
+        def convert(series):
+            import pandas
+            return pandas.to_datetime(series, format=date_format, errors='coerce')
+    elif column_type in ('integer', 'float', 'double'):
+        def convert(series):
+            import pandas
+            if pandas.api.types.is_bool_dtype(series) or \
+                    not pandas.api.types.is_numeric_dtype(series):
+                # Booleans become 'True' and 'False', which aren't numbers
+                series = series.astype(str).str.replace(',', '', regex=False)
+            numeric = pandas.to_numeric(series, errors='coerce')
+            if column_type == 'integer':
+                numeric = numeric.where(numeric.isna() | (numeric % 1 == 0))
+            return numeric
+    else:
+        return None
+
+    def vectorized(series):
+        coerced = convert(series)
+        failed = coerced.isna()
+        if failed.any():
+            import pandas
+            # Built with numpy, since pandas would infer the ints back to floats
+            values = coerced.to_numpy(dtype=object)
+            failed = failed.to_numpy()
+            if column_type == 'integer':
+                # Whole floats go back to the ints the scalar coercer returns
+                values[~failed] = [int(value) for value in values[~failed]]
+            raw_values = series.to_numpy(dtype=object)
+            for index in failed.nonzero()[0]:
+                # One at a time, so values that are sequences aren't spread out
+                values[index] = fallback(raw_values[index])
+            coerced = pandas.Series(values, index=series.index, name=coerced.name, dtype=object)
+        return coerced
+    return vectorized
@@ -0,0 +1,88 @@
+"""
+In case it isn't already clear by the namespace, this is a private API. Use it
+at your own risk.
+
+Helpers for column-oriented data: dicts of equally long sequences keyed by
+column name.
+"""
+import array
+from collections.abc import Mapping
+
+"""array.array typecodes for the declared column types that can be packed"""
+TYPECODES = {
+    'integer': 'q',
+    'float': 'd',
+    'double': 'd',
+}
+
+
+class RowView(Mapping):
+    """Read-only view of a single row of column-oriented data.
+
+    The view is reused from row to row by moving its `index`, so row
+    transforms shouldn't hold on to it.
+
+    Args:
+        columns (dict): Sequences keyed by column name
+    """
+    __slots__ = ('columns', 'index')
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.index = 0
+
+    def __getitem__(self, column_name):
+        return self.columns[column_name][self.index]
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __repr__(self):
+        return f'<RowView {dict(self)}>'
+
+
+def column_length(columns):
+    """Returns the number of rows in column-oriented data
+
+    Raises:
+        ValueError: When the columns aren't the same length
+    """
+    lengths = set(len(values) for values in columns.values())
+    if len(lengths) > 1:
+        raise ValueError(f'Columns have different lengths: {sorted(lengths)}')
+    return lengths.pop() if lengths else 0
+
+
+def pack(column_type, values):
+    """Packs a list of values into an `array.array` when the declared column
+    type allows and every value fits, otherwise returns the list"""
+    typecode = TYPECODES.get(column_type)
+    if typecode is None:
+        return values
+    try:
+        return array.array(typecode, values)
+    except (TypeError, OverflowError):
+        return values
+
+
+def iter_column_batches(columns, batch_size):
+    """Yields batches of at most `batch_size` rows from column-oriented data
+    as lists of dicts
+
+    Arrays are converted with `tolist` so NumPy scalars are never handed to the
+    database driver.
+    """
+    column_names = list(columns)
+    length = column_length(columns)
+    for start in range(0, length, batch_size):
+        stop = start + batch_size
+        sliced = [to_list(columns[column_name][start:stop]) for column_name in column_names]
+        yield [dict(zip(column_names, values)) for values in zip(*sliced)]
+
+
+def to_list(values):
+    """Converts an `array.array` or NumPy array to a list of Python objects"""
+    return values.tolist() if hasattr(values, 'tolist') else values
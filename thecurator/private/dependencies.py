@@ -0,0 +1,43 @@
+"""
+In case it isn't already clear by the namespace, this is a private API. Use it
+at your own risk.
+"""
+
+
+def topological_order(dependencies):
+    """Orders nodes so every node comes after the nodes it depends on.
+
+    Nodes that don't depend on each other keep the order they were given in.
+    Dependencies on nodes that aren't keys are ignored.
+
+    Args:
+        dependencies (dict): Iterables of the nodes each node depends on,
+            keyed by node
+
+    Returns:
+        list: The nodes in dependency order
+
+    Raises:
+        ValueError: When the dependencies contain a cycle
+    """
+    ordered = []
+    visited = set()
+    visiting = []
+
+    def visit(node):
+        if node in visited:
+            return
+        if node in visiting:
+            cycle = visiting[visiting.index(node):] + [node]
+            raise ValueError(f"Dependency cycle: {' -> '.join(map(str, cycle))}")
+        visiting.append(node)
+        for dependency in dependencies[node]:
+            if dependency in dependencies:
+                visit(dependency)
+        visiting.pop()
+        visited.add(node)
+        ordered.append(node)
+
+    for node in dependencies:
+        visit(node)
+    return ordered
@@ -0,0 +1,92 @@
+"""
+In case it isn't already clear by the namespace, this is a private API. Use it
+at your own risk.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+
+"""Keys every entry holds"""
+ENTRY_KEYS = frozenset(['schema_digest', 'mtime_ns', 'size', 'digest', 'description'])
+
+
+class DescriptionCache():
+    """On-disk cache of parsed and validated table descriptions.
+
+    Entries are stored per description path. An entry is reused without
+    reading the description when the file's modification time and size are
+    unchanged, and reused without parsing when the file's contents hash to
+    the same digest. Entries written while validating against a different
+    schema are ignored.
+
+    Args:
+        directory (str): Directory to store entries in, created when missing
+        schema_digest (str): Digest of the schema descriptions are validated
+            against
+    """
+
+    def __init__(self, directory, schema_digest):
+        self.directory = directory
+        self.schema_digest = schema_digest
+        os.makedirs(directory, exist_ok=True)
+
+    def load(self, file_path, parse):
+        """Returns the description stored in the file at the given path.
+
+        Args:
+            file_path (str): Path to the description
+            parse (function): Parses and validates the file's contents as bytes,
+                called only when the cache has no usable entry
+
+        Returns:
+            dict: The parsed description
+        """
+        stat = os.stat(file_path)
+        entry_path = self._entry_path(file_path)
+        entry = self._read_entry(entry_path)
+        if entry and (entry['mtime_ns'], entry['size']) == (stat.st_mtime_ns, stat.st_size):
+            return entry['description']
+
+        with open(file_path, 'rb') as description_file:
+            contents = description_file.read()
+        digest = hashlib.sha256(contents).hexdigest()
+        if entry and entry['digest'] == digest:
+            description = entry['description']
+        else:
+            description = parse(contents)
+        self._write_entry(entry_path, {
+            'schema_digest': self.schema_digest,
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'digest': digest,
+            'description': description,
+        })
+        return description
+
+    def _entry_path(self, file_path):
+        key = hashlib.sha256(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{key}.pickle')
+
+    def _read_entry(self, entry_path):
+        """Returns the entry at the path, or `None` when it's missing, can't
+        be loaded, isn't shaped like an entry or was written for another
+        schema"""
+        try:
+            with open(entry_path, 'rb') as entry_file:
+                entry = pickle.load(entry_file)
+        except Exception:
+            # Truncated or foreign pickles fail in all sorts of ways
+            return None
+        if not isinstance(entry, dict) or not ENTRY_KEYS <= entry.keys():
+            return None
+        if entry['schema_digest'] != self.schema_digest:
+            return None
+        return entry
+
+    def _write_entry(self, entry_path, entry):
+        """Writes the entry atomically, so concurrent processes never read a
+        partially written one"""
+        with tempfile.NamedTemporaryFile('wb', dir=self.directory, delete=False) as entry_file:
+            pickle.dump(entry, entry_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(entry_file.name, entry_path)
@@ -0,0 +1,80 @@
+"""
+In case it isn't already clear by the namespace, this is a private API. Use it
+at your own risk.
+
+`TransformFailure` and `TransformError` are exported publicly from `thecurator`.
+"""
+
+
+class TransformFailure():
+    """Returned by a transformer whenever something goes wrong during a
+    transformation.
+
+    Args:
+        message (str): Message to incorporate into the final message
+        value (any): Value the failure occurred for
+        location (str or tuple): Where in the code the failure occurred, either
+            formatted or as a `(filename, line number)` pair
+
+    Note:
+        This implementation of this class is considered internal and is not
+        considered stable for public use. While we guarantee you'll be returned
+        failures when something goes wrong, we don't won't what the failure
+        will contain or how it's instantiated.
+
+    Attributes:
+        message (str): Message detailing what occur
+        reason (str): Message provided when the failure was created
+        value (any): Value the failure occurred for
+        location (str): Where in the code the failure occurred, if known
+    """
+    __slots__ = ('reason', 'value', '_location', '_message')
+
+    def __init__(self, message, value, location):
+        self.reason = message
+        self.value = value
+        self._location = location
+        self._message = None
+
+    @property
+    def location(self):
+        if isinstance(self._location, tuple):
+            self._location = "%s:%d" % self._location
+        return self._location
+
+    @property
+    def message(self):
+        if self._message is None:
+            self._message = f"{self.reason} (value: {repr(self.value)})"
+            if self.location:
+                self._message += f" at {self.location}"
+        return self._message
+
+    def __bool__(self):
+        """Makes failures falsey"""
+        return False
+
+    def __str__(self):
+        return f'<thecurator.TransformFailure "{self.message}">'
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class TransformError(ValueError):
+    """Raised for a row whose transform returned failures when failures
+    are raised rather than kept or quarantined
+
+    Attributes:
+        table_name (str): Table the row was transformed for
+        raw_row (dict): The row as it was provided
+        failures (dict): `TransformFailure`s keyed by column name
+    """
+
+    def __init__(self, table_name, raw_row, failures):
+        self.table_name = table_name
+        self.raw_row = raw_row
+        self.failures = failures
+        details = '; '.join(
+            f'{column_name}: {failure.message}' for column_name, failure in failures.items())
+        super().__init__(f'Row of {table_name} failed to transform: {details}')
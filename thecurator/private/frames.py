@@ -0,0 +1,99 @@
+"""
+In case it isn't already clear by the namespace, this is a private API. Use it
+at your own risk.
+
+Helpers for transforming DataFrames a chunk at a time, with each column held
+in the most compact dtype its declared type allows. pandas is imported by the
+functions needing it, since it's optional.
+"""
+
+"""Smallest and largest values an int32 holds"""
+INT32_RANGE = (-2 ** 31, 2 ** 31 - 1)
+
+"""Dtypes columns stored without a transform can be read as, keyed by
+declared type"""
+READ_DTYPES = {
+    'integer': 'Int64',
+    'float': 'float32',
+    'double': 'float64',
+    'boolean': 'boolean',
+}
+
+
+def read_dtypes(description):
+    """Returns the dtypes to read the columns stored without a transform as,
+    such as with `pandas.read_csv(dtype=...)`, keyed by column name.
+    Categorical columns are read as categories."""
+    dtypes = {}
+    for column in description['columns']:
+        if 'transform' in column or column.get('coerce'):
+            continue
+        if column.get('categorical'):
+            dtypes[column['name']] = 'category'
+        elif column['type'] in READ_DTYPES:
+            dtypes[column['name']] = READ_DTYPES[column['type']]
+    return dtypes
+
+
+def downcast(series, column_type):
+    """Returns the series in the most compact dtype for its declared type
+    that holds every value: `int32` (or `int64` when values don't fit, and
+    their nullable counterparts when values are missing), `float32` for
+    floats, `float64` for doubles, `datetime64` for datetimes and `boolean`.
+    Series holding values that don't convert, such as failures, are returned
+    as they are."""
+    import pandas
+    if isinstance(series.dtype, pandas.CategoricalDtype):
+        return series
+    try:
+        if column_type == 'integer':
+            values = pandas.to_numeric(series)
+            present = values.dropna()
+            if not (present == present.round()).all():
+                return series
+            fits = present.empty or \
+                (INT32_RANGE[0] <= present.min() and present.max() <= INT32_RANGE[1])
+            dtype = 'int32' if fits else 'int64'
+            return values.astype(dtype.capitalize() if len(present) < len(values) else dtype)
+        if column_type == 'float':
+            return pandas.to_numeric(series).astype('float32')
+        if column_type == 'double':
+            return pandas.to_numeric(series).astype('float64')
+        if column_type == 'datetime':
+            if pandas.api.types.is_datetime64_any_dtype(series):
+                return series
+            if not series.map(_is_datetime_or_missing).all():
+                return series
+            return pandas.to_datetime(series)
+        if column_type == 'boolean':
+            if series.dtype == bool or not series.map(_is_bool_or_missing).all():
+                return series
+            return series.astype('boolean')
+    except (TypeError, ValueError, OverflowError):
+        return series
+    return series
+
+
+def downcast_df(df, column_types):
+    """Downcasts every column of a DataFrame with a declared type in place,
+    see `downcast`"""
+    for column_name in df.columns:
+        column_type = column_types.get(column_name)
+        if column_type is not None:
+            df[column_name] = downcast(df[column_name], column_type)
+    return df
+
+
+def to_records(df):
+    """Returns the rows of a DataFrame as dicts of Python values, with missing
+    values as `None`"""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def _is_datetime_or_missing(value):
+    import datetime
+    return value is None or isinstance(value, datetime.datetime) or value != value
+
+
+def _is_bool_or_missing(value):
+    return value is None or isinstance(value, bool) or value != value
@@ -0,0 +1,257 @@
+"""
+In case it isn't already clear by the namespace, this is a private API. Use it
+at your own risk.
+
+Loaders insert batches of transformed rows through a SQLAlchemy connection.
+`Loader`, `SQLiteLoader`, `PostgresCopyLoader` and `LoadReport` are exported
+publicly from `thecurator`.
+"""
+import datetime
+import decimal
+import io
+import operator
+import uuid
+import sqlalchemy
+
+
+class LoadReport(int):
+    """Number of rows a load inserted, along with how long it took.
+
+    Compares and computes as the row count, so code expecting the number of
+    rows inserted keeps working.
+
+    Attributes:
+        seconds (float): Time spent transforming and inserting
+        batches (int): Number of batches inserted
+    """
+
+    def __new__(cls, rows, seconds, batches):
+        report = super().__new__(cls, rows)
+        report.seconds = seconds
+        report.batches = batches
+        return report
+
+    @property
+    def rows(self):
+        """int: Number of rows inserted"""
+        return int(self)
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return (f'<LoadReport {self.rows} rows in {self.seconds:.3f}s '
+                f'({self.rows_per_second:,.0f} rows/s)>')
+
+
+class Loader():
+    """Inserts each batch with a single `executemany` of `table.insert()`.
+
+    Works with every database SQLAlchemy supports. Subclass it and override
+    `insert` to add a faster path for a database, then register the subclass
+    in `LOADERS` under the dialect's name or pass an instance to `Curator`.
+    """
+
+    def insert(self, connection, table, batch):
+        """Inserts a batch of rows within the connection's transaction
+
+        Args:
+            connection (sqlalchemy.engine.Connection): Connection to insert with
+            table (sqlalchemy.Table): Table to insert into
+            batch (:obj:`list` of :obj:`dict`): Transformed rows keyed by column
+        """
+        connection.execute(table.insert(), batch)
+
+    def upsert(self, connection, table, batch, key, update):
+        """Inserts the rows of a batch whose key isn't in the table yet and
+        updates or leaves alone the rest.
+
+        Existing keys are found with a single query, so no unique constraint
+        on the key columns is needed.
+
+        Args:
+            connection (sqlalchemy.engine.Connection): Connection to write with
+            table (sqlalchemy.Table): Table to write to
+            batch (:obj:`list` of :obj:`dict`): Transformed rows keyed by
+                column, with distinct keys
+            key (:obj:`list` of :obj:`str`): Columns identifying a row
+            update (bool): Whether rows that exist already are updated
+
+        Returns:
+            tuple: Lists of the keys of the rows inserted and of the rows
+            updated, each key a tuple of the key columns' values
+        """
+        key_of = operator.itemgetter(*key) if len(key) > 1 else lambda row: (row[key[0]],)
+        key_columns = [table.c[column_name] for column_name in key]
+        if len(key_columns) > 1:
+            matches = sqlalchemy.tuple_(*key_columns).in_([key_of(row) for row in batch])
+        else:
+            matches = key_columns[0].in_([row[key[0]] for row in batch])
+        found = connection.execute(sqlalchemy.select(*key_columns).where(matches))
+        existing = set(tuple(found_key) for found_key in found)
+        new_rows = [row for row in batch if key_of(row) not in existing]
+        changed_rows = [row for row in batch if key_of(row) in existing] if update else []
+        if new_rows:
+            self.insert(connection, table, new_rows)
+        if changed_rows:
+            statement = table.update().where(sqlalchemy.and_(*[
+                column == sqlalchemy.bindparam(f'thecurator_key_{column.name}')
+                for column in key_columns
+            ]))
+            connection.execute(statement, [
+                dict(row, **{f'thecurator_key_{column_name}': row[column_name]
+                             for column_name in key})
+                for row in changed_rows
+            ])
+        return list(map(key_of, new_rows)), list(map(key_of, changed_rows))
+
+
+class SQLiteLoader(Loader):
+    """Inserts with a driver-level `executemany` of rows as tuples.
+
+    The statement text is built once per table and set of columns, so the
+    driver reuses its prepared statement, and rows skip SQLAlchemy's per-row
+    parameter handling. Values are still converted by the column types' bind
+    processors, so they're stored as SQLAlchemy would store them. Drivers
+    that don't take `?` placeholders use the default path.
+    """
+
+    def __init__(self):
+        self.statements = {}
+
+    def insert(self, connection, table, batch):
+        if not batch or connection.dialect.paramstyle != 'qmark':
+            return super().insert(connection, table, batch)
+        keys = tuple(batch[0])
+        statement, to_params = self._statement(connection.dialect, table, keys)
+        connection.exec_driver_sql(statement, list(map(to_params, batch)))
+
+    def _statement(self, dialect, table, keys):
+        """Returns the statement inserting the columns and the function
+        converting a row to its parameters, building them the first time"""
+        cache_key = (table, keys)
+        try:
+            return self.statements[cache_key]
+        except KeyError:
+            pass
+        preparer = dialect.identifier_preparer
+        columns = ', '.join(preparer.quote(key) for key in keys)
+        placeholders = ', '.join('?' for _ in keys)
+        statement = \
+            f'INSERT INTO {preparer.format_table(table)} ({columns}) VALUES ({placeholders})'
+        processors = [self._processor(dialect, table.c[key]) for key in keys]
+        if not any(processors):
+            if len(keys) == 1:
+                key = keys[0]
+
+                def to_params(row):
+                    return (row[key],)
+            else:
+                to_params = operator.itemgetter(*keys)
+        else:
+            def to_params(row):
+                return tuple([
+                    value if process is None or value is None else process(value)
+                    for value, process in zip(map(row.__getitem__, keys), processors)
+                ])
+        self.statements[cache_key] = (statement, to_params)
+        return statement, to_params
+
+    def _processor(self, dialect, column):
+        """Returns the bind processor for a column, swapping SQLAlchemy's
+        string formatting of naive datetimes for the equivalent `isoformat`
+        when it produces the same text"""
+        process = column.type.dialect_impl(dialect).bind_processor(dialect)
+        if process is None:
+            return None
+        samples = [datetime.datetime(2017, 3, 1, 9, 5, 7, 42), datetime.datetime(1, 1, 1)]
+        try:
+            equivalent = all(
+                process(sample) == sample.isoformat(' ', 'microseconds') for sample in samples)
+        except Exception:
+            equivalent = False
+        if not equivalent:
+            return process
+
+        def process_datetime(value):
+            if value.__class__ is datetime.datetime and value.tzinfo is None:
+                return value.isoformat(' ', 'microseconds')
+            return process(value)
+        return process_datetime
+
+
+class PostgresCopyLoader(Loader):
+    """Streams each batch into PostgreSQL with `COPY ... FROM STDIN`.
+
+    Used with the psycopg2 and psycopg drivers when none of the inserted
+    columns' types convert values before they're sent (as JSON and enum types
+    may) and every value in the batch is of a type in `COPY_TYPES`; otherwise,
+    as for batches holding lists, bytes or failures, the default path is used.
+    """
+
+    def insert(self, connection, table, batch):
+        driver = connection.dialect.driver
+        if not batch or driver not in ('psycopg2', 'psycopg') or \
+                self._has_processors(connection.dialect, table, batch[0]) or \
+                not copyable(batch):
+            return super().insert(connection, table, batch)
+        keys = list(batch[0])
+        preparer = connection.dialect.identifier_preparer
+        columns = ', '.join(preparer.quote(key) for key in keys)
+        statement = f'COPY {preparer.format_table(table)} ({columns}) FROM STDIN'
+        cursor = connection.connection.cursor()
+        try:
+            if driver == 'psycopg':
+                with cursor.copy(statement) as copy:
+                    for row in batch:
+                        copy.write_row([row[key] for key in keys])
+            else:
+                cursor.copy_expert(statement, io.StringIO(''.join(
+                    '\t'.join(copy_text(row[key]) for key in keys) + '\n' for row in batch
+                )))
+        finally:
+            cursor.close()
+
+    def _has_processors(self, dialect, table, row):
+        return any(
+            table.c[key].type.dialect_impl(dialect).bind_processor(dialect) for key in row
+        )
+
+
+"""Types whose `str` is text COPY reads back as the same value"""
+COPY_TYPES = frozenset([
+    type(None), str, int, float, bool, decimal.Decimal, uuid.UUID,
+    datetime.date, datetime.datetime, datetime.time,
+])
+
+
+def copyable(batch):
+    """Returns whether every value in a batch is of a type in `COPY_TYPES`.
+    Subclasses aren't, since they may format themselves differently."""
+    return all(
+        value.__class__ in COPY_TYPES for row in batch for value in row.values())
+
+
+"""Escapes for characters with a meaning in COPY's text format"""
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def copy_text(value):
+    """Formats a value for COPY's text format"""
+    if value is None:
+        return '\\N'
+    return str(value).translate(COPY_ESCAPES)
+
+
+"""Loader classes keyed by the name of the dialect they're used for"""
+LOADERS = {
+    'sqlite': SQLiteLoader,
+    'postgresql': PostgresCopyLoader,
+}
+
+
+def loader_for(dialect):
+    """Returns a new instance of the loader registered for a dialect, or of
+    `Loader` when none is"""
+    return LOADERS.get(dialect.name, Loader)()
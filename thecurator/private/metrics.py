@@ -0,0 +1,285 @@
+"""
+In case it isn't already clear by the namespace, this is a private API. Use it
+at your own risk.
+
+`MetricsCollector` is exported publicly as `thecurator.MetricsCollector`.
+"""
+import threading
+from time import perf_counter
+from .failure import TransformFailure
+
+
+class ColumnMetrics():
+    """Counters for the transform of a single column
+
+    Attributes:
+        calls (int): Values (or rows) the transform was called for
+        failures (int): `TransformFailure`s the transform returned
+    """
+    __slots__ = ('calls', 'failures', 'sampled_calls', 'sampled_seconds')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.failures = 0
+        self.sampled_calls = 0
+        self.sampled_seconds = 0.0
+
+    @property
+    def seconds(self):
+        """float: Time spent in the transform, estimated from the sampled calls"""
+        if not self.sampled_calls:
+            return 0.0
+        return self.sampled_seconds * self.calls / self.sampled_calls
+
+    def as_dict(self):
+        return {'calls': self.calls, 'failures': self.failures, 'seconds': self.seconds}
+
+
+class TableMetrics():
+    """Counters for the transforms of a table
+
+    Attributes:
+        rows (int): Rows transformed
+        columns (dict): `ColumnMetrics` keyed by column name
+    """
+    __slots__ = ('rows', 'sampled_rows', 'sampled_seconds', 'columns')
+
+    def __init__(self):
+        self.columns = {}
+        self.reset()
+
+    def reset(self):
+        """Zeroes the counters in place, since instrumented transforms hold on
+        to them"""
+        self.rows = 0
+        self.sampled_rows = 0
+        self.sampled_seconds = 0.0
+        for metrics in self.columns.values():
+            metrics.reset()
+
+    @property
+    def seconds(self):
+        """float: Time spent transforming rows, estimated from the sampled rows"""
+        if not self.sampled_rows:
+            return 0.0
+        return self.sampled_seconds * self.rows / self.sampled_rows
+
+    @property
+    def rows_per_second(self):
+        seconds = self.seconds
+        return self.rows / seconds if seconds else 0.0
+
+    def column(self, column_name):
+        try:
+            return self.columns[column_name]
+        except KeyError:
+            metrics = self.columns[column_name] = ColumnMetrics()
+            return metrics
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'seconds': self.seconds,
+            'rows_per_second': self.rows_per_second,
+            'columns': {
+                column_name: metrics.as_dict()
+                for column_name, metrics in self.columns.items()
+            },
+        }
+
+
+class MetricsCollector():
+    """Collects per-table and per-column transform metrics.
+
+    Pass a collector to `Curator(..., metrics=collector)`. Transforms are only
+    wrapped with instrumentation when a collector is given, so curators
+    without one pay nothing. Metrics are collected for transforms run in the
+    curator's own process, not in worker processes. Counters are updated
+    under a lock, so a collector can be shared by loads running on several
+    threads, as with `Curator.load_all`.
+
+    Args:
+        sample_rate (float): Share of calls that are timed. Every call is
+            counted and checked for failures, but only one call in
+            `1 / sample_rate` reads the clock; times are scaled up from the
+            sampled calls.
+
+    Attributes:
+        tables (dict): `TableMetrics` keyed by table name
+    """
+
+    def __init__(self, sample_rate=1.0):
+        if not 0 < sample_rate <= 1:
+            raise ValueError("Sample rate must be greater than 0 and at most 1")
+        self.sample_rate = sample_rate
+        self.interval = max(1, round(1 / sample_rate))
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    def table(self, table_name):
+        """Returns the `TableMetrics` for a table"""
+        with self.lock:
+            try:
+                return self.tables[table_name]
+            except KeyError:
+                metrics = self.tables[table_name] = TableMetrics()
+                return metrics
+
+    def column(self, table_name, column_name):
+        """Returns the `ColumnMetrics` for a column of a table"""
+        table = self.table(table_name)
+        with self.lock:
+            return table.column(column_name)
+
+    def reset(self):
+        """Discards everything collected so far"""
+        with self.lock:
+            for metrics in self.tables.values():
+                metrics.reset()
+
+    def instrument_transform(self, table_name, column_name, transform):
+        """Wraps a transform of a value or row so its calls are recorded"""
+        metrics = self.column(table_name, column_name)
+        interval = self.interval
+        lock = self.lock
+
+        def instrumented(value):
+            with lock:
+                metrics.calls += 1
+                sampled = not metrics.calls % interval
+            if not sampled:
+                result = transform(value)
+            else:
+                start = perf_counter()
+                result = transform(value)
+                seconds = perf_counter() - start
+                with lock:
+                    metrics.sampled_seconds += seconds
+                    metrics.sampled_calls += 1
+            if result.__class__ is TransformFailure:
+                with lock:
+                    metrics.failures += 1
+            return result
+        return instrumented
+
+    def instrument_vectorized(self, table_name, column_name, transform):
+        """Wraps a vectorized transform so each call counts every row"""
+        metrics = self.column(table_name, column_name)
+        lock = self.lock
+
+        def instrumented(values):
+            start = perf_counter()
+            result = transform(values)
+            seconds = perf_counter() - start
+            failures = int(result.map(_is_failure).sum()) if result.dtype == object else 0
+            with lock:
+                metrics.sampled_seconds += seconds
+                metrics.calls += len(values)
+                metrics.sampled_calls += len(values)
+                metrics.failures += failures
+            return result
+        return instrumented
+
+    def instrument_batch(self, table_name, column_name, transform):
+        """Wraps a batch transform so each call counts every value it was
+        given. Values it returned no result for count as failures, since
+        they become failures once looked up."""
+        metrics = self.column(table_name, column_name)
+        lock = self.lock
+
+        def instrumented(values):
+            start = perf_counter()
+            results = transform(values)
+            seconds = perf_counter() - start
+            failures = sum(map(_is_failure, results.values()))
+            failures += sum(1 for value in values if value not in results)
+            with lock:
+                metrics.sampled_seconds += seconds
+                metrics.calls += len(values)
+                metrics.sampled_calls += len(values)
+                metrics.failures += failures
+            return results
+        return instrumented
+
+    def instrument_rows(self, table_name, transform_row):
+        """Wraps the function transforming entire rows so rows are counted and
+        timed"""
+        metrics = self.table(table_name)
+        interval = self.interval
+        lock = self.lock
+
+        def instrumented(raw_row):
+            with lock:
+                metrics.rows += 1
+                sampled = not metrics.rows % interval
+            if not sampled:
+                return transform_row(raw_row)
+            start = perf_counter()
+            cooked_row = transform_row(raw_row)
+            seconds = perf_counter() - start
+            with lock:
+                metrics.sampled_seconds += seconds
+                metrics.sampled_rows += 1
+            return cooked_row
+        return instrumented
+
+    def record_rows(self, table_name, rows, seconds):
+        """Records rows transformed in bulk, for example as a DataFrame"""
+        metrics = self.table(table_name)
+        with self.lock:
+            metrics.rows += rows
+            metrics.sampled_rows += rows
+            metrics.sampled_seconds += seconds
+
+    def as_dict(self):
+        """Returns everything collected as a dict keyed by table name"""
+        with self.lock:
+            return {
+                table_name: metrics.as_dict()
+                for table_name, metrics in self.tables.items()
+            }
+
+    def to_prometheus(self, prefix='thecurator'):
+        """Returns a snapshot in the Prometheus text exposition format"""
+        lines = []
+
+        def family(name, kind, description, samples):
+            lines.append(f'# HELP {prefix}_{name} {description}')
+            lines.append(f'# TYPE {prefix}_{name} {kind}')
+            for labels, value in samples:
+                formatted = ','.join(
+                    f'{label}="{_escape(label_value)}"' for label, label_value in labels)
+                lines.append(f'{prefix}_{name}{{{formatted}}} {value}')
+
+        with self.lock:
+            tables = sorted(self.tables.items())
+        columns = [
+            ((('table', table_name), ('column', column_name)), metrics)
+            for table_name, table in tables
+            for column_name, metrics in sorted(table.columns.items())
+        ]
+        family('rows_total', 'counter', 'Rows transformed',
+               [((('table', name),), table.rows) for name, table in tables])
+        family('rows_seconds_total', 'counter', 'Seconds spent transforming rows',
+               [((('table', name),), table.seconds) for name, table in tables])
+        family('rows_per_second', 'gauge', 'Rows transformed per second',
+               [((('table', name),), table.rows_per_second) for name, table in tables])
+        family('transform_calls_total', 'counter', 'Calls to column transforms',
+               [(labels, metrics.calls) for labels, metrics in columns])
+        family('transform_seconds_total', 'counter', 'Seconds spent in column transforms',
+               [(labels, metrics.seconds) for labels, metrics in columns])
+        family('transform_failures_total', 'counter',
+               'Transform failures returned by column transforms',
+               [(labels, metrics.failures) for labels, metrics in columns])
+        return '\n'.join(lines) + '\n'
+
+
+def _is_failure(value):
+    return value.__class__ is TransformFailure
+
+
+def _escape(label_value):
+    return str(label_value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
@@ -0,0 +1,77 @@
+"""
+In case it isn't already clear by the namespace, this is a private API. Use it
+at your own risk.
+
+Helpers for transforming chunks of rows in a process pool. Transform functions
+are never pickled: every worker builds its own `Registry` from the arguments
+the curator's registry was built with, which resolves each transform from its
+dotted path.
+"""
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from . import batched
+from .table_description import Registry
+
+"""Registry built by each worker process when it starts"""
+_registry = None
+
+
+def _initialize_worker(registry_args):
+    global _registry
+    _registry = Registry(*registry_args)
+
+
+def _transform_rows(table_name, columns, raw_rows):
+    return _registry.get_plan(table_name, columns=columns).transform_chunk(raw_rows)
+
+
+def _transform_df(table_name, columns, df):
+    return _registry.get_plan(table_name, columns=columns).transform_df(df)
+
+
+def _executor(registry_args, workers):
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_initialize_worker,
+        initargs=(registry_args,)
+    )
+
+
+def transform_dicts(registry_args, table_name, raw_rows, workers, chunk_size, columns=None):
+    """Transforms rows across `workers` processes in chunks of `chunk_size`,
+    projected to `columns` when given.
+
+    Returns:
+        :obj:`list` of :obj:`dict`: Transformed rows in their original order
+    """
+    chunks = batched(raw_rows, chunk_size)
+    cooked_rows = []
+    with _executor(registry_args, workers) as executor:
+        cooked_chunks = executor.map(
+            _transform_rows, itertools.repeat(table_name), itertools.repeat(columns), chunks)
+        for cooked_chunk in cooked_chunks:
+            cooked_rows.extend(cooked_chunk)
+    return cooked_rows
+
+
+def transform_df(registry_args, table_name, df, workers, chunk_size, columns=None):
+    """Transforms a DataFrame across `workers` processes in chunks of
+    `chunk_size` rows and copies the results back into `df`. When projected
+    to `columns`, a new frame holding only those is returned instead.
+
+    Returns:
+        pandas.DataFrame: The provided DataFrame transformed in place
+    """
+    import pandas
+    chunks = (df.iloc[start:start + chunk_size] for start in range(0, len(df), chunk_size))
+    with _executor(registry_args, workers) as executor:
+        cooked_chunks = list(executor.map(
+            _transform_df, itertools.repeat(table_name), itertools.repeat(columns), chunks))
+    if not cooked_chunks:
+        return df if columns is None else df[[name for name in columns if name in df.columns]]
+    cooked = pandas.concat(cooked_chunks)
+    if columns is not None:
+        return cooked
+    for column_name in cooked.columns:
+        df[column_name] = cooked[column_name]
+    return df
@@ -0,0 +1,265 @@
+"""
+In case it isn't already clear by the namespace, this is a private API. Use it
+at your own risk.
+
+Rows whose transform failed are screened out of transformed rows as they're
+built and either raised or handed to a quarantine, so the rest can still be
+inserted in bulk. `Quarantine`, `ListQuarantine`, `FileQuarantine` and
+`TableQuarantine` are exported publicly from `thecurator`.
+"""
+import contextlib
+import json
+import threading
+from collections import namedtuple
+import sqlalchemy
+from .failure import TransformError, TransformFailure
+
+"""Name of the side table `TableQuarantine` writes to by default"""
+QUARANTINE_TABLE_NAME = 'thecurator_quarantine'
+
+"""Failures kept as examples per column by default"""
+DEFAULT_MAX_EXAMPLES = 10
+
+"""Rows `ListQuarantine` keeps by default"""
+DEFAULT_MAX_ROWS = 10000
+
+"""A quarantined row along with the failures its transform returned"""
+QuarantinedRow = namedtuple('QuarantinedRow', ['table_name', 'raw_row', 'failures'])
+
+
+def find_failures(cooked_row):
+    """Returns the failures in a transformed row keyed by column"""
+    return {
+        column_name: value for column_name, value in cooked_row.items()
+        if value.__class__ is TransformFailure
+    }
+
+
+def screen(table_name, pairs, quarantine=None):
+    """Yields the `(raw_row, cooked_row)` pairs whose transformed row has no
+    failures, passing the rest to `quarantine`, or raising for the first of
+    them when there's no quarantine.
+
+    The quarantine is flushed once the pairs run out.
+
+    Raises:
+        TransformError: For the first row with failures when there's no
+            quarantine
+    """
+    try:
+        for raw_row, cooked_row in pairs:
+            failures = find_failures(cooked_row)
+            if not failures:
+                yield raw_row, cooked_row
+            elif quarantine is None:
+                raise TransformError(table_name, raw_row, failures)
+            else:
+                quarantine.add(table_name, raw_row, failures)
+    finally:
+        if quarantine is not None:
+            quarantine.flush()
+
+
+class Quarantine():
+    """Counts the rows whose transform failed per table and the failures per
+    column, keeping a few failures of each column as examples, so memory
+    stays bounded however dirty the rows are.
+
+    This class only counts. Subclass it and override `write` (and `flush`,
+    when writes are buffered) to keep the rows somewhere. `add` calls `write`
+    holding `lock`, so rows may be added from several threads at once.
+
+    Args:
+        max_examples (int): Most failures kept as examples per column
+
+    Attributes:
+        lock (threading.RLock): Held while rows are added and flushed
+        deferrals (int): Number of `deferred` blocks open
+        row_counts (dict): Rows quarantined keyed by table name
+        failure_counts (dict): Failures keyed by table name, then column name
+        examples (dict): Lists of at most `max_examples` `TransformFailure`s
+            keyed by table name, then column name
+    """
+
+    def __init__(self, max_examples=DEFAULT_MAX_EXAMPLES):
+        self.max_examples = max_examples
+        self.lock = threading.RLock()
+        self.deferrals = 0
+        self.row_counts = {}
+        self.failure_counts = {}
+        self.examples = {}
+
+    def add(self, table_name, raw_row, failures):
+        """Counts a row whose transform failed and writes it
+
+        Args:
+            table_name (str): Table the row was transformed for
+            raw_row (dict): The row as it was provided
+            failures (dict): `TransformFailure`s keyed by column name
+        """
+        with self.lock:
+            self.row_counts[table_name] = self.row_counts.get(table_name, 0) + 1
+            counts = self.failure_counts.setdefault(table_name, {})
+            examples = self.examples.setdefault(table_name, {})
+            for column_name, failure in failures.items():
+                counts[column_name] = counts.get(column_name, 0) + 1
+                column_examples = examples.setdefault(column_name, [])
+                if len(column_examples) < self.max_examples:
+                    column_examples.append(failure)
+            self.write(table_name, raw_row, failures)
+
+    def write(self, table_name, raw_row, failures):
+        """Keeps a row whose transform failed, see `add`"""
+
+    def flush(self):
+        """Writes out anything `write` buffered. Called whenever a run of rows
+        has been screened."""
+
+    @contextlib.contextmanager
+    def deferred(self):
+        """Holds buffered rows back until the block ends, then flushes them.
+
+        Loads committing once open this around their transaction, since a
+        quarantine writing through a connection of its own may otherwise wait
+        on the locks that transaction holds.
+        """
+        with self.lock:
+            self.deferrals += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.deferrals -= 1
+            self.flush()
+
+    def as_dict(self):
+        """Returns the counts and the messages of the examples keyed by table
+        name"""
+        return {
+            table_name: {
+                'rows': rows,
+                'failures': dict(self.failure_counts[table_name]),
+                'examples': {
+                    column_name: [failure.message for failure in failures]
+                    for column_name, failures in self.examples[table_name].items()
+                },
+            }
+            for table_name, rows in self.row_counts.items()
+        }
+
+
+class ListQuarantine(Quarantine):
+    """Keeps the first quarantined rows in memory. Rows past `max_rows` are
+    still counted but not kept, so memory stays bounded on dirty feeds.
+
+    Args:
+        max_examples (int): See `Quarantine`
+        max_rows (int, optional): Most rows kept, or `None` to keep every
+            row
+
+    Attributes:
+        rows (:obj:`list` of :obj:`QuarantinedRow`): Quarantined rows in the
+            order they were found
+    """
+
+    def __init__(self, max_examples=DEFAULT_MAX_EXAMPLES, max_rows=DEFAULT_MAX_ROWS):
+        super().__init__(max_examples)
+        self.max_rows = max_rows
+        self.rows = []
+
+    def write(self, table_name, raw_row, failures):
+        if self.max_rows is None or len(self.rows) < self.max_rows:
+            self.rows.append(QuarantinedRow(table_name, raw_row, failures))
+
+
+def failure_messages(failures):
+    return {column_name: failure.message for column_name, failure in failures.items()}
+
+
+class FileQuarantine(Quarantine):
+    """Appends quarantined rows to a JSON Lines file, one object per row with
+    the table's name, the raw row and the message of each failure. Values
+    JSON can't represent are written as strings.
+
+    Args:
+        path (str): File to append to, opened the first time a row is written
+        max_examples (int): See `Quarantine`
+    """
+
+    def __init__(self, path, max_examples=DEFAULT_MAX_EXAMPLES):
+        super().__init__(max_examples)
+        self.path = path
+        self.file = None
+
+    def write(self, table_name, raw_row, failures):
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf-8')
+        self.file.write(json.dumps({
+            'table': table_name,
+            'row': raw_row,
+            'failures': failure_messages(failures),
+        }, default=str) + '\n')
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class TableQuarantine(Quarantine):
+    """Writes quarantined rows to a side table of a database, with the raw
+    row and the failure messages stored as JSON text.
+
+    Rows are buffered and inserted through a connection of their own, in
+    batches of `batch_size` and whenever a run of rows has been screened,
+    unless they're `deferred`.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): Database holding the side table
+        table_name (str): Name of the side table, created if it's missing
+        batch_size (int): Rows buffered before they're inserted
+        max_examples (int): See `Quarantine`
+    """
+
+    def __init__(self, engine, table_name=QUARANTINE_TABLE_NAME, batch_size=1000,
+                 max_examples=DEFAULT_MAX_EXAMPLES):
+        super().__init__(max_examples)
+        self.engine = engine
+        self.batch_size = batch_size
+        self.pending = []
+        self.table = sqlalchemy.Table(
+            table_name, sqlalchemy.MetaData(),
+            sqlalchemy.Column('id', sqlalchemy.Integer, primary_key=True),
+            sqlalchemy.Column('table_name', sqlalchemy.String(255), nullable=False),
+            sqlalchemy.Column('raw_row', sqlalchemy.Text, nullable=False),
+            sqlalchemy.Column('failures', sqlalchemy.Text, nullable=False),
+        )
+        self.table.create(engine, checkfirst=True)
+
+    def write(self, table_name, raw_row, failures):
+        self.pending.append({
+            'table_name': table_name,
+            'raw_row': json.dumps(raw_row, default=str),
+            'failures': json.dumps(failure_messages(failures)),
+        })
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.deferrals or not self.pending:
+                return
+            pending, self.pending = self.pending, []
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(self.table.insert(), pending)
+        except BaseException:
+            with self.lock:
+                self.pending[:0] = pending
+            raise
@@ -0,0 +1,182 @@
+"""
+In case it isn't already clear by the namespace, this is a private API. Use it
+at your own risk.
+
+Streaming readers for CSV and JSON Lines files. Records are read through a
+large buffer one at a time, with their fields renamed to the described
+columns, so files never need to fit in memory.
+"""
+import csv
+import json
+import os
+import queue
+import threading
+from . import batched
+
+FORMAT_CSV = 'csv'
+FORMAT_JSONL = 'jsonl'
+
+"""File formats keyed by the extensions they're inferred from"""
+EXTENSIONS = {
+    '.csv': FORMAT_CSV,
+    '.jsonl': FORMAT_JSONL,
+    '.ndjson': FORMAT_JSONL,
+}
+
+"""Bytes read from a file at a time"""
+BUFFER_SIZE = 1024 * 1024
+
+
+def normalize(name):
+    """Normalizes a header for matching, so `' Patient MRN'` matches
+    `patient_mrn`"""
+    return '_'.join(name.strip().lower().split())
+
+
+def file_format(path, format=None):
+    """Returns the given format or the one inferred from the path's extension
+
+    Raises:
+        ValueError: When the format is unknown or can't be inferred
+    """
+    if format is None:
+        extension = os.path.splitext(path)[1].lower()
+        try:
+            return EXTENSIONS[extension]
+        except KeyError:
+            raise ValueError(f"Can't infer the format of {path}, pass format='csv' or 'jsonl'")
+    if format not in (FORMAT_CSV, FORMAT_JSONL):
+        raise ValueError(f'Unknown file format {format}')
+    return format
+
+
+class HeaderMap():
+    """Maps the field names of a file to described column names.
+
+    A field is mapped by `header_map` when it's listed there, otherwise to the
+    column whose name it matches once both are normalized. Fields matching no
+    column are dropped.
+
+    Args:
+        column_names (:obj:`list` of :obj:`str`): Described columns
+        header_map (dict, optional): Column names keyed by field name
+    """
+
+    def __init__(self, column_names, header_map=None):
+        self.header_map = header_map or {}
+        self.columns_by_normalized = {normalize(name): name for name in column_names}
+        self.mapped = {}
+
+    def __getitem__(self, field_name):
+        """Returns the column a field maps to or `None` when it's dropped"""
+        try:
+            return self.mapped[field_name]
+        except KeyError:
+            pass
+        if field_name in self.header_map:
+            column_name = self.header_map[field_name]
+        else:
+            column_name = self.columns_by_normalized.get(normalize(field_name))
+        self.mapped[field_name] = column_name
+        return column_name
+
+
+def read_csv(path, header_map, encoding='utf-8', **csv_options):
+    """Yields the records of a CSV file with a header row as dicts
+
+    Rows shorter than the header are padded with `None`.
+    """
+    with open(path, newline='', encoding=encoding, buffering=BUFFER_SIZE) as csv_file:
+        reader = csv.reader(csv_file, **csv_options)
+        header = next(reader, None)
+        if header is None:
+            return
+        fields = [
+            (index, header_map[field_name]) for index, field_name in enumerate(header)
+            if header_map[field_name] is not None
+        ]
+        width = len(header)
+        for row in reader:
+            if not row:
+                continue
+            if len(row) < width:
+                row += [None] * (width - len(row))
+            yield {column_name: row[index] for index, column_name in fields}
+
+
+def read_jsonl(path, header_map, encoding='utf-8'):
+    """Yields the objects of a JSON Lines file as dicts, skipping blank lines"""
+    with open(path, encoding=encoding, buffering=BUFFER_SIZE) as jsonl_file:
+        loads = json.loads
+        for line in jsonl_file:
+            if not line.strip():
+                continue
+            record = loads(line)
+            raw_row = {}
+            for field_name, value in record.items():
+                column_name = header_map[field_name]
+                if column_name is not None:
+                    raw_row[column_name] = value
+            yield raw_row
+
+
+def read_file(path, column_names, format=None, header_map=None, encoding='utf-8',
+              **csv_options):
+    """Yields the records of a CSV or JSON Lines file as dicts keyed by the
+    described columns"""
+    header_map = HeaderMap(column_names, header_map)
+    if file_format(path, format) == FORMAT_CSV:
+        return read_csv(path, header_map, encoding, **csv_options)
+    return read_jsonl(path, header_map, encoding)
+
+
+"""Put on the queue by the background reader once the records run out"""
+_DONE = object()
+
+
+def prefetch(records, chunk_size, max_chunks=2):
+    """Yields records read on a background thread `chunk_size` at a time, so
+    parsing overlaps with whatever the caller does with them.
+
+    At most `max_chunks` chunks are read ahead. Exceptions raised while
+    reading are raised again here. The thread stops early when the
+    generator is closed.
+    """
+    chunks = queue.Queue(max_chunks)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read():
+        try:
+            for chunk in batched(records, chunk_size):
+                if not put(chunk):
+                    return
+        except Exception as error:
+            put(error)
+            return
+        finally:
+            if hasattr(records, 'close'):
+                records.close()
+        put(_DONE)
+
+    reader = threading.Thread(target=read, name='thecurator-prefetch', daemon=True)
+    reader.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is _DONE:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield from chunk
+    finally:
+        stopped.set()
+        reader.join()
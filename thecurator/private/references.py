@@ -0,0 +1,151 @@
+"""
+In case it isn't already clear by the namespace, this is a private API. Use it
+at your own risk.
+
+In-memory indexes of the keys referenced by `references:` declarations, so
+rows can be checked against their parent table without querying the
+database once per row.
+"""
+import hashlib
+import math
+import threading
+import sqlalchemy
+from .failure import TransformFailure
+
+
+class BloomFilter():
+    """Set membership in a fixed amount of memory, at the cost of false
+    positives: values that were never added may be reported as present.
+
+    Args:
+        capacity (int): Number of values expected
+        false_positive_rate (float): Rate of false positives once `capacity`
+            values have been added; it grows beyond that
+    """
+
+    def __init__(self, capacity, false_positive_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(repr(value).encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * second) % self.size for index in range(self.hash_count)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def __contains__(self, value):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(value))
+
+
+def parse_reference(reference):
+    """Splits a `references:` declaration into its table and column names"""
+    table_name, _, column_name = reference.partition('.')
+    return table_name, column_name
+
+
+class ReferenceIndex():
+    """Keys of the referenced parent columns, each read with a single query
+    the first time a row referencing it is checked and kept up to date as the
+    curator loads the parent.
+
+    Args:
+        reflector (TableReflector): Reflects the parent tables
+        engine (sqlalchemy.engine.Engine): Database to read keys from
+        bloom_threshold (int, optional): Parent columns with more distinct
+            keys than this are indexed with a `BloomFilter` rather than a set
+        false_positive_rate (float): False positive rate of Bloom filters
+    """
+
+    def __init__(self, reflector, engine, bloom_threshold=None, false_positive_rate=0.01):
+        self.reflector = reflector
+        self.engine = engine
+        self.bloom_threshold = bloom_threshold
+        self.false_positive_rate = false_positive_rate
+        self.keys = {}
+        self.lock = threading.RLock()
+
+    def keys_for(self, table_name, column_name):
+        """Returns the set or Bloom filter of a parent column's keys, reading
+        them the first time they're needed"""
+        try:
+            return self.keys[(table_name, column_name)]
+        except KeyError:
+            pass
+        with self.engine.connect() as connection:
+            self.read(connection, [f'{table_name}.{column_name}'])
+        return self.keys[(table_name, column_name)]
+
+    def read(self, connection, references):
+        """Reads the keys of the referenced columns that haven't been read
+        through the given connection
+
+        Args:
+            connection (sqlalchemy.engine.Connection): Connection to read with
+            references (iterable of :obj:`str`): `table.column` references
+        """
+        with self.lock:
+            for reference in references:
+                parent = parse_reference(reference)
+                if parent not in self.keys:
+                    self.keys[parent] = self._read(connection, *parent)
+
+    def _read(self, connection, table_name, column_name):
+        column = self.reflector.get_table(table_name, connection).c[column_name]
+        keys = set()
+        if self.bloom_threshold is not None:
+            count = connection.execute(
+                sqlalchemy.select(sqlalchemy.func.count(sqlalchemy.distinct(column)))
+            ).scalar()
+            if count > self.bloom_threshold:
+                keys = BloomFilter(count, self.false_positive_rate)
+        result = connection.execution_options(yield_per=10000).execute(
+            sqlalchemy.select(column).where(column.isnot(None)).distinct())
+        keys.update(result.scalars())
+        return keys
+
+    def record(self, table_name, rows):
+        """Adds the keys of rows loaded into a table to each of its columns'
+        indexes that have been read"""
+        with self.lock:
+            for (parent_table, column_name), keys in self.keys.items():
+                if parent_table == table_name:
+                    keys.update(
+                        row[column_name] for row in rows if row.get(column_name) is not None)
+
+    def discard(self, table_name=None):
+        """Forgets the indexes of a table's columns, or of every table, so
+        they're read again when next needed. Used when a load recorded into
+        them is rolled back or the parents change outside the curator."""
+        with self.lock:
+            for parent in list(self.keys):
+                if table_name is None or parent[0] == table_name:
+                    del self.keys[parent]
+
+    def checker(self, table_name, column):
+        """Returns a function passing through values found in the column the
+        given column references and returning a `TransformFailure` for the
+        rest. `None` and failures pass through."""
+        parent_table, parent_column = parse_reference(column['references'])
+        reason = f'No {parent_table} with {parent_column} matching value'
+        location = f"{table_name}.{column['name']}"
+        keys_for = self.keys_for
+
+        def check(cooked_value):
+            if cooked_value is None or cooked_value.__class__ is TransformFailure:
+                return cooked_value
+            if cooked_value in keys_for(parent_table, parent_column):
+                return cooked_value
+            return TransformFailure(reason, cooked_value, location)
+        return check
@@ -0,0 +1,135 @@
+"""
+In case it isn't already clear by the namespace, this is a private API. Use it
+at your own risk.
+"""
+import os
+import pickle
+import tempfile
+import threading
+import sqlalchemy
+
+
+class TableReflector():
+    """Reflects database tables one at a time as they're first needed.
+
+    When given a cache path, reflected tables are pickled to that file so later
+    processes can skip reflection. A cached table is only trusted after its
+    columns, indexes and constraints, fetched with a few inspector queries,
+    match those it was cached with; otherwise it's reflected again. A cache
+    that can't be read, such as one written by another version of Python or
+    SQLAlchemy, is ignored and rebuilt.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): Engine to reflect with
+        cache_path (str, optional): File to persist reflected tables to
+
+    Attributes:
+        metadata (sqlalchemy.MetaData): Metadata holding the reflected tables
+    """
+
+    def __init__(self, engine, cache_path=None):
+        self.engine = engine
+        self.cache_path = cache_path
+        self.metadata = sqlalchemy.MetaData()
+        self.fingerprints = {}
+        self.unverified = set()
+        self.lock = threading.Lock()
+        if cache_path:
+            self._read_cache()
+
+    def get_table(self, table_name, bind=None):
+        """Returns the `sqlalchemy.Table` with the given name, reflecting it if
+        it hasn't been already.
+
+        Args:
+            table_name (str): Name of the table
+            bind (sqlalchemy.engine.Connection, optional): Connection to
+                reflect with instead of the engine, such as the synchronous
+                connection `AsyncConnection.run_sync` passes along
+
+        Raises:
+            sqlalchemy.exc.NoSuchTableError: When the table doesn't exist
+        """
+        table = self.metadata.tables.get(table_name)
+        if table is not None and table_name not in self.unverified:
+            return table
+        with self.lock:
+            if table_name in self.unverified:
+                self.unverified.discard(table_name)
+                if self.fingerprints.get(table_name) == self._fingerprint(table_name, bind):
+                    return table
+                self.metadata.remove(table)
+            elif table_name in self.metadata.tables:
+                return self.metadata.tables[table_name]
+            self.metadata.reflect(bind=bind or self.engine, only=[table_name])
+            if self.cache_path:
+                self.fingerprints[table_name] = self._fingerprint(table_name, bind)
+                self._write_cache()
+            return self.metadata.tables[table_name]
+
+    def _fingerprint(self, table_name, bind=None):
+        """Summarizes the columns, indexes and constraints of a table as they
+        exist in the database"""
+        inspector = sqlalchemy.inspect(bind or self.engine)
+        try:
+            columns = inspector.get_columns(table_name)
+        except sqlalchemy.exc.NoSuchTableError:
+            return None
+        if not columns:
+            return None
+        return (
+            tuple((column['name'], str(column['type']), column['nullable']) for column in columns),
+            tuple(sorted(
+                (index['name'], tuple(map(str, index['column_names'])), bool(index['unique']))
+                for index in inspector.get_indexes(table_name)
+            )),
+            tuple(inspector.get_pk_constraint(table_name)['constrained_columns']),
+            tuple(sorted(
+                (tuple(key['constrained_columns']), key['referred_table'],
+                 tuple(key['referred_columns']))
+                for key in inspector.get_foreign_keys(table_name)
+            )),
+            _unique_constraints(inspector, table_name),
+        )
+
+    def _cache_key(self):
+        """Cached tables are only reused for the same database. The URL's repr
+        hides its password."""
+        return repr(self.engine.url)
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_path, 'rb') as cache_file:
+                cached = pickle.load(cache_file)
+        except Exception:
+            # Missing, corrupt or pickled by other versions: reflect instead
+            return
+        if not isinstance(cached, dict) or cached.get('key') != self._cache_key():
+            return
+        self.metadata = cached['metadata']
+        self.fingerprints = cached['fingerprints']
+        self.unverified = set(self.metadata.tables)
+
+    def _write_cache(self):
+        """Writes the cache file atomically, so readers never see it partially
+        written"""
+        directory = os.path.dirname(os.path.abspath(self.cache_path))
+        with tempfile.NamedTemporaryFile('wb', dir=directory, delete=False) as cache_file:
+            pickle.dump({
+                'key': self._cache_key(),
+                'metadata': self.metadata,
+                'fingerprints': self.fingerprints,
+            }, cache_file)
+        os.replace(cache_file.name, self.cache_path)
+
+
+def _unique_constraints(inspector, table_name):
+    """Returns the unique constraints of a table, or `None` when the dialect
+    can't list them"""
+    try:
+        constraints = inspector.get_unique_constraints(table_name)
+    except NotImplementedError:
+        return None
+    return tuple(sorted(
+        (str(constraint['name']), tuple(constraint['column_names'])) for constraint in constraints
+    ))
@@ -0,0 +1,100 @@
+"""
+In case it isn't already clear by the namespace, this is a private API. Use it
+at your own risk.
+
+Runs the loads of several tables on a thread pool, starting each table's
+loads as soon as the tables it depends on have finished, so a full refresh
+takes about as long as its longest chain of dependent tables.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from time import perf_counter
+from .dependencies import topological_order
+
+
+def is_source_list(source):
+    """Whether a source passed to `Curator.load_all` is a list of sources
+    rather than a list of rows"""
+    return isinstance(source, (list, tuple)) and bool(source) and \
+        not any(isinstance(part, dict) for part in source)
+
+
+def run(tasks_by_table, dependencies, workers, max_per_table=1):
+    """Runs every task of every table, each table's only once every table it
+    depends on has finished.
+
+    Tables are started in dependency order, so when workers are scarce the
+    tables earlier in it go first. Once a task fails no more are started; the
+    running ones are waited for and the first failure is raised.
+
+    Args:
+        tasks_by_table (dict): Lists of functions taking no arguments keyed by
+            table name
+        dependencies (dict): Iterables of the tables each table depends on,
+            keyed by table name. Tables that aren't in `tasks_by_table` are
+            ignored.
+        workers (int): Most tasks running at once
+        max_per_table (int): Most tasks of a single table running at once
+
+    Returns:
+        dict: Pairs of the results of a table's tasks, in order, and the
+        seconds from when its first task started until its last finished,
+        keyed by table name
+
+    Raises:
+        ValueError: When the dependencies contain a cycle or a limit is less
+            than 1
+    """
+    if workers < 1 or max_per_table < 1:
+        raise ValueError('Workers and tasks per table must be at least 1')
+    dependencies = {
+        table_name: set(dependencies.get(table_name, ())) & set(tasks_by_table) - {table_name}
+        for table_name in tasks_by_table
+    }
+    order = topological_order(dependencies)
+    queued = {table_name: list(enumerate(tasks_by_table[table_name])) for table_name in order}
+    results = {table_name: [None] * len(tasks) for table_name, tasks in tasks_by_table.items()}
+    started = {}
+    seconds = {}
+    running = {table_name: 0 for table_name in order}
+    finished = set()
+    failure = None
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thecurator-load') as pool:
+        futures = {}
+
+        def submit_ready():
+            for table_name in order:
+                if table_name in finished or not dependencies[table_name] <= finished:
+                    continue
+                while queued[table_name] and running[table_name] < max_per_table and \
+                        len(futures) < workers:
+                    index, task = queued[table_name].pop(0)
+                    started.setdefault(table_name, perf_counter())
+                    running[table_name] += 1
+                    futures[pool.submit(task)] = (table_name, index)
+
+        def finish(table_name):
+            finished.add(table_name)
+            seconds[table_name] = perf_counter() - started.get(table_name, perf_counter())
+
+        for table_name in order:
+            if not tasks_by_table[table_name]:
+                finish(table_name)
+        submit_ready()
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                table_name, index = futures.pop(future)
+                running[table_name] -= 1
+                try:
+                    results[table_name][index] = future.result()
+                except BaseException as error:
+                    failure = failure or error
+                    continue
+                if not queued[table_name] and not running[table_name]:
+                    finish(table_name)
+            if failure is None:
+                submit_ready()
+    if failure is not None:
+        raise failure
+    return {table_name: (results[table_name], seconds[table_name]) for table_name in order}
@@ -0,0 +1,143 @@
+"""
+In case it isn't already clear by the namespace, this is a private API. Use it
+at your own risk.
+
+Swappers replace a table with a staging table loaded alongside it, so readers
+keep seeing the old rows until the new ones are swapped in. `TableSwapper`,
+`SQLiteTableSwapper` and `SWAPPERS` are exported publicly from `thecurator`.
+"""
+import sqlalchemy
+
+"""Appended to the names of staging tables and of the indexes and
+constraints built on them"""
+STAGING_SUFFIX = '__thecurator_staging'
+
+
+class TableSwapper():
+    """Creates staging tables and swaps them in for the tables they replace.
+
+    The staging table is created without indexes, so rows are loaded into it
+    without maintaining any. Once it's loaded, the table's indexes are built
+    on it under temporary names, and in a single transaction the table is
+    dropped and the staging table, its indexes and its constraints are
+    renamed in its place.
+
+    Works with databases whose DDL is transactional and that rename with
+    `ALTER TABLE ... RENAME TO`, `ALTER INDEX ... RENAME TO` and
+    `ALTER TABLE ... RENAME CONSTRAINT`, such as PostgreSQL. Subclass it and
+    override its methods for another database, then register the subclass in
+    `SWAPPERS` under the dialect's name or pass an instance to `Curator`.
+    """
+
+    def staging_table(self, table):
+        """Returns a copy of a table to stage its replacement in, without its
+        indexes. Its named constraints are given their `staged_name`, so they
+        don't clash with the table's.
+
+        Args:
+            table (sqlalchemy.Table): Table to replace
+        """
+        metadata = sqlalchemy.MetaData()
+        # Foreign keys are resolved against the tables in the same metadata
+        for foreign_key in table.foreign_keys:
+            referred = foreign_key.column.table
+            if referred is not table and referred.key not in metadata.tables:
+                referred.to_metadata(metadata)
+        staging = table.to_metadata(metadata, name=table.name + STAGING_SUFFIX)
+        staging.indexes.clear()
+        for constraint in staging.constraints:
+            if is_named(constraint):
+                constraint.name = self.staged_name(constraint.name)
+        return staging
+
+    def staged_name(self, name):
+        """Returns the name an index or constraint is given on the staging
+        table"""
+        return name + STAGING_SUFFIX
+
+    def create(self, connection, staging):
+        """Creates the staging table, dropping any left behind by a refresh
+        that was interrupted"""
+        staging.drop(connection, checkfirst=True)
+        staging.create(connection)
+
+    def build_indexes(self, connection, table, staging):
+        """Builds the indexes of the table on the loaded staging table, under
+        temporary names"""
+        for index in table.indexes:
+            copy_index(index, staging, self.staged_name(index.name)).create(connection)
+
+    def swap(self, connection, table, staging):
+        """Drops the table and renames the staging table, its indexes and its
+        constraints in its place, within the connection's transaction"""
+        preparer = connection.dialect.identifier_preparer
+        connection.execute(sqlalchemy.schema.DropTable(table))
+        connection.exec_driver_sql(
+            f'ALTER TABLE {preparer.format_table(staging)} RENAME TO {preparer.quote(table.name)}')
+        for index in table.indexes:
+            staged_name = preparer.quote(self.staged_name(index.name))
+            if table.schema:
+                staged_name = f'{preparer.quote_schema(table.schema)}.{staged_name}'
+            connection.exec_driver_sql(
+                f'ALTER INDEX {staged_name} RENAME TO {preparer.quote(index.name)}')
+        for constraint in table.constraints:
+            if is_named(constraint):
+                connection.exec_driver_sql(
+                    f'ALTER TABLE {preparer.format_table(table)} RENAME CONSTRAINT '
+                    f'{preparer.quote(self.staged_name(constraint.name))} '
+                    f'TO {preparer.quote(constraint.name)}')
+
+    def drop(self, connection, staging):
+        """Drops the staging table of a refresh that failed"""
+        staging.drop(connection, checkfirst=True)
+
+
+class SQLiteTableSwapper(TableSwapper):
+    """Swaps staging tables in on SQLite, which can't rename indexes.
+
+    Indexes are built once the staging table is renamed instead, within the
+    transaction swapping it in. With write-ahead logging, readers keep seeing
+    the old table until that transaction commits. The transaction is begun
+    explicitly, since the sqlite3 module doesn't begin one before DDL.
+    Constraints keep their names, which SQLite scopes to their table.
+    """
+
+    def staged_name(self, name):
+        return name
+
+    def build_indexes(self, connection, table, staging):
+        pass
+
+    def swap(self, connection, table, staging):
+        if not connection.connection.driver_connection.in_transaction:
+            connection.exec_driver_sql('BEGIN')
+        preparer = connection.dialect.identifier_preparer
+        connection.execute(sqlalchemy.schema.DropTable(table))
+        connection.exec_driver_sql(
+            f'ALTER TABLE {preparer.format_table(staging)} RENAME TO {preparer.quote(table.name)}')
+        for index in table.indexes:
+            index.create(connection)
+
+
+def is_named(constraint):
+    """Returns whether a constraint has a name of its own rather than one the
+    database chose"""
+    return isinstance(constraint.name, str) and bool(constraint.name)
+
+
+def copy_index(index, table, name):
+    """Returns a copy of an index on the same columns of another table"""
+    return sqlalchemy.Index(
+        name, *[table.c[column.name] for column in index.columns], unique=index.unique)
+
+
+"""Swapper classes keyed by the name of the dialect they're used for"""
+SWAPPERS = {
+    'sqlite': SQLiteTableSwapper,
+}
+
+
+def swapper_for(dialect):
+    """Returns a new instance of the swapper registered for a dialect, or of
+    `TableSwapper` when none is"""
+    return SWAPPERS.get(dialect.name, TableSwapper)()
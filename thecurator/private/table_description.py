@@ -2,27 +2,48 @@
 In case it isn't already clear by the namespace, this is a private API. Use it
 at your own risk.
 """
+import hashlib
 import os
 import jsonschema
 import yaml
 import sys
 import importlib
+from .cache import cache_size
+from .dependencies import topological_order
+from .description_cache import DescriptionCache
+from .references import parse_reference
+from .transform_plan import TransformPlan
 
 here = os.path.dirname(__file__)
 
+"""Loader for descriptions, using LibYAML's bindings when they're available"""
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+with open(os.path.join(here, '../table_description_schema.yml'), 'rb') as schema_file:
+    SCHEMA_SOURCE = schema_file.read()
+
 """Schema for table descriptions"""
-SCHEMA = yaml.load(
-    open(os.path.join(here, '../table_description_schema.yml')))
+SCHEMA = yaml.load(SCHEMA_SOURCE, Loader=YAML_LOADER)
+
+"""Digest of the schema, used to invalidate cached descriptions"""
+SCHEMA_DIGEST = hashlib.sha256(SCHEMA_SOURCE).hexdigest()
 
 
 class Registry():
     """
     Registry of all the table descriptions with conveneint lookup functions.
+
+    Args:
+        description_paths (:obj:`list` of :obj:`str`): Table descriptions
+        cache_dir (str, optional): Directory to cache parsed and validated
+            descriptions in, so unchanged files skip parsing and validation
     """
-    def __init__(self, description_paths):
+    def __init__(self, description_paths, cache_dir=None):
         self.tables_by_name = {}
+        self.plans = {}
+        cache = DescriptionCache(cache_dir, SCHEMA_DIGEST) if cache_dir else None
         for path in description_paths:
-            description = load_file(path)
+            description = load_file(path, cache)
             self.tables_by_name[description['name']] = description
 
     def get_table(self, table_name):
@@ -51,8 +72,32 @@ class Registry():
         column = self.get_column(table_name, column_name)
         return column.get('transform_fn')
 
+    def get_parents(self, table_name):
+        """Returns the names of the tables the given table's columns reference
+        """
+        return list(dict.fromkeys(
+            parse_reference(column['references'])[0]
+            for column in self.get_table(table_name)['columns'] if 'references' in column
+        ))
+
+    def get_plan(self, table_name, **options):
+        """Returns the compiled `TransformPlan` for the given table name
 
-def load_file(file_path):
+        Plans are compiled the first time they're requested and cached after,
+        separately for each combination of options passed on to the plan.
+        Options set to `None` are ignored.
+        """
+        options = {name: value for name, value in options.items() if value is not None}
+        key = (table_name, tuple(sorted(options.items())))
+        try:
+            return self.plans[key]
+        except KeyError:
+            plan = TransformPlan(self.get_table(table_name), **options)
+            self.plans[key] = plan
+            return plan
+
+
+def load_file(file_path, cache=None):
     """
     Loads a table description from the given path as a dict.
 
@@ -60,17 +105,92 @@ def load_file(file_path):
 
      - `columns_by_name` which is a dict of the tables columns by keyed by name
      - `transform_fn` the function corresponding to a column's transform key
+     - `transform_vectorized_fn` the function corresponding to a column's
+       transform_vectorized key
+
+    A `key` given as a single column name is normalized to a list.
+
+    Args:
+        file_path (str): Path to the description
+        cache (DescriptionCache, optional): Cache of parsed descriptions
     """
-    description = yaml.load(open(file_path))
-    validate(description)
+    if cache:
+        description = cache.load(file_path, parse)
+    else:
+        with open(file_path, 'rb') as description_file:
+            description = parse(description_file.read())
     columns = description['columns']
     columns_by_name = {}
     for column in columns:
         column_name = column['name']
         columns_by_name[column_name] = column
         if 'transform' in column:
-            column['transform_fn'] = convert_transform_to_fn(column['transform'])
+            transform = column['transform_fn'] = convert_transform_to_fn(column['transform'])
+            if hasattr(transform, 'requires_row') and hasattr(transform, 'batch_transform'):
+                raise ValueError(
+                    f'Transform for column {column_name} can\'t both require the '
+                    'row and transform batches')
+            if hasattr(transform, 'requires_row'):
+                kind = 'requires the row'
+            elif hasattr(transform, 'batch_transform'):
+                kind = 'transforms batches'
+            else:
+                kind = None
+            if kind and cache_size(column, transform):
+                raise ValueError(
+                    f'Transform for column {column_name} {kind} and can\'t be cached')
+            if kind and column.get('coerce'):
+                raise ValueError(
+                    f'Transform for column {column_name} {kind} and can\'t fall '
+                    'back from coercion')
+        if 'transform_vectorized' in column:
+            column['transform_vectorized_fn'] = \
+                convert_transform_to_fn(column['transform_vectorized'])
     description['columns_by_name'] = columns_by_name
+    if isinstance(description.get('key'), str):
+        description['key'] = [description['key']]
+    for key_column in description.get('key', []):
+        if key_column not in columns_by_name:
+            raise ValueError(
+                f"Key column {key_column} isn't a column of {description['name']}")
+    check_dependencies(description)
+    return description
+
+
+def check_dependencies(description):
+    """Checks the columns row transforms declare they depend on.
+
+    Raises:
+        ValueError: When a dependency isn't a described column or the
+            dependencies form a cycle
+    """
+    columns_by_name = description['columns_by_name']
+    dependencies = {}
+    for column in description['columns']:
+        depends_on = getattr(column.get('transform_fn'), 'depends_on', ())
+        for dependency in depends_on:
+            if dependency not in columns_by_name:
+                raise ValueError(
+                    f"Transform for column {column['name']} depends on column "
+                    f"{dependency} which {description['name']} doesn't describe")
+        dependencies[column['name']] = depends_on
+    try:
+        topological_order(dependencies)
+    except ValueError as e:
+        raise ValueError(f"Columns of {description['name']} can't be ordered: {e}") from e
+
+
+def parse(contents):
+    """Parses and validates the contents of a table description.
+
+    Args:
+        contents (bytes): YAML source of the description
+
+    Returns:
+        dict: The description
+    """
+    description = yaml.load(contents, Loader=YAML_LOADER)
+    validate(description)
     return description
 
 
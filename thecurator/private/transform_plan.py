@@ -0,0 +1,528 @@
+"""
+In case it isn't already clear by the namespace, this is a private API. Use it
+at your own risk.
+"""
+from collections.abc import Mapping
+from time import perf_counter
+from .cache import cache_size, lru_cache
+from .columns import RowView, column_length, pack
+from .coercion import coercer, coercion_failure, vectorized_coercer, with_fallback
+from .failure import TransformFailure
+from .dependencies import topological_order
+
+"""Most distinct strings interned per categorical column; strings beyond
+these pass through as they are"""
+MAX_CATEGORIES = 65536
+
+
+class TransformPlan():
+    """A table description compiled into the calls needed to transform a row.
+
+    Compiling sorts the described columns once so the per-row loop doesn't
+    need to look up transforms or inspect them for `requires_row`. Columns
+    with `coerce` set are converted by the built-in coercer for their declared
+    type, falling back to their transform for values it can't handle.
+
+    Args:
+        description (dict): Table description as returned by `load_file`
+        metrics (MetricsCollector, optional): Collector every transform is
+            instrumented to report to
+        references (ReferenceIndex, optional): Index the transformed values
+            of columns declaring `references` are checked against
+        columns (tuple, optional): Columns to project rows to. Only these and
+            the columns their row transforms depend on are transformed, and
+            transformed rows hold only these.
+
+    Attributes:
+        table_name (str): Name of the table the plan was compiled for
+        column_names (:obj:`list` of :obj:`str`): Described columns in order
+        column_types (dict): Declared type keyed by column
+        scalar_transforms (dict): Transform (or `None` when the value should
+            pass through untouched) keyed by column for every column that
+            doesn't require the entire row
+        row_transforms (:obj:`tuple` of :obj:`tuple`): `(column_name, transform)`
+            pairs for the columns that require the entire row, ordered so
+            each comes after the columns it depends on
+        row_dependencies (dict): Columns whose transformed values each row
+            transform reads, keyed by column
+        vectorized_transforms (dict): Vectorized counterparts keyed by column,
+            taken from the `transform_vectorized` key, a transform marked
+            with `@vectorized` or the coercer for the column's type
+        cached_transforms (dict): Scalar transforms wrapped in an LRU cache
+            keyed by column, see `cache_info`
+        batch_transforms (dict): Transforms marked with `@batch_transform`
+            keyed by column. Their column's scalar transform calls them for
+            one value at a time; `transform_chunk` calls them once per chunk.
+        referenced_columns (dict): `table.column` references keyed by column
+        reference_checks (dict): Functions checking a transformed value is
+            found in the referenced column, keyed by column. Only compiled
+            when a `ReferenceIndex` is given.
+        interners (dict): Functions returning a shared copy of each string,
+            keyed by the columns declared `categorical`
+        columns (tuple): Columns rows are projected to, or `None` when every
+            described column is transformed
+        skipped_columns (frozenset): Raw columns that aren't transformed on
+            their own, because a row transform computes them or no requested
+            column needs them
+    """
+
+    def __init__(self, description, metrics=None, references=None, columns=None):
+        self.table_name = description['name']
+        self.metrics = metrics
+        self.columns = None
+        described = description['columns']
+        if columns is not None:
+            needed = needed_columns(description, columns)
+            described = [column for column in described if column['name'] in needed]
+            self.columns = tuple(columns)
+        self.referenced_columns = {
+            column['name']: column['references']
+            for column in described if 'references' in column
+        }
+        self.reference_checks = {}
+        if references is not None:
+            self.reference_checks = {
+                column_name: references.checker(
+                    self.table_name, description['columns_by_name'][column_name])
+                for column_name in self.referenced_columns
+            }
+        self.column_names = [column['name'] for column in described]
+        self.column_types = {column['name']: column['type'] for column in described}
+        self.scalar_transforms = {}
+        self.vectorized_transforms = {}
+        self.cached_transforms = {}
+        self.batch_transforms = {}
+        self.missing_results = {}
+        self.row_dependencies = {}
+        self.interners = {
+            column['name']: interner()
+            for column in described if column.get('categorical')
+        }
+        row_transforms = {}
+        for column in described:
+            transform = column.get('transform_fn')
+            vectorized = column.get('transform_vectorized_fn') or \
+                getattr(transform, 'vectorized', None)
+            if vectorized:
+                self.vectorized_transforms[column['name']] = vectorized
+            if transform and hasattr(transform, 'requires_row'):
+                row_transforms[column['name']] = transform
+                self.row_dependencies[column['name']] = \
+                    frozenset(getattr(transform, 'depends_on', ()))
+                continue
+            if transform and hasattr(transform, 'batch_transform'):
+                self.batch_transforms[column['name']] = transform
+                self.missing_results[column['name']] = missing_result(self.table_name, column)
+                self.scalar_transforms[column['name']] = \
+                    single_value(transform, self.missing_results[column['name']])
+                continue
+            maxsize = transform and cache_size(column, transform)
+            coerce = coercer(column) if column.get('coerce') else None
+            if coerce:
+                fallback = transform or coercion_failure(self.table_name, column)
+                if not vectorized:
+                    vectorized = vectorized_coercer(column, fallback)
+                    if vectorized:
+                        self.vectorized_transforms[column['name']] = vectorized
+                transform = with_fallback(coerce, fallback)
+            if maxsize:
+                transform = lru_cache(transform, maxsize)
+                self.cached_transforms[column['name']] = transform
+            self.scalar_transforms[column['name']] = transform
+        self.row_transforms = tuple(
+            (column_name, row_transforms[column_name])
+            for column_name in topological_order(self.row_dependencies)
+        )
+        self.skipped_columns = frozenset(
+            column['name'] for column in description['columns']
+            if column['name'] not in self.scalar_transforms
+        )
+        if metrics is not None:
+            self._instrument(metrics)
+        self.transform_row = self._compile()
+        if metrics is not None:
+            self.transform_row = metrics.instrument_rows(self.table_name, self.transform_row)
+
+    def _instrument(self, metrics):
+        """Wraps every transform so it reports to the metrics collector"""
+        table_name = self.table_name
+        for column_name, transform in self.scalar_transforms.items():
+            if transform is not None:
+                self.scalar_transforms[column_name] = \
+                    metrics.instrument_transform(table_name, column_name, transform)
+        self.row_transforms = tuple(
+            (column_name, metrics.instrument_transform(table_name, column_name, transform))
+            for column_name, transform in self.row_transforms
+        )
+        for column_name, vectorized in self.vectorized_transforms.items():
+            self.vectorized_transforms[column_name] = \
+                metrics.instrument_vectorized(table_name, column_name, vectorized)
+        for column_name, batch in self.batch_transforms.items():
+            self.batch_transforms[column_name] = \
+                metrics.instrument_batch(table_name, column_name, batch)
+
+    def cache_info(self):
+        """Returns hit and miss counts for every cached column
+
+        Returns:
+            dict: `CacheInfo` keyed by column name
+        """
+        return {
+            column_name: transform.cache_info()
+            for column_name, transform in self.cached_transforms.items()
+        }
+
+    def batch_lookups(self, raw_values_by_column):
+        """Calls each batch transform once for the distinct values of its column
+
+        Args:
+            raw_values_by_column (dict): Iterables of raw values keyed by column
+
+        Returns:
+            dict: Functions transforming a single value from the results of
+            the batch transform, keyed by column
+        """
+        lookups = {}
+        for column_name, batch in self.batch_transforms.items():
+            raw_values = raw_values_by_column.get(column_name)
+            if raw_values is None:
+                continue
+            distinct = list(dict.fromkeys(raw_values))
+            lookups[column_name] = lookup(batch(distinct), self.missing_results[column_name])
+        return lookups
+
+    def transform_chunk(self, raw_rows):
+        """Transforms a chunk of rows, calling each batch transform once for
+        the distinct values of its column in the chunk
+
+        Args:
+            raw_rows (:obj:`list` of :obj:`dict`): Rows to transform
+
+        Returns:
+            :obj:`list` of :obj:`dict`: Transformed rows
+        """
+        if not self.batch_transforms:
+            return list(map(self.transform_row, raw_rows))
+        start = perf_counter()
+        lookups = self.batch_lookups({
+            column_name: [raw_row[column_name] for raw_row in raw_rows if column_name in raw_row]
+            for column_name in self.batch_transforms
+        })
+        transform_row = self._compile({**self.scalar_transforms, **lookups})
+        cooked_rows = list(map(transform_row, raw_rows))
+        if self.metrics is not None:
+            self.metrics.record_rows(self.table_name, len(cooked_rows), perf_counter() - start)
+        return cooked_rows
+
+    def transform_columns(self, columns):
+        """Transforms column-oriented data without building a dict per row.
+
+        Columns without a transform are passed through untouched. Transformed
+        integer and float columns are packed into an `array.array` when every
+        value fits. Row transforms receive a `RowView` of the raw columns, with
+        the columns they depend on already transformed.
+
+        Args:
+            columns (dict): Equally long sequences keyed by column name
+
+        Returns:
+            dict: Transformed sequences keyed by column name
+        """
+        start = perf_counter()
+        length = column_length(columns)
+        lookups = self.batch_lookups(columns)
+        cooked_columns = {}
+        for column_name, values in columns.items():
+            if column_name in self.skipped_columns:
+                continue
+            transform = lookups.get(column_name) or self.scalar_transforms[column_name]
+            if transform is None:
+                cooked_columns[column_name] = values
+            else:
+                cooked_columns[column_name] = \
+                    pack(self.column_types[column_name], list(map(transform, values)))
+
+        if self.row_transforms:
+            results = {column_name: [] for column_name, _ in self.row_transforms}
+            raw_view = RowView(columns)
+            views = [raw_view]
+            calls = []
+            for column_name, transform in self.row_transforms:
+                depends_on = self.row_dependencies[column_name]
+                view = raw_view
+                if depends_on:
+                    # Row results are appended in dependency order, so the
+                    # value of a dependency is in place before it is read
+                    dependencies = {
+                        dependency: results[dependency] for dependency in depends_on
+                        if dependency in results
+                    }
+                    dependencies.update(
+                        (dependency, cooked_columns[dependency]) for dependency in depends_on
+                        if dependency in cooked_columns)
+                    view = RowView({**columns, **dependencies})
+                    views.append(view)
+                calls.append((transform, view, results[column_name].append))
+            for index in range(length):
+                for view in views:
+                    view.index = index
+                for transform, view, append in calls:
+                    append(transform(view))
+            for column_name, cooked in results.items():
+                cooked_columns[column_name] = pack(self.column_types[column_name], cooked)
+        for column_name, check in self.reference_checks.items():
+            if column_name in cooked_columns:
+                cooked_columns[column_name] = pack(
+                    self.column_types[column_name], list(map(check, cooked_columns[column_name])))
+        for column_name, intern in self.interners.items():
+            if column_name in cooked_columns:
+                cooked_columns[column_name] = list(map(intern, cooked_columns[column_name]))
+        if self.columns is not None:
+            cooked_columns = {
+                column_name: cooked_columns[column_name]
+                for column_name in self.columns if column_name in cooked_columns
+            }
+        if self.metrics is not None:
+            self.metrics.record_rows(self.table_name, length, perf_counter() - start)
+        return cooked_columns
+
+    def transform_df(self, df):
+        """Transforms a pandas.DataFrame in place.
+
+        Vectorized counterparts are used when available, otherwise transforms
+        are applied per value or per row. Row transforms see the raw frame,
+        with the columns they depend on already transformed.
+
+        A projected plan returns a new frame holding only its columns instead,
+        leaving the given frame alone. The raw columns nothing needs are
+        dropped before transforming unless a row transform, which may read any
+        of them, is needed, in which case the whole frame is copied.
+
+        Args:
+            df (pandas.DataFrame): Frame with columns named after the description
+
+        Returns:
+            pandas.DataFrame: In-place transformed DataFrame
+        """
+        start = perf_counter()
+        if self.columns is not None and self.row_transforms:
+            df = df.copy()
+        elif self.columns is not None:
+            df = df[[column_name for column_name in df.columns if column_name in self.column_names]]
+        lookups = self.batch_lookups({
+            column_name: df[column_name] for column_name in self.batch_transforms
+            if column_name in df.columns and column_name not in self.vectorized_transforms
+        })
+        cooked = {}
+        for column_name in df.columns:
+            if column_name in self.skipped_columns:
+                continue
+            vectorized = self.vectorized_transforms.get(column_name)
+            if vectorized is not None:
+                cooked[column_name] = vectorized(df[column_name])
+                continue
+            transform = lookups.get(column_name) or self.scalar_transforms[column_name]
+            if transform is not None:
+                cooked[column_name] = df[column_name].map(transform)
+        for column_name, transform in self.row_transforms:
+            if column_name not in df.columns:
+                continue
+            frame = df
+            depends_on = [
+                dependency for dependency in self.row_dependencies[column_name]
+                if dependency in cooked
+            ]
+            if depends_on:
+                frame = df.assign(**{dependency: cooked[dependency] for dependency in depends_on})
+            vectorized = self.vectorized_transforms.get(column_name)
+            if vectorized is not None:
+                cooked[column_name] = vectorized(frame)
+            else:
+                cooked[column_name] = frame.apply(transform, axis=1)
+        for column_name, values in cooked.items():
+            df[column_name] = values
+        self.finish_df(df)
+        if self.columns is not None:
+            df = df[[column_name for column_name in self.columns if column_name in df.columns]]
+        if self.metrics is not None:
+            self.metrics.record_rows(self.table_name, len(df), perf_counter() - start)
+        return df
+
+    def finish_rows(self, cooked_rows):
+        """Checks transformed rows against the referenced columns, replacing
+        values that aren't found with failures, and interns categorical
+        columns, in place. Used for rows transformed in worker processes,
+        which have neither the reference index nor this plan's pools."""
+        for cooked_row in cooked_rows:
+            for column_name, check in self.reference_checks.items():
+                if column_name in cooked_row:
+                    cooked_row[column_name] = check(cooked_row[column_name])
+            for column_name, intern in self.interners.items():
+                if column_name in cooked_row:
+                    cooked_row[column_name] = intern(cooked_row[column_name])
+        return cooked_rows
+
+    def finish_df(self, df):
+        """Checks a transformed DataFrame against the referenced columns and
+        converts categorical columns to the `category` dtype, in place, see
+        `finish_rows`"""
+        for column_name, check in self.reference_checks.items():
+            if column_name in df.columns:
+                df[column_name] = df[column_name].map(check, na_action='ignore')
+        for column_name in self.interners:
+            if column_name in df.columns:
+                df[column_name] = df[column_name].astype('category')
+        return df
+
+    def _compile(self, scalar_transforms=None):
+        """Builds the function that transforms a single raw row into a dict.
+
+        Everything the loop needs is bound to locals of the closure, so each
+        cell costs at most one dict lookup and one call.
+
+        Args:
+            scalar_transforms (dict, optional): Transforms to use instead of
+                `scalar_transforms`, such as the lookups of a chunk
+        """
+        if scalar_transforms is None:
+            scalar_transforms = self.scalar_transforms
+        row_transforms = tuple(
+            (column_name, transform, self.row_dependencies[column_name])
+            for column_name, transform in self.row_transforms
+        )
+        skipped_columns = self.skipped_columns
+        reference_checks = tuple(self.reference_checks.items())
+        interners = tuple(self.interners.items())
+        dropped_columns = ()
+        if self.columns is not None:
+            dropped_columns = tuple(
+                column_name for column_name in self.column_names if column_name not in self.columns)
+
+        def transform_row(raw_row):
+            cooked_row = {}
+            for column_name, raw_value in raw_row.items():
+                if column_name in skipped_columns:
+                    continue
+                transform = scalar_transforms[column_name]
+                if transform is None:
+                    cooked_row[column_name] = raw_value
+                else:
+                    cooked_row[column_name] = transform(raw_value)
+            for column_name, transform, depends_on in row_transforms:
+                if depends_on:
+                    cooked_row[column_name] = \
+                        transform(DependentRow(raw_row, cooked_row, depends_on))
+                else:
+                    cooked_row[column_name] = transform(raw_row)
+            for column_name, check in reference_checks:
+                if column_name in cooked_row:
+                    cooked_row[column_name] = check(cooked_row[column_name])
+            for column_name, intern in interners:
+                if column_name in cooked_row:
+                    cooked_row[column_name] = intern(cooked_row[column_name])
+            for column_name in dropped_columns:
+                cooked_row.pop(column_name, None)
+            return cooked_row
+
+        return transform_row
+
+
+def needed_columns(description, column_names):
+    """Returns the given columns along with every column their row
+    transforms depend on, directly or not
+
+    Raises:
+        LookupError: When a column isn't described
+    """
+    columns_by_name = description['columns_by_name']
+    needed = set()
+    pending = list(column_names)
+    while pending:
+        column_name = pending.pop()
+        if column_name in needed:
+            continue
+        if column_name not in columns_by_name:
+            raise LookupError(
+                f"No column found in table {description['name']} with name {column_name}")
+        needed.add(column_name)
+        transform = columns_by_name[column_name].get('transform_fn')
+        if hasattr(transform, 'requires_row'):
+            pending.extend(getattr(transform, 'depends_on', ()))
+    return needed
+
+
+def missing_result(table_name, column):
+    """Returns a function creating failures for values a batch transform
+    returned no result for"""
+    reason = 'Batch transform returned no result for value'
+    location = f"{table_name}.{column['name']}"
+    return lambda raw_value: TransformFailure(reason, raw_value, location)
+
+
+def lookup(results, missing):
+    """Returns a function transforming a single value from the results of a
+    batch transform"""
+    sentinel = object()
+
+    def transform(raw_value):
+        cooked_value = results.get(raw_value, sentinel)
+        if cooked_value is sentinel:
+            return missing(raw_value)
+        return cooked_value
+    return transform
+
+
+def interner(max_size=MAX_CATEGORIES):
+    """Returns a function returning the first copy it was given of each
+    string, so equal strings share one object. Values that aren't strings
+    pass through, as do new strings once `max_size` are pooled."""
+    pool = {}
+
+    def intern(value):
+        if value.__class__ is not str:
+            return value
+        try:
+            return pool[value]
+        except KeyError:
+            if len(pool) < max_size:
+                pool[value] = value
+            return value
+    return intern
+
+
+def single_value(batch, missing):
+    """Adapts a batch transform to transform one value at a time"""
+    def transform(raw_value):
+        return lookup(batch([raw_value]), missing)(raw_value)
+    return transform
+
+
+class DependentRow(Mapping):
+    """Read-only view of a raw row that reads the columns a row transform
+    depends on from the transformed row instead
+
+    Args:
+        raw_row (dict): The raw row
+        cooked_row (dict): The row transformed so far
+        depends_on (frozenset): Columns read from `cooked_row`
+    """
+    __slots__ = ('raw_row', 'cooked_row', 'depends_on')
+
+    def __init__(self, raw_row, cooked_row, depends_on):
+        self.raw_row = raw_row
+        self.cooked_row = cooked_row
+        self.depends_on = depends_on
+
+    def __getitem__(self, column_name):
+        if column_name in self.depends_on:
+            return self.cooked_row[column_name]
+        return self.raw_row[column_name]
+
+    def __iter__(self):
+        return iter(self.raw_row)
+
+    def __len__(self):
+        return len(self.raw_row)
+
+    def __repr__(self):
+        return f'<DependentRow {dict(self)}>'
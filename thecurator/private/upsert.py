@@ -0,0 +1,235 @@
+"""
+In case it isn't already clear by the namespace, this is a private API. Use it
+at your own risk.
+
+Helpers for idempotent, resumable loads. Every raw row upserted is hashed and
+the digest recorded in a side table alongside a digest of its key, so a row
+that reappears unchanged in a later load is skipped before it's transformed.
+A checkpoint file records how many batches were committed, so an interrupted
+load resumes after the last of them.
+"""
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+from time import perf_counter
+import sqlalchemy
+from . import batched
+from .loaders import LoadReport
+
+"""Name of the side table holding the digests of upserted rows"""
+HASH_TABLE_NAME = 'thecurator_row_hashes'
+
+"""Most values bound in a single `IN` clause"""
+MAX_IN_VALUES = 500
+
+
+class UpsertReport(LoadReport):
+    """Number of rows an upsert wrote, along with what happened to the rest.
+
+    Attributes:
+        inserted (int): Rows inserted
+        updated (int): Existing rows updated
+        unchanged (int): Rows skipped because they were loaded before as is
+        skipped (int): Existing rows left alone because updating was off
+        resumed_from (int): Rows skipped because a checkpoint showed an
+            earlier load committed them
+    """
+
+    def __new__(cls, seconds, batches, inserted=0, updated=0, unchanged=0, skipped=0,
+                resumed_from=0):
+        report = super().__new__(cls, inserted + updated, seconds, batches)
+        report.inserted = inserted
+        report.updated = updated
+        report.unchanged = unchanged
+        report.skipped = skipped
+        report.resumed_from = resumed_from
+        return report
+
+    def __repr__(self):
+        return (f'<UpsertReport {self.inserted} inserted, {self.updated} updated, '
+                f'{self.unchanged} unchanged, {self.skipped} skipped '
+                f'in {self.seconds:.3f}s>')
+
+
+class RowHashStore():
+    """Digests of the raw rows upserted into each table, keyed by a digest of
+    the row's key, kept in a side table of the database loaded into.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): Database holding the side table
+        table_name (str): Name of the side table
+    """
+
+    def __init__(self, engine, table_name=HASH_TABLE_NAME):
+        self.table = sqlalchemy.Table(
+            table_name, sqlalchemy.MetaData(),
+            sqlalchemy.Column('table_name', sqlalchemy.String(255), primary_key=True),
+            sqlalchemy.Column('key_digest', sqlalchemy.String(32), primary_key=True),
+            sqlalchemy.Column('row_digest', sqlalchemy.String(32), nullable=False),
+        )
+        self.table.create(engine, checkfirst=True)
+
+    def lookup(self, connection, table_name, key_digests):
+        """Returns the stored row digests of the given keys that have one
+
+        Returns:
+            dict: Row digests keyed by key digest
+        """
+        found = {}
+        columns = self.table.c
+        for chunk in batched(key_digests, MAX_IN_VALUES):
+            statement = sqlalchemy.select(columns.key_digest, columns.row_digest).where(
+                columns.table_name == table_name, columns.key_digest.in_(chunk))
+            found.update(connection.execute(statement).all())
+        return found
+
+    def store(self, connection, table_name, digests):
+        """Records row digests, replacing any stored for the same keys
+
+        Args:
+            digests (dict): Row digests keyed by key digest
+        """
+        columns = self.table.c
+        for chunk in batched(digests, MAX_IN_VALUES):
+            connection.execute(self.table.delete().where(
+                columns.table_name == table_name, columns.key_digest.in_(chunk)))
+        if digests:
+            connection.execute(self.table.insert(), [
+                {'table_name': table_name, 'key_digest': key_digest, 'row_digest': row_digest}
+                for key_digest, row_digest in digests.items()
+            ])
+
+    def forget(self, connection, table_name):
+        """Removes every digest stored for a table, such as once its rows
+        were replaced"""
+        connection.execute(self.table.delete().where(self.table.c.table_name == table_name))
+
+
+def digest(value):
+    """Hashes the repr of a value"""
+    return hashlib.blake2b(repr(value).encode(), digest_size=16).hexdigest()
+
+
+def description_digest(description):
+    """Hashes what a description declares, so rows loaded under an earlier
+    version of it aren't mistaken for unchanged"""
+    return digest([
+        sorted((name, value) for name, value in column.items() if not name.endswith('_fn'))
+        for column in description['columns']
+    ])
+
+
+def read_checkpoint(path, table_name, batch_size):
+    """Returns the number of batches a checkpoint shows were committed, or 0
+    when there's no checkpoint for this table and batch size"""
+    try:
+        with open(path) as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+    except (OSError, ValueError):
+        return 0
+    if checkpoint.get('table') != table_name or checkpoint.get('batch_size') != batch_size:
+        return 0
+    return checkpoint.get('batches', 0)
+
+
+def write_checkpoint(path, table_name, batch_size, batches):
+    """Writes the checkpoint atomically, so it's never seen partially written"""
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile('w', dir=directory, delete=False) as checkpoint_file:
+        json.dump({'table': table_name, 'batch_size': batch_size, 'batches': batches},
+                  checkpoint_file)
+    os.replace(checkpoint_file.name, path)
+
+
+def upsert_iter(engine, loader, plan, table, description, raw_rows, update, batch_size,
+                checkpoint=None, hash_store=None, on_commit=None, screen=None,
+                transform_keys=None):
+    """Upserts raw rows in batches, each committed on its own.
+
+    Within a batch, rows are matched by their transformed key values, as the
+    loader matches them: the last row with a given key wins (the others
+    aren't counted), rows whose raw
+    contents were upserted before are skipped without being transformed, and
+    the rest are transformed and passed to `loader.upsert`. `on_commit` is
+    called with the rows written once their batch is committed. `screen`,
+    when given, takes `(raw_row, cooked_row)` pairs and yields those that
+    should be written; no digest is stored for the others, so they're
+    transformed again the next time they're upserted. `transform_keys` takes
+    a list of raw rows and returns them transformed, holding at least the key
+    columns; raw key values are used when it isn't given.
+
+    Returns:
+        UpsertReport
+    """
+    start = perf_counter()
+    table_name = description['name']
+    key = description['key']
+    key_of = (lambda row: tuple(row[column_name] for column_name in key))
+    salt = description_digest(description)
+    if plan.columns is not None:
+        # Rows upserted with only some columns still need the rest written
+        salt = digest((salt, plan.columns))
+    hash_store = hash_store or RowHashStore(engine)
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+
+    committed = read_checkpoint(checkpoint, table_name, batch_size) if checkpoint else 0
+    raw_rows = iter(raw_rows)
+    resumed_from = sum(1 for _ in itertools.islice(raw_rows, committed * batch_size))
+    batch_count = committed
+
+    with engine.connect() as connection:
+        for raw_batch in batched(raw_rows, batch_size):
+            latest = {}
+            keyed_rows = raw_batch if transform_keys is None else transform_keys(raw_batch)
+            for raw_row, keyed_row in zip(raw_batch, keyed_rows):
+                latest[digest(key_of(keyed_row))] = raw_row
+            row_digests = {
+                key_digest: digest((salt, sorted(raw_row.items())))
+                for key_digest, raw_row in latest.items()
+            }
+            with connection.begin():
+                stored = hash_store.lookup(connection, table_name, list(latest))
+                changed = []
+                for key_digest, row_digest in row_digests.items():
+                    stored_digest = stored.get(key_digest)
+                    if stored_digest == row_digest:
+                        counts['unchanged'] += 1
+                    elif stored_digest is not None and not update:
+                        counts['skipped'] += 1
+                    else:
+                        changed.append(key_digest)
+                cooked_rows = []
+                if changed:
+                    raw_changed = [latest[key_digest] for key_digest in changed]
+                    cooked_rows = plan.transform_chunk(raw_changed)
+                    if screen is not None:
+                        pairs = list(screen(table_name, zip(raw_changed, cooked_rows)))
+                        kept = set(id(raw_row) for raw_row, _ in pairs)
+                        changed = [
+                            key_digest for key_digest in changed if id(latest[key_digest]) in kept
+                        ]
+                        cooked_rows = [cooked_row for _, cooked_row in pairs]
+                if cooked_rows:
+                    inserted, updated = loader.upsert(connection, table, cooked_rows, key, update)
+                    counts['inserted'] += len(inserted)
+                    counts['updated'] += len(updated)
+                    counts['skipped'] += len(cooked_rows) - len(inserted) - len(updated)
+                    # Rows left alone keep no digest, so a later update writes them
+                    written = set(inserted).union(updated)
+                    hash_store.store(connection, table_name, {
+                        key_digest: row_digests[key_digest]
+                        for key_digest, cooked_row in zip(changed, cooked_rows)
+                        if key_of(cooked_row) in written
+                    })
+            if on_commit is not None and cooked_rows:
+                on_commit(cooked_rows)
+            batch_count += 1
+            if checkpoint:
+                write_checkpoint(checkpoint, table_name, batch_size, batch_count)
+
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return UpsertReport(perf_counter() - start, batch_count - committed,
+                        resumed_from=resumed_from, **counts)